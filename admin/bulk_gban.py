@@ -0,0 +1,259 @@
+import os
+import re
+import csv
+import asyncio
+from functools import partial
+from dotenv import load_dotenv
+from pyrogram.types import User
+from ub_core.utils.helpers import get_name
+
+from app import BOT, Config, Message, bot, extra_config
+from ..tools.lanes import admin_lane
+from .fanout import FANOUT, FanoutResult, PROGRESS_EDIT_INTERVAL
+from .gban_jobs import GBAN_MAX_ATTEMPTS, GBAN_QUEUE
+from .gban_ledger import GBAN_LEDGER
+from .gbans import GBAN_CHATS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+# How many /gban lines go into one message. Most federation bots only act on the first
+# command of a message, so keep 1 unless every connected bot accepts multi-line gbans.
+GBAN_BULK_BATCH = max(1, int(os.getenv("GBAN_BULK_BATCH", "1")))
+MAX_MESSAGE_LENGTH = 4096
+MAX_RANGE = 1000
+RESOLVE_CONCURRENCY = 8
+ERROR_VISIBLE_DURATION = 8
+
+USER_TOKEN = re.compile(r"^(@[A-Za-z][A-Za-z0-9_]{3,31}|-?\d{5,})$")
+# Header names of the user column in exports, most specific first.
+USER_COLUMNS = ("user_id", "userid", "id", "username", "user")
+
+
+def split_users_and_reason(text: str) -> tuple[list[str], str]:
+    """Leading ids/@usernames are targets, whatever follows is the reason."""
+    tokens = text.split()
+    users = []
+    while tokens and USER_TOKEN.match(tokens[0].strip(",")):
+        users.append(tokens.pop(0).strip(","))
+    return users, " ".join(tokens)
+
+
+def sync_parse_user_file(content: bytes) -> list[str]:
+    """
+    Reads one user per row of a txt or CSV export, in file order. With a header row only the
+    recognised user column is read, otherwise the first field of each line. Other columns
+    (timestamps, message counts...) are never taken as ids.
+    """
+    rows = [row for row in csv.reader(content.decode("utf-8", errors="ignore").splitlines()) if row]
+    if not rows:
+        return []
+    column = 0
+    header = [cell.strip().lower() for cell in rows[0]]
+    for name in USER_COLUMNS:
+        if name in header:
+            column = header.index(name)
+            rows = rows[1:]
+            break
+    tokens = []
+    for row in rows:
+        fields = row[column].split() if column < len(row) else []
+        if fields and USER_TOKEN.match(fields[0]):
+            tokens.append(fields[0])
+    return tokens
+
+
+def pack_commands(commands: list[str], batch: int = GBAN_BULK_BATCH) -> list[str]:
+    packed: list[str] = []
+    current: list[str] = []
+    for command in commands:
+        candidate = "\n".join([*current, command])
+        if current and (len(current) >= batch or len(candidate) > MAX_MESSAGE_LENGTH):
+            packed.append("\n".join(current))
+            current = []
+        current.append(command)
+    if current:
+        packed.append("\n".join(current))
+    return packed
+
+
+async def collect_range_senders(message: Message) -> list[User]:
+    """Senders of every message from the replied one up to the command, oldest first."""
+    start, end = message.replied.id, message.id
+    if end - start > MAX_RANGE:
+        start = end - MAX_RANGE
+    ids = list(range(start, end))
+    users: list[User] = []
+    for offset in range(0, len(ids), 200):
+        chunk = await bot.get_messages(message.chat.id, ids[offset:offset + 200])
+        users.extend(msg.from_user for msg in chunk if msg and not msg.empty and msg.from_user)
+    return users
+
+
+async def resolve_users(tokens: list[str]) -> tuple[dict[int, str], list[str]]:
+    """Resolves ids/usernames concurrently. Anything Telegram can't look up is returned as unresolved."""
+    semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+
+    async def resolve(token: str) -> tuple[str, int | None, str | None]:
+        async with semaphore:
+            try:
+                user = await bot.get_users(int(token) if token.lstrip("-").isdigit() else token)
+                return token, user.id, user.mention
+            except Exception:
+                return token, None, None
+
+    resolved: dict[int, str] = {}
+    unresolved: list[str] = []
+    for token, user_id, mention in await asyncio.gather(*(resolve(token) for token in dict.fromkeys(tokens))):
+        if user_id is None:
+            unresolved.append(token)
+        elif user_id not in resolved:
+            resolved[user_id] = mention
+    return resolved, unresolved
+
+
+async def report_bulk_progress(progress: Message, results: list[FanoutResult]):
+    last_text = ""
+    while True:
+        await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+        total = sum(result.total for result in results)
+        done = sum(len(result.sent) for result in results)
+        failed = sum(len(result.failed) for result in results)
+        text = f"❯❯ {done}/{total} messages sent" + (f" • {failed} failed" if failed else "")
+        if text != last_text:
+            try:
+                await progress.edit(text)
+            except Exception:
+                pass
+            last_text = text
+
+
+@bot.add_cmd(cmd="bgban")
+@admin_lane
+async def bulk_gban(bot: BOT, message: Message):
+    """
+    CMD: BGBAN
+    INFO: Gbans many users at once and sends the commands packed into as few messages as possible.
+    FLAGS: -range to gban the senders of every message from the replied one to this command.
+    USAGE:
+        .bgban 123 @user1 @user2 [reason]
+        .bgban [reason] (reply to a .txt/.csv file of ids/usernames)
+        .bgban -range [reason] (reply to the first raid message)
+    """
+    progress: Message = await message.reply("❯")
+    tokens, reason = split_users_and_reason(message.filtered_input or "")
+    resolved: dict[int, str] = {}
+    unresolved: list[str] = []
+
+    try:
+        replied = message.replied
+        if "-range" in message.flags:
+            if not replied:
+                await progress.edit("Reply to the first raid message with <code>-range</code>.", del_in=ERROR_VISIBLE_DURATION)
+                return
+            for user in await collect_range_senders(message):
+                resolved.setdefault(user.id, user.mention)
+        elif replied and replied.document:
+            content = await replied.download(in_memory=True)
+            tokens.extend(await asyncio.to_thread(sync_parse_user_file, bytes(content.getbuffer())))
+
+        if tokens:
+            await progress.edit(f"❯ Resolving {len(set(tokens))} users...")
+            from_tokens, unresolved = await resolve_users(tokens)
+            for user_id, mention in from_tokens.items():
+                resolved.setdefault(user_id, mention)
+    except Exception as e:
+        await progress.edit(f"<b>Error:</b> {e}", del_in=ERROR_VISIBLE_DURATION)
+        return
+
+    protected = {Config.OWNER_ID, *Config.SUPERUSERS, *Config.SUDO_USERS}
+    skipped = [resolved.pop(user_id) for user_id in list(resolved) if user_id in protected]
+
+    if not resolved:
+        await progress.edit("No users to gban.", del_in=ERROR_VISIBLE_DURATION)
+        return
+
+    gban_chats: dict[int, str] = {
+        chat_id: gban_chat["name"] for chat_id, gban_chat in (await GBAN_CHATS.get_all()).items()
+    }
+    if not gban_chats:
+        await progress.edit("You don't have any bot chats on the GBAN list! Use `.addg` to add one.")
+        return
+
+    packed = pack_commands(
+        [f"/gban <a href='tg://user?id={user_id}'>{user_id}</a> {reason}".rstrip() for user_id in resolved]
+    )
+    await progress.edit(f"❯❯ Gbanning {len(resolved)} users in {len(gban_chats)} bots ({len(packed)} messages each)...")
+
+    results: list[FanoutResult] = []
+    jobs = []
+    for index, text in enumerate(packed, start=1):
+        job = await GBAN_QUEUE.create(
+            text, "Bulk Gban", None, f"batch {index}/{len(packed)} ({text.count(chr(10)) + 1} users)", reason, gban_chats
+        )
+        jobs.append(job)
+
+    reporter = asyncio.create_task(report_bulk_progress(progress, results))
+    try:
+        tasks = []
+        for text, job in zip(packed, jobs):
+            result = FanoutResult(len(gban_chats))
+            results.append(result)
+            tasks.append(
+                FANOUT.fan_out(list(gban_chats), text, on_result=partial(GBAN_QUEUE.mark, job), result=result)
+            )
+        await asyncio.gather(*tasks)
+    finally:
+        reporter.cancel()
+        for job in jobs:
+            GBAN_QUEUE.release(job)
+
+    failed_chats: dict[int, int] = {}
+    for result in results:
+        for chat_id in result.failed:
+            failed_chats[chat_id] = failed_chats.get(chat_id, 0) + 1
+
+    origin = message.chat.title or "PM"
+    for text, job, result in zip(packed, jobs, results):
+        failed = [gban_chats[chat_id] for chat_id in result.failed]
+        for user_id, mention in resolved.items():
+            if f"tg://user?id={user_id}'" in text:
+                await GBAN_LEDGER.record(
+                    user_id=user_id,
+                    user_mention=mention,
+                    action="Gban",
+                    reason=reason,
+                    origin=origin,
+                    job_id=job["_id"],
+                    total=len(gban_chats),
+                    failed=failed,
+                )
+
+    resp_str = (
+        f"❯❯❯ <b>Bulk Gbanned</b> {len(resolved)} users"
+        f"\n<b>Reason</b>: {reason}"
+        f"\n<b>Initiated in</b>: {origin}"
+        f"\n<b>Bots</b>: {len(gban_chats)} • <b>Messages per bot</b>: {len(packed)}"
+    )
+    if failed_chats:
+        resp_str += "\n<b>Failed</b> in:\n• " + "\n• ".join(
+            f"{gban_chats[chat_id]} ({count}/{len(packed)} messages)" for chat_id, count in failed_chats.items()
+        )
+        if GBAN_MAX_ATTEMPTS > 1:
+            resp_str += "\n<i>Retrying in background, see</i> <code>.gbanstatus</code>"
+    if unresolved:
+        resp_str += "\n<b>Unresolved</b>: " + ", ".join(unresolved)
+    if skipped:
+        resp_str += "\n<b>Skipped (owner/sudo)</b>: " + ", ".join(skipped)
+    if not message.is_from_owner:
+        resp_str += f"\n\n<b>By</b>: {get_name(message.from_user)}"
+
+    users_str = "\n".join(f"• {mention} <code>{user_id}</code>" for user_id, mention in resolved.items())
+    await bot.send_message(
+        chat_id=extra_config.FBAN_LOG_CHANNEL,
+        text=f"{resp_str}\n\n<b>Users</b>:\n{users_str}"[:MAX_MESSAGE_LENGTH],
+        disable_preview=True,
+    )
+    await progress.edit(text=resp_str, del_in=5, block=True, disable_preview=True)
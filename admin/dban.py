@@ -2,8 +2,10 @@ import html
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="dban")
+@admin_lane
 async def dban_handler(bot: BOT, message: Message):
     """
     CMD: DBAN
@@ -3,8 +3,10 @@ import asyncio
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="dkick")
+@admin_lane
 async def dkick_handler(bot: BOT, message: Message):
     """
     CMD: DKICK
@@ -2,8 +2,10 @@ import html
 from pyrogram.types import Message, ChatPermissions, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="dmute")
+@admin_lane
 async def dmute_handler(bot: BOT, message: Message):
     """
     CMD: DMUTE
@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+from pyrogram.errors import FloodWait
+
+from app import Message, bot
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+# Messages per second across all GBAN bot chats, and minimum spacing within one chat.
+GBAN_GLOBAL_RATE = float(os.getenv("GBAN_GLOBAL_RATE", "20"))
+GBAN_PER_CHAT_INTERVAL = float(os.getenv("GBAN_PER_CHAT_INTERVAL", "1"))
+# A FloodWait longer than this fails the chat instead of stalling the whole gban.
+GBAN_MAX_FLOOD_WAIT = float(os.getenv("GBAN_MAX_FLOOD_WAIT", "120"))
+GBAN_FLOOD_RETRIES = 3
+PROGRESS_EDIT_INTERVAL = 2
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatLane:
+    """Serializes sends to one chat and remembers when it may be written to next."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.next_send = 0.0
+
+
+class FanoutResult:
+    def __init__(self, total: int):
+        self.total = total
+        self.sent: list[int] = []
+        self.failed: dict[int, str] = {}
+        self.flood_waiting = 0
+
+    @property
+    def done(self) -> int:
+        return len(self.sent) + len(self.failed)
+
+
+class FanoutEngine:
+    """
+    Sends one text to many chats concurrently. A global token bucket caps the overall rate and
+    each chat has its own lane, so a FloodWait only pauses the chat that raised it.
+    Lanes are shared by every caller, so concurrent gbans still respect per-chat spacing.
+    """
+
+    def __init__(self, global_rate: float, per_chat_interval: float):
+        self.limiter = RateLimiter(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self._lanes: dict[int, ChatLane] = {}
+
+    def _lane(self, chat_id: int) -> ChatLane:
+        if chat_id not in self._lanes:
+            self._lanes[chat_id] = ChatLane()
+        return self._lanes[chat_id]
+
+    async def send(self, chat_id: int, text: str, result: FanoutResult | None = None):
+        lane = self._lane(chat_id)
+        async with lane.lock:
+            for attempt in range(GBAN_FLOOD_RETRIES + 1):
+                delay = lane.next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.limiter.acquire()
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text, disable_preview=True)
+                    lane.next_send = time.monotonic() + self.per_chat_interval
+                    return
+                except FloodWait as e:
+                    wait = float(e.value or 1)
+                    if wait > GBAN_MAX_FLOOD_WAIT or attempt == GBAN_FLOOD_RETRIES:
+                        raise
+                    lane.next_send = time.monotonic() + wait
+                    if result:
+                        result.flood_waiting += 1
+                    try:
+                        await asyncio.sleep(wait)
+                    finally:
+                        if result:
+                            result.flood_waiting -= 1
+
+    async def fan_out(
+        self,
+        chat_ids: list[int],
+        text: str,
+        progress: Message | None = None,
+        status: str = "",
+        on_result=None,
+        result: FanoutResult | None = None,
+    ) -> FanoutResult:
+        """
+        `on_result(chat_id, error)` is awaited after each chat, with error None on success.
+        Pass `result` to watch progress from outside while the fan-out runs.
+        """
+        result = result or FanoutResult(len(chat_ids))
+
+        async def deliver(chat_id: int):
+            error = None
+            try:
+                await self.send(chat_id, text, result)
+                result.sent.append(chat_id)
+            except Exception as e:
+                error = str(e)
+                result.failed[chat_id] = error
+            if on_result:
+                # Bookkeeping must not abort the fan-out or the command's reply.
+                try:
+                    await on_result(chat_id, error)
+                except Exception as e:
+                    try:
+                        await bot.log_text(
+                            text=f"#GBANS\nCould not record the delivery to <code>{chat_id}</code>: {e}",
+                            type="GBAN_ERROR",
+                        )
+                    except Exception:
+                        pass
+
+        tasks = [asyncio.create_task(deliver(chat_id)) for chat_id in chat_ids]
+        reporter = asyncio.create_task(report_progress(progress, status, result)) if progress else None
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if reporter:
+                reporter.cancel()
+        return result
+
+
+def format_progress(status: str, result: FanoutResult) -> str:
+    text = f"{status}{len(result.sent)}/{result.total} sent"
+    if result.failed:
+        text += f" • {len(result.failed)} failed"
+    if result.flood_waiting:
+        text += f" • {result.flood_waiting} in flood wait"
+    return text
+
+
+async def report_progress(progress: Message, status: str, result: FanoutResult):
+    last_text = ""
+    while result.done < result.total:
+        await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+        text = format_progress(status, result)
+        if text != last_text:
+            try:
+                await progress.edit(text)
+            except Exception:
+                pass
+            last_text = text
+
+
+FANOUT = FanoutEngine(GBAN_GLOBAL_RATE, GBAN_PER_CHAT_INTERVAL)
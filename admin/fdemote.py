@@ -1,14 +1,16 @@
 # fedemotion.py
 
 from app import BOT, bot
-from pyrogram import Client, types, filters
+from pyrogram import Client, types
 from pyrogram.errors import UsernameInvalid, UsernameNotOccupied
+from ..tools.lanes import admin_lane
+from ..tools.responses import RESPONSES
 
-# A dictionary to temporarily store the original chat and message ID
-# for each user's command.
-pending_commands = {}
+ROSE_BOT_USERNAME = "MissRose_bot"
+ROSE_TIMEOUT = 20
 
 @bot.add_cmd(cmd=["fdemote", "feddemote"])
+@admin_lane
 async def fedemotion_command(client: Client, message: types.Message):
     """
     Handles the fdemote command by sending it to Rose
@@ -52,54 +54,28 @@ async def fedemotion_command(client: Client, message: types.Message):
     command = message.command[0].lower().replace("fed", "f")
     rose_command_text = f"/{command} {user_id}"
     
-    # 3. Store the original message details
-    original_user_id = message.from_user.id
-    if original_user_id in pending_commands:
-        await message.reply_text("A previous federation command is pending. Please wait.")
-        return
-        
-    pending_commands[original_user_id] = {
-        "chat_id": message.chat.id,
-        "message_id": message.id
-    }
-    
-    # 4. Send the command to Rose Bot
-    ROSE_BOT_USERNAME = "MissRose_bot"
-
+    # 3. Send the command to Rose Bot and wait for the reply meant for this request.
+    # Every request gets its own waiter, so several demotions can be in flight at once.
+    waiter = None
     try:
-        await client.send_message(
-            chat_id=ROSE_BOT_USERNAME,
+        rose_id = await RESPONSES.resolve_chat_id(client, ROSE_BOT_USERNAME)
+        waiter = RESPONSES.expect(rose_id, hint=str(user_id))
+        sent = await client.send_message(
+            chat_id=rose_id,
             text=rose_command_text,
             disable_notification=True
         )
-        await message.reply_text(f"Sent `{command}` command to Rose for user `{target_username or user_id}`. Waiting for Rose's response...", quote=True)
+        waiter.reply_to.add(sent.id)
+        status = await message.reply_text(f"Sent `{command}` command to Rose for user `{target_username or user_id}`. Waiting for Rose's response...", quote=True)
     except Exception as e:
+        if waiter:
+            waiter.cancel()
         await message.reply_text(f"An error occurred while sending the command to Rose: {e}")
-        del pending_commands[original_user_id]
-
-# 5. Listen for Rose's response
-@Client.on_message(filters.chat("MissRose_bot") & filters.private)
-async def rose_response_handler(client: Client, message: types.Message):
-    """
-    Listens for messages from Rose Bot and quotes them back to the
-    original group chat.
-    """
-    
-    userbot_id = client.me.id
-    
-    if userbot_id in pending_commands:
-        original_command_data = pending_commands[userbot_id]
-        
-        try:
-            original_chat_id = original_command_data["chat_id"]
-            original_message_id = original_command_data["message_id"]
+        return
 
-            await client.send_message(
-                chat_id=original_chat_id,
-                text=f"**Rose's response:**\n\n> {message.text}",
-                reply_to_message_id=original_message_id
-            )
-        except Exception as e:
-            print(f"Failed to quote Rose's message: {e}")
-        
-        del pending_commands[userbot_id]
\ No newline at end of file
+    # 4. Quote Rose's response back to the original chat.
+    response = await waiter.get(timeout=ROSE_TIMEOUT)
+    if not response:
+        await status.edit_text("Rose did not respond in time.")
+        return
+    await status.edit_text(f"**Rose's response:**\n\n> {response.text}")
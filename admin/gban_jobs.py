@@ -0,0 +1,230 @@
+import os
+import time
+import uuid
+import asyncio
+from dotenv import load_dotenv
+
+from app import BOT, CustomDB, Message, bot
+from ..tools.lanes import admin_lane
+from .fanout import FANOUT
+from .gban_ledger import GBAN_LEDGER
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+GBAN_MAX_ATTEMPTS = int(os.getenv("GBAN_MAX_ATTEMPTS", "6"))
+GBAN_RETRY_BASE = float(os.getenv("GBAN_RETRY_BASE_SECONDS", "30"))
+GBAN_RETRY_MAX = 3600
+WORKER_IDLE_SLEEP = 60
+
+PENDING = "pending"
+SENT = "sent"
+RETRYING = "retrying"
+FAILED = "failed"
+OUTSTANDING = (PENDING, RETRYING)
+
+GBAN_JOBS_DB = CustomDB["GBAN_JOBS"]
+
+
+def get_backoff(attempts: int) -> float:
+    return min(GBAN_RETRY_BASE * 2 ** (attempts - 1), GBAN_RETRY_MAX)
+
+
+def format_wait(seconds: float) -> str:
+    seconds = max(int(seconds), 0)
+    return f"{seconds // 60}m {seconds % 60:02d}s" if seconds >= 60 else f"{seconds}s"
+
+
+class GbanJobQueue:
+    """
+    Durable record of every gban/ungban fan-out. Each bot chat has its own delivery state,
+    persisted as it changes, so a restart resumes what was left and failed chats are retried
+    with exponential backoff by a background worker.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.jobs: dict[str, dict] = {}
+        # Jobs whose first fan-out is still running in the command handler.
+        self._live: set[str] = set()
+        self._in_flight: set[tuple[str, str]] = set()
+        # Jobs whose last state write failed; the worker writes them again in full.
+        self._unsaved: set[str] = set()
+        self._wakeup = asyncio.Event()
+
+    async def load(self):
+        jobs = [job async for job in self.collection.find()]
+        for job in jobs:
+            self.jobs[job["_id"]] = job
+        # Cut off between the last delivery and its cleanup (crash or failed write).
+        for job in jobs:
+            if not self.outstanding(job):
+                await self.finish(job)
+
+    async def create(self, command: str, task_type: str, user_id: int | None, user_mention: str, reason: str, chats: dict[int, str]) -> dict:
+        job = {
+            "_id": uuid.uuid4().hex[:8],
+            "command": command,
+            "task_type": task_type,
+            "user_id": user_id,
+            "user_mention": user_mention,
+            "reason": reason,
+            "created_at": time.time(),
+            "deliveries": {
+                str(chat_id): {"name": name, "state": PENDING, "attempts": 0, "next_try": 0, "error": None}
+                for chat_id, name in chats.items()
+            },
+        }
+        self.jobs[job["_id"]] = job
+        self._live.add(job["_id"])
+        await self.collection.add_data(job)
+        return job
+
+    def release(self, job: dict):
+        """Hands a job's undelivered chats over to the background worker."""
+        self._live.discard(job["_id"])
+        self._wakeup.set()
+
+    async def mark(self, job: dict, chat_id: int | str, error: str | None):
+        delivery = job["deliveries"][str(chat_id)]
+        delivery["attempts"] += 1
+        if error is None:
+            delivery.update(state=SENT, error=None)
+        elif delivery["attempts"] >= GBAN_MAX_ATTEMPTS:
+            delivery.update(state=FAILED, error=error)
+        else:
+            delivery.update(state=RETRYING, error=error, next_try=time.time() + get_backoff(delivery["attempts"]))
+
+        if not self.outstanding(job):
+            await self.finish(job)
+            return
+        try:
+            await self.collection.update_one({"_id": job["_id"]}, {"$set": {f"deliveries.{chat_id}": delivery}})
+        except Exception as e:
+            self._unsaved.add(job["_id"])
+            await bot.log_text(
+                text=f"#GBANS\nCould not save delivery state of job <code>{job['_id']}</code>, will retry: {e}",
+                type="GBAN_ERROR",
+            )
+            self._wakeup.set()
+
+    async def save_unsaved(self):
+        for job_id in list(self._unsaved):
+            job = self.jobs.get(job_id)
+            if job is None:
+                self._unsaved.discard(job_id)
+                continue
+            try:
+                await self.collection.add_data(job)
+            except Exception:
+                continue
+            self._unsaved.discard(job_id)
+
+    @staticmethod
+    def outstanding(job: dict) -> dict[str, dict]:
+        return {chat_id: d for chat_id, d in job["deliveries"].items() if d["state"] in OUTSTANDING}
+
+    async def finish(self, job: dict):
+        self.jobs.pop(job["_id"], None)
+        self._live.discard(job["_id"])
+        self._unsaved.discard(job["_id"])
+        await self.collection.delete_data(id=job["_id"])
+
+        retried = [d for d in job["deliveries"].values() if d["attempts"] > 1]
+        failed = [d["name"] for d in job["deliveries"].values() if d["state"] == FAILED]
+        if not retried and not failed:
+            return
+        await GBAN_LEDGER.update_delivery(job["_id"], failed)
+        text = (
+            f"#GBANS\n{job['task_type']} job <code>{job['_id']}</code> for {job['user_mention']} finished"
+            f" after retries.\n<b>Delivered</b>: {len(job['deliveries']) - len(failed)}/{len(job['deliveries'])}"
+        )
+        if failed:
+            text += "\n<b>Gave up on</b>:\n• " + "\n• ".join(failed)
+        await bot.log_text(text=text, type="GBAN_ERROR" if failed else "info")
+
+    async def _deliver(self, job: dict, chat_id: str):
+        key = (job["_id"], chat_id)
+        try:
+            error = None
+            try:
+                await FANOUT.send(int(chat_id), job["command"])
+            except Exception as e:
+                error = str(e)
+            if job["_id"] in self.jobs:
+                await self.mark(job, chat_id, error)
+        finally:
+            self._in_flight.discard(key)
+            self._wakeup.set()
+
+    async def run_worker(self):
+        while True:
+            await self.save_unsaved()
+            now = time.time()
+            next_due = now + WORKER_IDLE_SLEEP
+            if self._unsaved:
+                next_due = now + GBAN_RETRY_BASE
+            for job in list(self.jobs.values()):
+                if job["_id"] in self._live:
+                    continue
+                for chat_id, delivery in self.outstanding(job).items():
+                    key = (job["_id"], chat_id)
+                    if key in self._in_flight:
+                        continue
+                    if delivery["next_try"] <= now:
+                        self._in_flight.add(key)
+                        asyncio.create_task(self._deliver(job, chat_id))
+                    else:
+                        next_due = min(next_due, delivery["next_try"])
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(next_due - time.time(), 0.5))
+            except asyncio.TimeoutError:
+                pass
+
+
+GBAN_QUEUE = GbanJobQueue(GBAN_JOBS_DB)
+_worker_task: asyncio.Task | None = None
+
+
+async def init_task():
+    global _worker_task
+    await GBAN_QUEUE.load()
+    # Deliveries still "pending" were cut off by a restart mid fan-out; the worker picks them up.
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(GBAN_QUEUE.run_worker())
+
+
+@bot.add_cmd(cmd="gbanstatus")
+@admin_lane
+async def gban_status(bot: BOT, message: Message):
+    """
+    CMD: GBANSTATUS
+    INFO: Shows gban/ungban jobs that still have undelivered bot chats.
+    USAGE:
+        .gbanstatus
+    """
+    jobs = [job for job in GBAN_QUEUE.jobs.values() if GBAN_QUEUE.outstanding(job)]
+    if not jobs:
+        await message.reply("All gban deliveries are complete.", del_in=8)
+        return
+
+    now = time.time()
+    lines = [f"<b>{len(jobs)}</b> gban job(s) with outstanding deliveries:\n"]
+    for job in sorted(jobs, key=lambda job: job["created_at"]):
+        deliveries = job["deliveries"].values()
+        counts = {state: sum(1 for d in deliveries if d["state"] == state) for state in (SENT, PENDING, RETRYING, FAILED)}
+        lines.append(
+            f"<b>• {job['task_type']}</b> {job['user_mention']} <code>{job['_id']}</code>"
+            f"\n  sent {counts[SENT]} • pending {counts[PENDING]} • retrying {counts[RETRYING]} • failed {counts[FAILED]}"
+        )
+        for delivery in deliveries:
+            if delivery["state"] == RETRYING:
+                lines.append(
+                    f"  ↻ {delivery['name']}: attempt {delivery['attempts'] + 1}/{GBAN_MAX_ATTEMPTS}"
+                    f" in {format_wait(delivery['next_try'] - now)}"
+                )
+    await message.reply("\n".join(lines), del_in=60, block=True)
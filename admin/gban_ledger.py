@@ -0,0 +1,139 @@
+import time
+from datetime import datetime, timezone
+from pyrogram.types import User
+
+from app import BOT, CustomDB, Message, bot
+from ..tools.lanes import admin_lane
+
+GBAN_LEDGER_DB = CustomDB["GBAN_LEDGER"]
+MAX_HISTORY = 20
+ERROR_VISIBLE_DURATION = 8
+
+
+def format_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+
+class GbanLedger:
+    """
+    Local record of every gban/ungban we issued, one document per user with the latest state on
+    top and a short history below. Kept fully in memory so lookups never touch the database.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.entries: dict[int, dict] = {}
+
+    async def load(self):
+        self.entries = {int(entry["_id"]): entry async for entry in self.collection.find()}
+
+    def get(self, user_id: int) -> dict | None:
+        return self.entries.get(user_id)
+
+    async def record(
+        self,
+        user_id: int,
+        user_mention: str,
+        action: str,
+        reason: str,
+        proof_link: str = "",
+        origin: str = "",
+        job_id: str | None = None,
+        total: int = 0,
+        failed: list[str] | None = None,
+    ):
+        entry = self.entries.get(user_id) or {"_id": user_id, "history": []}
+        event = {
+            "action": action,
+            "reason": reason,
+            "proof": proof_link,
+            "origin": origin,
+            "at": time.time(),
+            "job_id": job_id,
+            "total": total,
+            "failed": failed or [],
+        }
+        entry.update(
+            mention=user_mention,
+            gbanned=action != "Un-Gban",
+            history=[event, *entry["history"]][:MAX_HISTORY],
+        )
+        self.entries[user_id] = entry
+        await self.collection.add_data(entry)
+
+    async def update_delivery(self, job_id: str, failed: list[str]):
+        """Called when background retries of a job settle, replacing the failures recorded at send time."""
+        for entry in self.entries.values():
+            event = entry["history"][0] if entry["history"] else None
+            if event and event["job_id"] == job_id:
+                event["failed"] = failed
+                await self.collection.add_data(entry)
+
+
+GBAN_LEDGER = GbanLedger(GBAN_LEDGER_DB)
+
+
+async def init_task():
+    await GBAN_LEDGER.load()
+
+
+def format_ledger_entry(entry: dict, history: int = 3) -> str:
+    latest = entry["history"][0]
+    status = "Gbanned" if entry["gbanned"] else "Not gbanned (ungbanned)"
+    text = (
+        f"<b>Status</b>: {status}"
+        f"\n<b>Reason</b>: {latest['reason'] or '-'}"
+        f"\n<b>When</b>: {format_timestamp(latest['at'])}"
+    )
+    if latest["proof"]:
+        text += f"\n<b>Proof</b>: {latest['proof']}"
+    if latest["origin"]:
+        text += f"\n<b>Initiated in</b>: {latest['origin']}"
+    if latest["total"]:
+        delivered = latest["total"] - len(latest["failed"])
+        text += f"\n<b>Delivered</b>: {delivered}/{latest['total']} bots"
+        if latest["failed"]:
+            text += "\n<b>Failed in</b>: " + ", ".join(latest["failed"])
+    older = entry["history"][1:history]
+    if older:
+        text += "\n<b>Earlier</b>:" + "".join(
+            f"\n• {event['action']} {format_timestamp(event['at'])}: {event['reason'] or '-'}" for event in older
+        )
+    return text
+
+
+@bot.add_cmd(cmd="gbaninfo")
+@admin_lane
+async def gban_info(bot: BOT, message: Message):
+    """
+    CMD: GBANINFO
+    INFO: Shows what the local gban ledger knows about a user: status, reason, proof, time and delivery.
+    USAGE:
+        .gbaninfo [user_id/@username/reply]
+    """
+    target = message.input.strip() if message.input else None
+    if not target and message.replied and message.replied.from_user:
+        target = message.replied.from_user.id
+    if not target:
+        await message.reply("Give a user id/username or reply to a user.", del_in=ERROR_VISIBLE_DURATION)
+        return
+
+    if isinstance(target, str) and target.lstrip("-").isdigit():
+        target = int(target)
+    if not isinstance(target, int):
+        try:
+            user: User = await bot.get_users(target)
+            target = user.id
+        except Exception as e:
+            await message.reply(f"<b>Error:</b> Could not find the user.\n<code>{e}</code>", del_in=ERROR_VISIBLE_DURATION)
+            return
+
+    entry = GBAN_LEDGER.get(target)
+    if not entry:
+        await message.reply(f"<code>{target}</code> has no gban record.", del_in=ERROR_VISIBLE_DURATION)
+        return
+
+    await message.reply(
+        f"<b>Gban ledger for</b> {entry['mention']}\n<b>ID</b>: <code>{target}</code>\n\n{format_ledger_entry(entry)}",
+        disable_preview=True,
+    )
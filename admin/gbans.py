@@ -1,17 +1,60 @@
-import asyncio
+from functools import partial
 
 from pyrogram.enums import ChatType
 from pyrogram.types import Chat, User
 from ub_core.utils.helpers import get_name
 
 from app import BOT, Config, CustomDB, Message, bot, extra_config
-
-GBAN_TASK_LOCK = asyncio.Lock()
+from ..tools.lanes import admin_lane
+from .fanout import FANOUT
+from .gban_jobs import GBAN_MAX_ATTEMPTS, GBAN_QUEUE
+from .gban_ledger import GBAN_LEDGER
 
 GBAN_DB = CustomDB["GBAN_CHAT_LIST"]
 
 
+class GbanChatList:
+    """In-memory copy of GBAN_CHAT_LIST, loaded once and kept in sync by writing through to the DB."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.chats: dict[int, dict] = {}
+        self.loaded = False
+
+    async def load(self):
+        self.chats = {int(chat["_id"]): chat async for chat in self.collection.find()}
+        self.loaded = True
+
+    async def get_all(self) -> dict[int, dict]:
+        if not self.loaded:
+            await self.load()
+        return self.chats
+
+    async def add(self, chat_id: int, data: dict):
+        await self.collection.add_data({"_id": chat_id, **data})
+        self.chats[chat_id] = {"_id": chat_id, **data}
+
+    async def remove(self, chat_id: int | str) -> int:
+        deleted: int = await self.collection.delete_data(id=chat_id)
+        if deleted:
+            self.chats.pop(chat_id, None)
+        return deleted
+
+    async def clear(self):
+        await self.collection.drop()
+        self.chats = {}
+        self.loaded = True
+
+
+GBAN_CHATS = GbanChatList(GBAN_DB)
+
+
+async def init_task():
+    await GBAN_CHATS.load()
+
+
 @bot.add_cmd(cmd="addg")
+@admin_lane
 async def add_gban_chat(bot: BOT, message: Message):
     """
     CMD: ADDG
@@ -20,13 +63,14 @@ async def add_gban_chat(bot: BOT, message: Message):
         .addg | .addg NAME
     """
     data = dict(name=message.input or message.chat.title, type=str(message.chat.type))
-    await GBAN_DB.add_data({"_id": message.chat.id, **data})
+    await GBAN_CHATS.add(message.chat.id, data)
     text = f"#GBANS\n<b>{data['name']}</b>: <code>{message.chat.id}</code> added to the GBAN bot chat list."
     await message.reply(text=text, del_in=5, block=True)
     await bot.log_text(text=text, type="info")
 
 
 @bot.add_cmd(cmd="delg")
+@admin_lane
 async def remove_gban_chat(bot: BOT, message: Message):
     """
     CMD: DELG
@@ -36,7 +80,7 @@ async def remove_gban_chat(bot: BOT, message: Message):
         .delg | .delg id | .delg -all
     """
     if "-all" in message.flags:
-        await GBAN_DB.drop()
+        await GBAN_CHATS.clear()
         await message.reply("GBAN bot chat list cleared.")
         return
 
@@ -49,7 +93,7 @@ async def remove_gban_chat(bot: BOT, message: Message):
     elif chat.lstrip("-").isdigit():
         chat = int(chat)
 
-    deleted: int = await GBAN_DB.delete_data(id=chat)
+    deleted: int = await GBAN_CHATS.remove(chat)
 
     if deleted:
         text = f"#GBANS\n<b>{name}</b><code>{chat}</code> removed from the GBAN bot chat list."
@@ -60,6 +104,7 @@ async def remove_gban_chat(bot: BOT, message: Message):
 
 
 @bot.add_cmd(cmd="listg")
+@admin_lane
 async def gban_chat_list(bot: BOT, message: Message):
     """
     CMD: LISTG
@@ -70,7 +115,7 @@ async def gban_chat_list(bot: BOT, message: Message):
     output: str = ""
     total = 0
 
-    async for gban_chat in GBAN_DB.find():
+    for gban_chat in (await GBAN_CHATS.get_all()).values():
         output += f'<b>• {gban_chat["name"]}</b>\n'
 
         if "-id" in message.flags:
@@ -87,6 +132,7 @@ async def gban_chat_list(bot: BOT, message: Message):
 
 
 @bot.add_cmd(cmd=["gban", "gbanp"])
+@admin_lane
 async def gban_user(bot: BOT, message: Message):
     progress: Message = await message.reply("❯")
     extracted_info = await get_user_reason(message=message, progress=progress)
@@ -101,11 +147,13 @@ async def gban_user(bot: BOT, message: Message):
         return
 
     proof_str: str = ""
+    proof_link: str = ""
     if message.cmd == "gbanp":
         if not message.replied:
             await progress.edit("Reply to a message with the proof.")
             return
         proof = await message.replied.forward(extra_config.FBAN_LOG_CHANNEL)
+        proof_link = proof.link
         proof_str = f"\n{ {proof.link} }"
 
     reason = f"{reason}{proof_str}"
@@ -129,10 +177,12 @@ async def gban_user(bot: BOT, message: Message):
         reason=reason,
         progress=progress,
         message=message,
+        proof_link=proof_link,
     )
 
 
 @bot.add_cmd(cmd="ungban")
+@admin_lane
 async def un_gban_user(bot: BOT, message: Message):
     progress: Message = await message.reply("❯")
     extracted_info = await get_user_reason(message=message, progress=progress)
@@ -177,55 +227,74 @@ async def perform_gban_task(
     reason: str,
     progress: Message,
     message: Message,
+    proof_link: str = "",
 ):
-    async with GBAN_TASK_LOCK:
-        await progress.edit("❯❯")
-
-        total: int = 0
-        failed: list[str] = []
-        success_count: int = 0
-
-        async for gban_chat in GBAN_DB.find():
-            chat_id = int(gban_chat["_id"])
-            total += 1
-
-            try:
-                await bot.send_message(chat_id=chat_id, text=command, disable_preview=True)
-                success_count += 1
-            except Exception as e:
-                await bot.log_text(
-                    text=f"Error while sending gban command to bot chat: {gban_chat['name']} [{chat_id}]"
-                    f"\nError: {e}",
-                    type="GBAN_ERROR",
-                )
-                failed.append(gban_chat["name"])
-                continue
-
-            await asyncio.sleep(1)
+    await progress.edit("❯❯")
 
-        if not total:
-            await progress.edit("You don't have any bot chats on the GBAN list! Use `.addg` to add one.")
-            return
+    gban_chats: dict[int, str] = {
+        chat_id: gban_chat["name"] for chat_id, gban_chat in (await GBAN_CHATS.get_all()).items()
+    }
+    total: int = len(gban_chats)
 
-        action_past_tense = task_type.replace("-", "") + "ned"
+    if not total:
+        await progress.edit("You don't have any bot chats on the GBAN list! Use `.addg` to add one.")
+        return
 
-        resp_str = (
-            f"❯❯❯ <b>{action_past_tense}</b> {user_mention}"
-            f"\n<b>ID</b>: {user_id}"
-            f"\n<b>Reason</b>: {reason}"
-            f"\n<b>Initiated in</b>: {message.chat.title or 'PM'}"
+    # The job is persisted before the first send, so a restart mid fan-out resumes from it.
+    job = await GBAN_QUEUE.create(command, task_type, user_id, user_mention, reason, gban_chats)
+    try:
+        result = await FANOUT.fan_out(
+            list(gban_chats),
+            command,
+            progress=progress,
+            status="❯❯ ",
+            on_result=partial(GBAN_QUEUE.mark, job),
+        )
+    finally:
+        GBAN_QUEUE.release(job)
+
+    failed: list[str] = []
+    for chat_id, error in result.failed.items():
+        await bot.log_text(
+            text=f"Error while sending gban command to bot chat: {gban_chats[chat_id]} [{chat_id}]"
+            f"\nError: {error}",
+            type="GBAN_ERROR",
         )
+        failed.append(gban_chats[chat_id])
 
-        if failed:
-            resp_str += f"\n<b>Failed</b> in: {len(failed)}/{total}\n• " + "\n• ".join(failed)
-        else:
-            resp_str += f"\n<b>Status</b>: {action_past_tense} in <b>{total}</b> bots."
+    await GBAN_LEDGER.record(
+        user_id=user_id,
+        user_mention=user_mention,
+        action=task_type,
+        reason=reason,
+        proof_link=proof_link,
+        origin=message.chat.title or "PM",
+        job_id=job["_id"],
+        total=total,
+        failed=failed,
+    )
 
-        if not message.is_from_owner:
-            resp_str += f"\n\n<b>By</b>: {get_name(message.from_user)}"
+    action_past_tense = task_type.replace("-", "") + "ned"
 
-        await bot.send_message(
-            chat_id=extra_config.FBAN_LOG_CHANNEL, text=resp_str, disable_preview=True
-        )
+    resp_str = (
+        f"❯❯❯ <b>{action_past_tense}</b> {user_mention}"
+        f"\n<b>ID</b>: {user_id}"
+        f"\n<b>Reason</b>: {reason}"
+        f"\n<b>Initiated in</b>: {message.chat.title or 'PM'}"
+    )
+
+    if failed:
+        resp_str += f"\n<b>Failed</b> in: {len(failed)}/{total}\n• " + "\n• ".join(failed)
+        if GBAN_MAX_ATTEMPTS > 1:
+            resp_str += "\n<i>Retrying in background, see</i> <code>.gbanstatus</code>"
+    else:
+        resp_str += f"\n<b>Status</b>: {action_past_tense} in <b>{total}</b> bots."
+
+    if not message.is_from_owner:
+        resp_str += f"\n\n<b>By</b>: {get_name(message.from_user)}"
+
+    await bot.send_message(
+        chat_id=extra_config.FBAN_LOG_CHANNEL, text=resp_str, disable_preview=True
+    )
 
-        await progress.edit(text=resp_str, del_in=5, block=True, disable_preview=True)
+    await progress.edit(text=resp_str, del_in=5, block=True, disable_preview=True)
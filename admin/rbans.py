@@ -2,8 +2,10 @@ import html
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd=["rban", "runban"])
+@admin_lane
 async def remote_ban_handler(bot: BOT, message: Message):
     if not message.input or len(message.input.split()) < 2:
         await message.reply(f"<b>Usage:</b> <code>.{message.cmd} [user] [chat] [reason]</code>", del_in=10)
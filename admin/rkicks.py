@@ -3,8 +3,10 @@ import asyncio
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="rkick")
+@admin_lane
 async def remote_kick_handler(bot: BOT, message: Message):
     if not message.input or len(message.input.split()) < 2:
         await message.reply("<b>Usage:</b> <code>.rkick [user] [chat] [reason]</code>", del_in=10)
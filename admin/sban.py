@@ -1,8 +1,10 @@
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="sban")
+@admin_lane
 async def silent_ban_handler(bot: BOT, message: Message) -> None:
     """
     CMD: SBAN
@@ -2,8 +2,10 @@ import asyncio
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="skick")
+@admin_lane
 async def silent_kick_handler(bot: BOT, message: Message):
     """
     CMD: SKICK
@@ -1,8 +1,10 @@
 from pyrogram.types import Message, User, ChatPermissions
 
 from app import BOT, bot
+from ..tools.lanes import admin_lane
 
 @bot.add_cmd(cmd="smute")
+@admin_lane
 async def silent_mute_handler(bot: BOT, message: Message):
     """
     CMD: SMUTE
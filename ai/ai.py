@@ -1,11 +1,11 @@
 import os
 import html
 import asyncio
-import requests
 from pyrogram.types import Message, ReplyParameters
 from dotenv import load_dotenv
 
 from app import BOT, bot
+from ..tools.http_client import HTTP
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODULES_DIR = os.path.dirname(SCRIPT_DIR)
@@ -49,7 +49,7 @@ async def ask_handler(bot: BOT, message: Message):
             "max_tokens": 2048 
         }
         
-        response = await asyncio.to_thread(requests.post, api_url, headers=headers, json=payload, timeout=300)
+        response = await HTTP.post(api_url, headers=headers, json=payload, timeout=300)
         response.raise_for_status()
         response_data = response.json()
         
@@ -76,7 +76,7 @@ async def ask_handler(bot: BOT, message: Message):
         else:
             raise Exception(f"API Error: {response_data.get('errors') or 'Unknown error'}")
 
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
          await progress_message.edit("<b>Error:</b> The request to the AI timed out.", del_in=ERROR_VISIBLE_DURATION)
     except Exception as e:
         await progress_message.edit(f"<b>Error:</b> Could not get a response.\n<code>{html.escape(str(e))}</code>", del_in=ERROR_VISIBLE_DURATION)
@@ -1,12 +1,13 @@
 import os
 import html
 import asyncio
-import requests
 import uuid
 from pyrogram.types import Message, ReplyParameters
 from dotenv import load_dotenv
 
 from app import BOT, bot
+from ..tools.workspace import create_workspace
+from ..tools.http_client import HTTP
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODULES_DIR = os.path.dirname(SCRIPT_DIR)
@@ -14,8 +15,6 @@ ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
 load_dotenv(dotenv_path=ENV_PATH)
 CF_ACCOUNT_ID = os.getenv("CF_ACCOUNT_ID")
 CF_API_TOKEN = os.getenv("CF_API_TOKEN")
-TEMP_DIR = "temp_codegen/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 15
 
 LANGUAGE_EXTENSIONS = {
@@ -42,10 +41,10 @@ LANGUAGE_EXTENSIONS = {
     "assembly": "asm", "asm": "asm",
 }
 
-def sync_save_code_to_file(code_string: str, file_ext: str) -> str:
+def sync_save_code_to_file(output_dir: str, code_string: str, file_ext: str) -> str:
     """Saves the code string to a unique temporary file and returns the path."""
     unique_id = str(uuid.uuid4())
-    output_path = os.path.join(TEMP_DIR, f"code_{unique_id}.{file_ext}")
+    output_path = os.path.join(output_dir, f"code_{unique_id}.{file_ext}")
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(code_string)
     return output_path
@@ -75,7 +74,7 @@ async def codegen_handler(bot: BOT, message: Message):
     progress_message = await message.reply("<code>Generating...</code>")
     
     output_path = ""
-    temp_files = []
+    workspace = None
     try:
         api_url = f"https://api.cloudflare.com/client/v4/accounts/{CF_ACCOUNT_ID}/ai/run/@hf/thebloke/codellama-7b-instruct-awq"
         headers = {"Authorization": f"Bearer {CF_API_TOKEN}"}
@@ -83,7 +82,7 @@ async def codegen_handler(bot: BOT, message: Message):
         full_prompt = f"In {language}, write a professional code that does the following: {prompt}. Only output the raw code, without any explanation or markdown formatting."
         payload = {"prompt": full_prompt}
         
-        response = await asyncio.to_thread(requests.post, api_url, headers=headers, json=payload, timeout=180)
+        response = await HTTP.post(api_url, headers=headers, json=payload, timeout=180)
         response.raise_for_status()
         response_data = response.json()
         
@@ -101,8 +100,8 @@ async def codegen_handler(bot: BOT, message: Message):
 
             file_extension = LANGUAGE_EXTENSIONS.get(language, "txt")
             
-            output_path = await asyncio.to_thread(sync_save_code_to_file, generated_code, file_extension)
-            temp_files.append(output_path)
+            workspace = await create_workspace("codegen", len(generated_code.encode()), progress_message)
+            output_path = await asyncio.to_thread(sync_save_code_to_file, workspace.path, generated_code, file_extension)
             
             await bot.send_document(
                 chat_id=message.chat.id,
@@ -120,6 +119,5 @@ async def codegen_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not generate code.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
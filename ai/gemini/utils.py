@@ -1,6 +1,4 @@
 import asyncio
-import shutil
-import time
 from functools import wraps
 from mimetypes import guess_type
 
@@ -10,6 +8,9 @@ from ub_core.utils import get_tg_media_details
 from app import BOT, Message, extra_config
 from app.plugins.ai.gemini import DB_SETTINGS, AIConfig, async_client
 
+from ...tools.jobs import track_job
+from ...tools.workspace import create_workspace, get_media_size
+
 
 def run_basic_check(function):
     @wraps(function)
@@ -30,29 +31,31 @@ def run_basic_check(function):
     return wrapper
 
 
-async def save_file(message: Message, check_size: bool = True) -> File | None:
+async def save_file(message: Message, check_size: bool = True, command: Message | None = None) -> File | None:
+    """Uploads the media of `message`; the job is listed under `command` if it isn't the media message itself."""
     media = get_tg_media_details(message)
 
     if check_size:
         assert getattr(media, "file_size", 0) <= 1048576 * 25, "File size exceeds 25mb."
 
-    download_dir = f"downloads/{time.time()}/"
-    try:
-        downloaded_file: str = await message.download(download_dir)
-        uploaded_file = await async_client.files.upload(
-            file=downloaded_file,
-            config={
-                "mime_type": getattr(media, "mime_type", None) or guess_type(downloaded_file)[0]
-            },
-        )
-        while uploaded_file.state.name == "PROCESSING":
-            await asyncio.sleep(5)
-            uploaded_file = await async_client.files.get(name=uploaded_file.name)
+    async with track_job("gemini-upload", command or message):
+        workspace = await create_workspace("gemini", get_media_size(message))
+        try:
+            downloaded_file: str = await message.download(workspace.dir)
+            uploaded_file = await async_client.files.upload(
+                file=downloaded_file,
+                config={
+                    "mime_type": getattr(media, "mime_type", None) or guess_type(downloaded_file)[0]
+                },
+            )
+            while uploaded_file.state.name == "PROCESSING":
+                await asyncio.sleep(5)
+                uploaded_file = await async_client.files.get(name=uploaded_file.name)
 
-        return uploaded_file
+            return uploaded_file
 
-    finally:
-        shutil.rmtree(download_dir, ignore_errors=True)
+        finally:
+            workspace.cleanup()
 
 
 PROMPT_MAP = {
@@ -93,7 +96,7 @@ async def create_prompts(
                 message.filtered_input or PROMPT_MAP.get(reply.media.value) or default_media_prompt
             )
             text_part = Part.from_text(text=prompt)
-            uploaded_file = await save_file(message=reply, check_size=check_size)
+            uploaded_file = await save_file(message=reply, check_size=check_size, command=message)
             file_part = Part.from_uri(file_uri=uploaded_file.uri, mime_type=uploaded_file.mime_type)
             return [text_part, file_part]
 
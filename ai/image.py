@@ -2,12 +2,13 @@ import os
 import html
 import uuid
 import asyncio
-import requests
 from pyrogram.types import Message, ReplyParameters
 from dotenv import load_dotenv
 from PIL import Image
 
 from app import BOT, bot
+from ..tools.workspace import create_workspace
+from ..tools.http_client import HTTP
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODULES_DIR = os.path.dirname(SCRIPT_DIR)
@@ -20,15 +21,13 @@ CF_API_TOKEN = os.getenv("CF_API_TOKEN")
 UBOT_DIR = os.path.dirname(os.path.dirname(MODULES_DIR)) 
 LOGO_PATH = "blank.png"
 
-TEMP_DIR = "temp_imagine/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
 def sync_add_watermark(image_path: str) -> str:
     """Opens an image from a file, adds a watermark, and saves it to a new file."""
     
     base, ext = os.path.splitext(os.path.basename(image_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_wm.png")
+    output_path = os.path.join(os.path.dirname(image_path), f"{base}_wm.png")
 
     main_image = Image.open(image_path).convert("RGBA")
     
@@ -73,23 +72,22 @@ async def imagine_handler(bot: BOT, message: Message):
     progress_message = await message.reply("<code>Generating...</code>")
     
     generated_path, watermarked_path = "", ""
-    temp_files = []
+    workspace = None
     try:
         api_url = f"https://api.cloudflare.com/client/v4/accounts/{CF_ACCOUNT_ID}/ai/run/@cf/stabilityai/stable-diffusion-xl-base-1.0"
         headers = {"Authorization": f"Bearer {CF_API_TOKEN}"}
         payload = {"prompt": prompt}
         
-        response = await asyncio.to_thread(requests.post, api_url, headers=headers, json=payload)
+        response = await HTTP.post(api_url, headers=headers, json=payload, timeout=180)
 
         if response.ok:
+            workspace = await create_workspace("imagine", len(response.content) * 2, progress_message)
             unique_id = str(uuid.uuid4())
-            generated_path = os.path.join(TEMP_DIR, f"{unique_id}.png")
+            generated_path = workspace.path_for(f"{unique_id}.png")
             with open(generated_path, "wb") as f:
                 f.write(response.content)
-            temp_files.append(generated_path)
             
             watermarked_path = await asyncio.to_thread(sync_add_watermark, generated_path)
-            temp_files.append(watermarked_path)
             
             await bot.send_photo(
                 chat_id=message.chat.id,
@@ -107,6 +105,5 @@ async def imagine_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not generate image.\n<code>{html.escape(str(e))}</code>"
         await progress_message.reply(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
@@ -0,0 +1,55 @@
+import os
+import time
+from dotenv import load_dotenv
+
+from app import CustomDB
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+RELEASES_CACHE_TTL = float(os.getenv("RELEASES_CACHE_TTL_HOURS", "6")) * 3600
+XIAOMI_CACHE_TTL = float(os.getenv("XIAOMI_CACHE_TTL_HOURS", "168")) * 3600
+
+ANDROID_CACHE_DB = CustomDB["ANDROID_LOOKUP_CACHE"]
+
+
+class LookupCache:
+    """
+    Persistent TTL cache for slow-changing lookups (GitHub releases, device codenames).
+    Entries keep the ETag they were served with, so an expired entry can be revalidated
+    with a conditional request instead of being downloaded again.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._entries: dict[str, dict] = {}
+
+    async def load(self):
+        self._entries = {entry["_id"]: entry async for entry in self.collection.find()}
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+    @staticmethod
+    def is_fresh(entry: dict | None, ttl: float) -> bool:
+        return bool(entry) and time.time() - entry["fetched"] < ttl
+
+    async def set(self, key: str, value, etag: str | None = None):
+        entry = {"_id": key, "value": value, "etag": etag, "fetched": time.time()}
+        self._entries[key] = entry
+        await self.collection.add_data(entry)
+
+    async def touch(self, key: str):
+        """Marks an entry as revalidated (the server answered 304 Not Modified)."""
+        entry = self._entries[key]
+        entry["fetched"] = time.time()
+        await self.collection.add_data({"_id": key, "fetched": entry["fetched"]})
+
+
+ANDROID_CACHE = LookupCache(ANDROID_CACHE_DB)
+
+
+async def init_task():
+    await ANDROID_CACHE.load()
@@ -1,16 +1,47 @@
-import requests
 import asyncio
 import html
 from pyrogram.types import LinkPreviewOptions, Message
 
+from ..tools.http_client import HTTP
+from .cache import ANDROID_CACHE, RELEASES_CACHE_TTL
+
 ERROR_VISIBLE_DURATION = 8
 
-def sync_get_releases(owner: str, repo: str) -> list:
+async def fetch_releases(owner: str, repo: str, etag: str | None = None) -> tuple[list | None, str | None]:
+    """Returns (releases, etag); releases is None when the server says our copy is still current (304)."""
     api_url = f"https://api.github.com/repos/{owner}/{repo}/releases"
     headers = {"Accept": "application/vnd.github.v3+json"}
-    response = requests.get(api_url, headers=headers)
+    if etag:
+        # Conditional requests answered with 304 don't count against the rate limit.
+        headers["If-None-Match"] = etag
+    response = await HTTP.get(api_url, headers=headers, timeout=15)
+    if response.status_code == 304:
+        return None, etag
     response.raise_for_status()
-    return response.json()
+    return response.json(), response.headers.get("ETag")
+
+async def get_releases(owner: str, repo: str) -> list:
+    key = f"releases:{owner}/{repo}"
+    entry = ANDROID_CACHE.get(key)
+    if ANDROID_CACHE.is_fresh(entry, RELEASES_CACHE_TTL):
+        return entry["value"]
+    try:
+        releases, etag = await fetch_releases(owner, repo, entry and entry["etag"])
+    except Exception:
+        # GitHub unreachable or rate limited: a stale list beats an error.
+        if entry:
+            return entry["value"]
+        raise
+    if releases is None:
+        await ANDROID_CACHE.touch(key)
+        return entry["value"]
+    # Only the fields we render are kept, the full API response is large.
+    releases = [
+        {field: release[field] for field in ("html_url", "tag_name", "published_at", "prerelease")}
+        for release in releases
+    ]
+    await ANDROID_CACHE.set(key, releases, etag)
+    return releases
 
 async def get_android_versions(bot, message: Message, owner: str, repo: str, show_both: bool = False):
     display_name = repo
@@ -20,7 +51,7 @@ async def get_android_versions(bot, message: Message, owner: str, repo: str, sho
     progress_message = await message.reply(f"<code>Checking for latest {display_name} releases...</code>")
     
     try:
-        releases_data = await asyncio.to_thread(sync_get_releases, owner, repo)
+        releases_data = await get_releases(owner, repo)
         
         if not releases_data:
             raise ValueError("No releases found for this repository.")
@@ -1,12 +1,12 @@
 # xiaomi.py
 
 from app import BOT, bot
-from pyrogram import Client, types, filters
+from pyrogram import Client, types
+from ..tools.responses import RESPONSES
+from .cache import ANDROID_CACHE, XIAOMI_CACHE_TTL
 
-# A dictionary to temporarily store the original chat and message ID
-# for each user's command. This allows the bot to know where to quote
-# the Xiaomi bot's response.
-pending_commands = {}
+XIAOMI_BOT_USERNAME = "xiaomigeeksbot"
+XIAOMI_TIMEOUT = 20
 
 @bot.add_cmd(cmd=["whatis", "xiaomi"])
 async def xiaomi_lookup_command(client: Client, message: types.Message):
@@ -20,61 +20,40 @@ async def xiaomi_lookup_command(client: Client, message: types.Message):
         return
 
     codename = message.command[1].strip()
-    
-    # 2. Store the original message details
-    original_user_id = message.from_user.id
-    if original_user_id in pending_commands:
-        await message.reply_text("A previous Xiaomi lookup is pending. Please wait.")
+    cache_key = f"xiaomi:{codename.lower()}"
+
+    # Device info doesn't change; answer repeated lookups without asking the bot again.
+    entry = ANDROID_CACHE.get(cache_key)
+    if ANDROID_CACHE.is_fresh(entry, XIAOMI_CACHE_TTL):
+        await message.reply_text(f"**Xiaomi Bot's response:**\n\n> {entry['value']}", quote=True)
         return
-        
-    pending_commands[original_user_id] = {
-        "chat_id": message.chat.id,
-        "message_id": message.id
-    }
     
-    # 3. Send the command to the Xiaomi bot
-    XIAOMI_BOT_USERNAME = "xiaomigeeksbot"
+    # 2. Send the command to the Xiaomi bot. Each lookup waits for its own reply,
+    # matched by the codename in the text, so lookups never block each other.
     xiaomi_command_text = f"/whatis {codename}"
+    waiter = None
 
     try:
-        await client.send_message(
-            chat_id=XIAOMI_BOT_USERNAME,
+        xiaomi_id = await RESPONSES.resolve_chat_id(client, XIAOMI_BOT_USERNAME)
+        waiter = RESPONSES.expect(xiaomi_id, hint=codename)
+        sent = await client.send_message(
+            chat_id=xiaomi_id,
             text=xiaomi_command_text,
             disable_notification=True
         )
-        await message.reply_text(f"Sent lookup command for `{codename}` to Xiaomi bot. Waiting for a response...", quote=True)
+        waiter.reply_to.add(sent.id)
+        status = await message.reply_text(f"Sent lookup command for `{codename}` to Xiaomi bot. Waiting for a response...", quote=True)
     except Exception as e:
+        if waiter:
+            waiter.cancel()
         await message.reply_text(f"An error occurred while sending the command to the Xiaomi bot: {e}")
-        del pending_commands[original_user_id]
-
-
-# 4. Listen for the Xiaomi bot's response
-@Client.on_message(filters.chat("xiaomigeeksbot") & filters.private)
-async def xiaomi_response_handler(client: Client, message: types.Message):
-    """
-    Listens for messages from @xiaomigeeksbot and quotes them back
-    to the original group chat.
-    """
-    
-    # The userbot's ID is used as the key in the pending_commands dictionary.
-    userbot_id = client.me.id
-    
-    if userbot_id in pending_commands:
-        original_command_data = pending_commands[userbot_id]
-        
-        try:
-            # Get the original chat and message ID
-            original_chat_id = original_command_data["chat_id"]
-            original_message_id = original_command_data["message_id"]
+        return
 
-            # Quote the Xiaomi bot's message in the original chat
-            await client.send_message(
-                chat_id=original_chat_id,
-                text=f"**Xiaomi Bot's response:**\n\n> {message.text}",
-                reply_to_message_id=original_message_id
-            )
-        except Exception as e:
-            print(f"Failed to quote the Xiaomi bot's message: {e}")
-        
-        # Clean up the entry from the pending commands
-        del pending_commands[userbot_id]
\ No newline at end of file
+    # 3. Quote the Xiaomi bot's response back to the original chat
+    response = await waiter.get(timeout=XIAOMI_TIMEOUT)
+    if not response:
+        await status.edit_text("The Xiaomi bot did not respond in time.")
+        return
+    await status.edit_text(f"**Xiaomi Bot's response:**\n\n> {response.text}")
+    if response.text and "not found" not in response.text.lower():
+        await ANDROID_CACHE.set(cache_key, response.text)
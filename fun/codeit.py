@@ -5,9 +5,8 @@ import uuid
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from ..tools.workspace import create_workspace
 
-TEMP_DIR = "temp_codeit/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
 LANGUAGES = {
@@ -108,9 +107,9 @@ def generate_code(language: str, text: str) -> str:
     }
     return code_templates.get(language, f"// Language '{language}' not supported.")
 
-def sync_save_code_to_file(code_string: str, file_ext: str) -> str:
+def sync_save_code_to_file(output_dir: str, code_string: str, file_ext: str) -> str:
     unique_id = str(uuid.uuid4())
-    output_path = os.path.join(TEMP_DIR, f"main_{unique_id}.{file_ext}")
+    output_path = os.path.join(output_dir, f"main_{unique_id}.{file_ext}")
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(code_string)
     return output_path
@@ -152,12 +151,12 @@ async def codeit_handler(bot: BOT, message: Message):
     progress_message = await message.reply("<code>Generating code...</code>")
     
     output_path = ""
-    temp_files = []
+    workspace = None
     try:
         code_output = generate_code(lang_name, text_to_code)
         
-        output_path = await asyncio.to_thread(sync_save_code_to_file, code_output, file_ext)
-        temp_files.append(output_path)
+        workspace = await create_workspace("codeit", len(code_output.encode()), progress_message)
+        output_path = await asyncio.to_thread(sync_save_code_to_file, workspace.path, code_output, file_ext)
         
         preview_code = safe_escape(code_output)
         caption = f'<pre class="language-{lang_alias}">{preview_code}</pre>'
@@ -183,6 +182,5 @@ async def codeit_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not generate code.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
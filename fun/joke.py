@@ -1,9 +1,9 @@
 import html
-import requests
 import asyncio
 from pyrogram.types import Message
 
 from app import BOT, bot
+from ..tools.http_client import HTTP
 
 API_URL = "https://official-joke-api.appspot.com/random_joke"
 ERROR_VISIBLE_DURATION = 8
@@ -12,9 +12,9 @@ def safe_escape(text: str) -> str:
     escaped_text = html.escape(str(text))
     return escaped_text.replace("&#x27;", "’")
 
-def sync_get_joke() -> dict:
-    """Synchronously fetches a random joke."""
-    response = requests.get(API_URL)
+async def get_joke() -> dict:
+    """Fetches a random joke."""
+    response = await HTTP.get(API_URL)
     response.raise_for_status()
     return response.json()
 
@@ -28,7 +28,7 @@ async def joke_handler(bot: BOT, message: Message):
     progress_message = await message.reply("<code>Finding a good joke...</code>")
     
     try:
-        joke_data = await asyncio.to_thread(sync_get_joke)
+        joke_data = await get_joke()
         
         setup = joke_data.get("setup")
         punchline = joke_data.get("punchline")
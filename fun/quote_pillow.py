@@ -5,6 +5,8 @@ import urllib.request
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 from app import BOT, bot, Message
+from ..tools.lanes import run_media
+from ..tools.workspace import create_workspace
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 FONT_DIR = os.path.join(SCRIPT_DIR, "fonts")
@@ -259,7 +261,8 @@ async def quote_cmd_handler(bot: BOT, message: Message):
     full_name = clean_unicode_name(raw_name)
     status_msg = await message.reply("[1/3] Downloading target photo...")
     
-    pfp_path = os.path.abspath(f"temp_pfp_{getattr(target_user, 'id', random.randint(1000,9999))}.jpg")
+    workspace = await create_workspace("quote")
+    pfp_path = workspace.path_for(f"pfp_{getattr(target_user, 'id', random.randint(1000,9999))}.jpg")
     pfp_exists = False
     
     try:
@@ -281,20 +284,20 @@ async def quote_cmd_handler(bot: BOT, message: Message):
             pfp_exists = True
             
     except Exception as download_error:
-        if os.path.exists(pfp_path):
-            os.remove(pfp_path)
+        workspace.cleanup()
         await safe_edit_status(status_msg, message, f"Failed to fetch profile image: {str(download_error)}")
         return
 
     status_msg = await safe_edit_status(status_msg, message, "[2/3] Processing layout...")
     
     try:
-        final_photo_stream = generate_quote_image(
-            pfp_path=pfp_path,
-            author_name=full_name,
-            text=quote_text if quote_text else "No text provided.",
-            font_flag=font_flag,
-            shape_name=shape_name
+        final_photo_stream = await run_media(
+            generate_quote_image,
+            pfp_path,
+            full_name,
+            quote_text if quote_text else "No text provided.",
+            font_flag,
+            shape_name
         )
         
         status_msg = await safe_edit_status(status_msg, message, "[3/3] Sending quote image...")
@@ -306,5 +309,4 @@ async def quote_cmd_handler(bot: BOT, message: Message):
     except Exception as e:
         await safe_edit_status(status_msg, message, f"Generation Failed: {str(e)}")
     finally:
-        if os.path.exists(pfp_path):
-            os.remove(pfp_path)
\ No newline at end of file
+        workspace.cleanup()
\ No newline at end of file
@@ -5,20 +5,19 @@ from gtts import gTTS
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from ..tools.workspace import create_workspace
 
-TEMP_DIR = "temp_audio"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
 def safe_escape(text: str) -> str:
     escaped_text = html.escape(str(text))
     return escaped_text.replace("&#x27;", "’")
 
-def sync_gtts(text: str, lang: str) -> str:
+def sync_gtts(output_dir: str, text: str, lang: str) -> str:
     """
     Synchronous function to generate a speech file using gTTS.
     """
-    output_path = os.path.join(TEMP_DIR, f"{hash(text + lang)}.mp3")
+    output_path = os.path.join(output_dir, f"{hash(text + lang)}.mp3")
     tts = gTTS(text=text, lang=lang, slow=False)
     tts.save(output_path)
     return output_path
@@ -51,9 +50,10 @@ async def tts_handler(bot: BOT, message: Message):
 
     progress_message = await message.reply("<code>Converting text to speech...</code>")
     
-    file_path = ""
+    workspace = None
     try:
-        file_path = await asyncio.to_thread(sync_gtts, text_to_speak, lang)
+        workspace = await create_workspace("tts", progress=progress_message)
+        file_path = await asyncio.to_thread(sync_gtts, workspace.path, text_to_speak, lang)
 
         await progress_message.edit("<code>Sending...</code>")
         await bot.send_voice(
@@ -71,5 +71,5 @@ async def tts_handler(bot: BOT, message: Message):
         try: await message.delete()
         except: pass
     finally:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
+        if workspace:
+            workspace.cleanup()
@@ -1,9 +1,10 @@
 import html
-import requests
 import asyncio
 from pyrogram.types import LinkPreviewOptions, Message
 
 from app import BOT, bot
+from ..tools.http_client import HTTP
+from ..tools.response_cache import cached_response
 
 API_URL = "http://api.urbandictionary.com/v0/define"
 ERROR_VISIBLE_DURATION = 8
@@ -12,10 +13,11 @@ def safe_escape(text: str) -> str:
     escaped_text = html.escape(str(text))
     return escaped_text.replace("&#x27;", "’")
 
-def sync_urban_search(term: str) -> dict | None:
-    """Synchronously searches Urban Dictionary for a term."""
+@cached_response("ud", ttl=24 * 3600, stale_ttl=7 * 24 * 3600, persist=True, normalize=str.lower)
+async def urban_search(term: str) -> dict | None:
+    """Searches Urban Dictionary for a term."""
     params = {"term": term}
-    response = requests.get(API_URL, params=params)
+    response = await HTTP.get(API_URL, params=params)
     response.raise_for_status()
     data = response.json()
     
@@ -42,7 +44,7 @@ async def urban_dictionary_handler(bot: BOT, message: Message):
     progress_message = await message.reply(f"<code>Searching Urban Dictionary for: {safe_escape(term_to_search)}...</code>")
 
     try:
-        result = await asyncio.to_thread(sync_urban_search, term_to_search)
+        result = await urban_search(term_to_search)
         
         if result:
             word = result.get("word", "N/A")
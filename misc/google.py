@@ -4,6 +4,7 @@ from googlesearch import search
 from pyrogram.types import LinkPreviewOptions, Message
 
 from app import BOT, bot
+from ..tools.response_cache import cached_response
 
 ERROR_VISIBLE_DURATION = 8
 
@@ -11,6 +12,10 @@ def sync_search(query: str):
     """Synchronous search function to be run in a separate thread."""
     return list(search(query, num_results=5, sleep_interval=1))
 
+@cached_response("g", ttl=3600, stale_ttl=6 * 3600, normalize=str.lower)
+async def google_search(query: str) -> list:
+    return await asyncio.to_thread(sync_search, query)
+
 @bot.add_cmd(cmd=["g", "google"])
 async def google_search_handler(bot: BOT, message: Message):
     """
@@ -27,7 +32,7 @@ async def google_search_handler(bot: BOT, message: Message):
     progress_message = await message.reply(f"<code>Searching Google for: {query}</code>...")
 
     try:
-        search_results = await asyncio.to_thread(sync_search, query)
+        search_results = await google_search(query)
         
         if not search_results:
             await progress_message.edit(f"No results found for <code>{query}</code>.")
@@ -1,11 +1,11 @@
 import os
 import html
-import asyncio
-import requests
 from datetime import datetime
 from pyrogram.types import Message, LinkPreviewOptions, ReplyParameters
 
 from app import BOT, bot
+from ..tools.http_client import HTTP
+from ..tools.response_cache import cached_response
 
 REPO_OWNER = "Syntaxspin"
 REPO_NAME = "PlainUB-Extras"
@@ -19,8 +19,9 @@ MODULES_DIR = os.path.dirname(SCRIPT_DIR)
 BOT_ROOT = os.path.dirname(os.path.dirname(MODULES_DIR))
 BACKGROUND_IMAGE_PATH = os.path.join(BOT_ROOT, "assets", "dark.png")
 
-def fetch_repo_data_sync() -> dict:
-    response = requests.get(REPO_API_URL, timeout=10)
+@cached_response("mods", ttl=600, stale_ttl=3600)
+async def fetch_repo_data() -> dict:
+    response = await HTTP.get(REPO_API_URL, timeout=10)
     response.raise_for_status()
     data = response.json()
     
@@ -44,7 +45,7 @@ async def repo_handler(bot: BOT, message: Message):
     progress_msg = await message.reply("<code>Fetching repository information...</code>")
     
     try:
-        repo_data = await asyncio.to_thread(fetch_repo_data_sync)
+        repo_data = await fetch_repo_data()
         
         caption = (
             f"<a href='{REPO_URL}'><b>PlainUB-Extras</b></a>, additional modules and features designed for use with "
@@ -1,19 +1,22 @@
 import html
-import requests
 import asyncio
 from pyrogram.types import LinkPreviewOptions, Message
 
 from app import BOT, bot
+from ..tools.http_client import HTTP
+from ..tools.response_cache import cached_response
 
 API_URL = "https://tinyurl.com/api-create.php"
 ERROR_VISIBLE_DURATION = 8
 
-def sync_shorten(url: str) -> str:
+# A short link never changes, so a long URL is only ever shortened once.
+@cached_response("sl", ttl=30 * 24 * 3600, persist=True)
+async def shorten(url: str) -> str:
     """
-    Synchronous shorten function using tinyurl.com's simple text API.
+    Shortens a URL using tinyurl.com's simple text API.
     """
     params = {"url": url}
-    response = requests.get(API_URL, params=params)
+    response = await HTTP.get(API_URL, params=params)
     response.raise_for_status()
     return response.text
 
@@ -39,7 +42,7 @@ async def shortlink_handler(bot: BOT, message: Message):
     progress_message = await message.reply("<code>Shortening link...</code>")
     
     try:
-        shortened_url = await asyncio.to_thread(sync_shorten, url_to_shorten)
+        shortened_url = await shorten(url_to_shorten)
         
         if shortened_url and shortened_url.startswith("http"):
             final_text = (
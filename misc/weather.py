@@ -1,12 +1,20 @@
 import html
-import asyncio
-import requests
 from pyrogram.types import Message
 
 from app import BOT, bot
+from ..tools.http_client import HTTP
+from ..tools.response_cache import cached_response
 
 API_URL = "https://wttr.in/"
 
+@cached_response("weather", ttl=600, stale_ttl=1800, normalize=str.lower)
+async def fetch_weather(location: str) -> dict:
+    params = {"format": "j1"}
+    headers = {"User-Agent": "curl/7.81.0"}
+    response = await HTTP.get(f"{API_URL}{location}", params=params, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
 @bot.add_cmd(cmd=["weather", "wttr"])
 async def weather_handler(bot: BOT, message: Message):
     """
@@ -23,15 +31,7 @@ async def weather_handler(bot: BOT, message: Message):
     progress_msg = await message.reply(f"<code>Fetching weather...</code>")
 
     try:
-        def do_request():
-            params = {"format": "j1"}
-            headers = {"User-Agent": "curl/7.81.0"}
-            return requests.get(f"{API_URL}{location}", params=params, headers=headers, timeout=10)
-
-        response = await asyncio.to_thread(do_request)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = await fetch_weather(location)
 
         try:
             current = data['current_condition'][0]
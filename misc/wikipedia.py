@@ -4,6 +4,7 @@ import asyncio
 from pyrogram.types import LinkPreviewOptions, Message
 
 from app import BOT, bot
+from ..tools.response_cache import cached_response
 
 ERROR_VISIBLE_DURATION = 8
 WIKI_LANG = "en"
@@ -25,6 +26,10 @@ def sync_wiki_search(query: str) -> tuple[str, str, str] | None:
         return page.title, summary, page.fullurl
     return None
 
+@cached_response("wiki", ttl=24 * 3600, stale_ttl=7 * 24 * 3600, persist=True)
+async def wiki_search(query: str) -> tuple[str, str, str] | None:
+    return await asyncio.to_thread(sync_wiki_search, query)
+
 @bot.add_cmd(cmd=["wiki", "wikipedia"])
 async def wiki_handler(bot: BOT, message: Message):
     """
@@ -43,7 +48,7 @@ async def wiki_handler(bot: BOT, message: Message):
     progress_message = await message.reply(f"<code>Searching Wikipedia for: {safe_escape(query)}...</code>")
 
     try:
-        result = await asyncio.to_thread(sync_wiki_search, query)
+        result = await wiki_search(query)
         
         if result:
             title, summary, url = result
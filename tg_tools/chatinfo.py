@@ -1,12 +1,9 @@
-import os
 import html
-import shutil
 from pyrogram.enums import ChatType
 from pyrogram.types import Chat, Message, LinkPreviewOptions, ReplyParameters
 
 from app import BOT, bot
-
-TEMP_CINFO_DIR = "temp_cinfo_photos/"
+from ..tools.workspace import create_workspace
 
 def safe_escape(text: str) -> str:
     return html.escape(str(text)) if text else ""
@@ -90,10 +87,10 @@ async def chat_info_handler(bot: BOT, message: Message):
         final_text, photo_id = await format_chat_info(target_chat, is_full_mode)
 
         if photo_id:
-            photo_path = ""
+            workspace = None
             try:
-                os.makedirs(TEMP_CINFO_DIR, exist_ok=True)
-                photo_path = await bot.download_media(photo_id, file_name=TEMP_CINFO_DIR)
+                workspace = await create_workspace("chatinfo")
+                photo_path = await bot.download_media(photo_id, file_name=workspace.dir)
                 
                 await bot.send_photo(
                     chat_id=message.chat.id,
@@ -103,8 +100,8 @@ async def chat_info_handler(bot: BOT, message: Message):
                 )
                 await progress_msg.delete()
             finally:
-                if os.path.exists(photo_path):
-                    shutil.rmtree(TEMP_CINFO_DIR, ignore_errors=True)
+                if workspace:
+                    workspace.cleanup()
         else:
             await progress_msg.edit(
                 final_text,
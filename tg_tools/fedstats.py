@@ -1,18 +1,20 @@
 import asyncio
 import html
 import re
-from datetime import datetime, timezone
 
 from pyrogram import filters
 from pyrogram.errors import PeerIdInvalid, UserIsBlocked
 from pyrogram.types import LinkPreviewOptions, Message, User
 
 from app import BOT, bot
+from ..admin.gban_ledger import GBAN_LEDGER, format_ledger_entry
+from ..tools.responses import RESPONSES
 
 FED_BOTS_TO_QUERY = [
     609517172,  # Rose
     1376954911,  # AstrakoBot
 ]
+FILE_TIMEOUT = 15
 
 def safe_escape(text: str) -> str:
     escaped_text = html.escape(str(text))
@@ -28,23 +30,6 @@ def parse_text_response(response: Message) -> str:
     else:
         return f"<b>• {bot_name}:</b> <blockquote expandable>{safe_escape(text)}</blockquote>"
 
-async def find_latest_file_in_history(bot: BOT, chat_id: int, timeout: int = 15) -> Message | None:
-    """
-    Actively polls message history to find the newest file message.
-    This is a robust alternative to event handlers for race conditions.
-    """
-    start_time = datetime.now(timezone.utc)
-    while (datetime.now(timezone.utc) - start_time).total_seconds() < timeout:
-        try:
-            async for message in bot.get_chat_history(chat_id, limit=1):
-                if message.document and message.date > start_time:
-                    return message
-        except Exception:
-            pass
-        await asyncio.sleep(0.5)
-    return None
-
-
 async def query_single_bot(bot: BOT, bot_id: int, user_to_check: User) -> tuple[str, Message | None]:
     """Queries a single bot using a robust method."""
     bot_info = await bot.get_users(bot_id)
@@ -56,12 +41,13 @@ async def query_single_bot(bot: BOT, bot_id: int, user_to_check: User) -> tuple[
             response = await sent_cmd.get_response(filters=filters.user(bot_id), timeout=20)
 
         if response.reply_markup and "Make the fedban file" in str(response.reply_markup):
+            file_waiter = RESPONSES.expect(bot_id, lambda msg: bool(msg.document))
             try:
                 await response.click(0)
             except Exception:
                 pass
             
-            file_message = await find_latest_file_in_history(bot, bot_id)
+            file_message = await file_waiter.get(timeout=FILE_TIMEOUT)
             
             if file_message:
                 result_text = f"<b>• {bot_info.first_name}:</b> Bot sent a file with the full ban list. Sending..."
@@ -99,6 +85,18 @@ async def fed_stat_handler(bot: BOT, message: Message):
     except Exception as e:
         return await progress.edit(f"<b>Error:</b> Could not find the specified user.\n<code>{e}</code>", del_in=8)
 
+    ledger_entry = GBAN_LEDGER.get(user_to_check.id)
+    ledger_text = (
+        f"<b>Local gban ledger:</b>\n{format_ledger_entry(ledger_entry, history=1)}"
+        if ledger_entry
+        else "<b>Local gban ledger:</b> No record"
+    )
+    # The ledger answers instantly; show it while the remote bots are queried.
+    await progress.edit(
+        f"<b>Federation Status for:</b> {user_to_check.mention}\n\n{ledger_text}\n\n<code>Querying fed bots...</code>",
+        link_preview_options=LinkPreviewOptions(is_disabled=True)
+    )
+
     tasks = [query_single_bot(bot, bot_id, user_to_check) for bot_id in FED_BOTS_TO_QUERY]
     all_results = await asyncio.gather(*tasks)
 
@@ -113,6 +111,7 @@ async def fed_stat_handler(bot: BOT, message: Message):
     final_report = (
         f"<b>Federation Status for:</b> {user_to_check.mention}\n"
         f"<b>ID:</b> <code>{user_to_check.id}</code>\n\n"
+        f"{ledger_text}\n\n"
         f"{'\n'.join(result_texts)}"
     )
 
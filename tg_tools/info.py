@@ -1,12 +1,9 @@
-import os
 import html
-import shutil
 from pyrogram.enums import ChatType, UserStatus, ChatMemberStatus
 from pyrogram.types import Message, User, LinkPreviewOptions, ReplyParameters
 
 from app import BOT, bot
-
-TEMP_INFO_DIR = "temp_info_photos/"
+from ..tools.workspace import create_workspace
 
 def safe_escape(text: str) -> str:
     return html.escape(str(text)) if text else ""
@@ -102,10 +99,10 @@ async def info_handler(bot: BOT, message: Message):
         final_text, photo_id = await format_user_info(target_user, is_full_mode, message)
         
         if photo_id:
-            photo_path = ""
+            workspace = None
             try:
-                os.makedirs(TEMP_INFO_DIR, exist_ok=True)
-                photo_path = await bot.download_media(photo_id, file_name=TEMP_INFO_DIR)
+                workspace = await create_workspace("info")
+                photo_path = await bot.download_media(photo_id, file_name=workspace.dir)
                 await bot.send_photo(
                     chat_id=message.chat.id,
                     photo=photo_path,
@@ -114,8 +111,8 @@ async def info_handler(bot: BOT, message: Message):
                 )
                 await progress_msg.delete()
             finally:
-                if os.path.exists(photo_path):
-                    shutil.rmtree(TEMP_INFO_DIR, ignore_errors=True)
+                if workspace:
+                    workspace.cleanup()
         else:
             await progress_msg.edit(
                 final_text,
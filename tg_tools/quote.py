@@ -1,29 +1,14 @@
 import asyncio
 import html
-from datetime import datetime, timezone
 from pyrogram.types import Message, User
 
 from app import BOT, bot
+from ..tools.responses import RESPONSES
 
 QUOTLY_BOT_ID = 1031952739
 QUOTLY_TIMEOUT = 15
 ERROR_VISIBLE_DURATION = 8
 
-async def find_quotly_response_in_history(bot: BOT, timeout: int) -> Message | None:
-    start_time = datetime.now(timezone.utc)
-    while (datetime.now(timezone.utc) - start_time).total_seconds() < timeout:
-        try:
-            async for last_message in bot.get_chat_history(QUOTLY_BOT_ID, limit=1):
-                if last_message.date > start_time and (
-                    not last_message.from_user or not last_message.from_user.is_self
-                ):
-                    return last_message
-        except Exception:
-            pass
-        await asyncio.sleep(0.5)
-    return None
-
-
 @bot.add_cmd(cmd=["q", "quote"])
 async def quote_sticker_handler(bot: BOT, message: Message):
     """
@@ -65,16 +50,16 @@ async def quote_sticker_handler(bot: BOT, message: Message):
 
     await progress_message.edit(f"<code>Forwarding {len(messages_to_quote)} message(s) to @QuotLyBot...</code>")
     
+    quotly_waiter = RESPONSES.expect(QUOTLY_BOT_ID)
     try:
-        await bot.forward_messages(
+        forwarded = await bot.forward_messages(
             chat_id=QUOTLY_BOT_ID,
             from_chat_id=message.chat.id,
             message_ids=[msg.id for msg in messages_to_quote]
         )
+        quotly_waiter.reply_to.update(msg.id for msg in (forwarded if isinstance(forwarded, list) else [forwarded]))
         
-        await asyncio.sleep(2)
-        
-        quotly_response = await find_quotly_response_in_history(bot, QUOTLY_TIMEOUT - 2)
+        quotly_response = await quotly_waiter.get(timeout=QUOTLY_TIMEOUT)
 
         if quotly_response:
             await progress_message.delete()
@@ -84,6 +69,7 @@ async def quote_sticker_handler(bot: BOT, message: Message):
             raise asyncio.TimeoutError("@QuotLyBot did not respond in time.")
 
     except Exception as e:
+        quotly_waiter.cancel()
         error_text = f"<b>Error:</b> Could not get a quote from @QuotLyBot.\n<code>{html.escape(str(e))}</code>"
         try:
             await progress_message.edit(error_text)
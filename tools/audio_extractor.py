@@ -1,29 +1,17 @@
 import os
 import html
-import asyncio
-import shutil
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
-
-TEMP_DIR = "temp_extract_audio/"
-os.makedirs(TEMP_DIR, exist_ok=True)
-
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return (
-        stdout.decode('utf-8', 'replace').strip(),
-        stderr.decode('utf-8', 'replace').strip(),
-        process.returncode
-    )
+from .ffmpeg import STREAM_MAX_BYTES, is_pipe_readable, run_command, run_pipe
+from .probe import probe_bytes, probe_media
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
 
 
 @bot.add_cmd(cmd=["getaudio", "geta"])
+@tracked_job("getaudio")
 async def extract_audio_handler(bot: BOT, message: Message):
     """
     CMD: GETAUDIO
@@ -43,44 +31,79 @@ async def extract_audio_handler(bot: BOT, message: Message):
         await message.reply("Please reply to a video to extract its audio.", del_in=8)
         return
 
+    cache_key = make_cache_key(replied_msg, "getaudio")
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_msg = await message.reply("<code>Downloading video...</code>")
     
     video_path = None
     audio_path = None
+    audio_file = None
+    workspace = None
     try:
-        video_path = await bot.download_media(replied_msg, file_name=TEMP_DIR)
-        
-        await progress_msg.edit("<code>Extracting audio track...</code>")
-        
-        base, _ = os.path.splitext(os.path.basename(video_path))
-        audio_path = os.path.join(TEMP_DIR, f"{base}.mp3")
-        
-        command = f'ffmpeg -i "{video_path}" -vn -acodec copy -y "{audio_path}"'
-        _, stderr, returncode = await run_command(command)
+        media_object = replied_msg.video or replied_msg.document
+        in_memory_file = None
+        if (media_object.file_size or 0) <= STREAM_MAX_BYTES:
+            in_memory_file = await bot.download_media(replied_msg, in_memory=True)
+
+        # Decide on pipe or disk before encoding, so a file is never encoded twice.
+        if in_memory_file and is_pipe_readable(in_memory_file.getbuffer(), media_object.mime_type):
+            media_info = await probe_bytes(in_memory_file.getvalue(), media_object.file_unique_id)
+            if not media_info:
+                raise ValueError("Could not read the video file.")
+            if not media_info.has_audio:
+                raise ValueError("This video has no audio track.")
+            base, _ = os.path.splitext(os.path.basename(in_memory_file.name or "video.mp4"))
+            await progress_msg.edit("<code>Extracting audio track...</code>")
+            command = 'ffmpeg -i pipe:0 -vn -c:a libmp3lame -q:a 2 -f mp3 pipe:1'
+            audio_file = await run_pipe(command, in_memory_file.getvalue(), f"{base}.mp3", progress=progress_msg)
+        elif in_memory_file:
+            workspace = await create_workspace("getaudio", len(in_memory_file.getbuffer()) * 2, progress_msg)
+            video_path = workspace.path_for(os.path.basename(in_memory_file.name or "video.mp4"))
+            with open(video_path, "wb") as f:
+                f.write(in_memory_file.getbuffer())
+        else:
+            workspace = await create_workspace("getaudio", get_media_size(replied_msg) * 2, progress_msg)
+            video_path = await bot.download_media(replied_msg, file_name=workspace.dir)
 
-        if returncode != 0:
-            command = f'ffmpeg -i "{video_path}" -vn -c:a libmp3lame -q:a 2 -y "{audio_path}"'
-            _, stderr, returncode = await run_command(command)
+        if audio_file is None:
+            await progress_msg.edit("<code>Extracting audio track...</code>")
+            media_info = await probe_media(video_path, media_object.file_unique_id)
+            if not media_info:
+                raise ValueError("Could not read the video file.")
+            if not media_info.has_audio:
+                raise ValueError("This video has no audio track.")
+
+            base, _ = os.path.splitext(os.path.basename(video_path))
+            audio_path = workspace.path_for(f"{base}.mp3")
+
+            # Only an mp3 track can be stream-copied into an .mp3 file.
+            codec_args = "-acodec copy" if media_info.audio.codec_name == "mp3" else "-c:a libmp3lame -q:a 2"
+            command = f'ffmpeg -i "{video_path}" -vn {codec_args} -y "{audio_path}"'
+            _, stderr, returncode = await run_command(command, progress=progress_msg)
             if returncode != 0:
                 raise RuntimeError(f"FFmpeg failed to extract audio: {stderr}")
 
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError("Audio file was not created.")
+            if not os.path.exists(audio_path):
+                raise FileNotFoundError("Audio file was not created.")
+            audio_file = audio_path
 
         await progress_msg.edit("<code>Uploading audio...</code>")
 
-        await bot.send_audio(
+        sent_message = await bot.send_audio(
             chat_id=message.chat.id,
-            audio=audio_path,
+            audio=audio_file,
             reply_parameters = ReplyParameters(message_id=replied_msg.id)
         )
         
+        await cache_result(cache_key, sent_message)
+        
         await progress_msg.delete()
         await message.delete()
 
     except Exception as e:
         await progress_msg.edit(f"<b>Error:</b> <code>{html.escape(str(e))}</code>", del_in=10)
     finally:
-        if os.path.exists(TEMP_DIR):
-            shutil.rmtree(TEMP_DIR)
-        os.makedirs(TEMP_DIR, exist_ok=True)
+        if workspace:
+            workspace.cleanup()
@@ -0,0 +1,113 @@
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from pyrogram.types import Message, ReplyParameters
+from ub_core.utils import get_tg_media_details
+
+from app import BOT, CustomDB
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL_HOURS", "168")) * 3600
+
+RESULT_CACHE_DB = CustomDB["TOOLS_RESULT_CACHE"]
+
+
+class ResultCache:
+    """
+    Maps (source file_unique_id, command, normalized args) to the file_id of the output
+    already uploaded for it. Kept in memory as an LRU and mirrored to CustomDB.
+    """
+
+    def __init__(self, collection, max_entries: int, ttl: float):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+
+    async def load(self):
+        entries = [entry async for entry in self.collection.find()]
+        entries.sort(key=lambda entry: entry.get("last_used", 0))
+        for entry in entries:
+            self._entries[entry["_id"]] = entry
+        await self._evict()
+
+    async def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            await self.delete(key)
+            return None
+        entry["last_used"] = time.time()
+        self._entries.move_to_end(key)
+        await self.collection.add_data({"_id": key, "last_used": entry["last_used"]})
+        return entry
+
+    async def set(self, key: str, file_id: str, caption: str | None):
+        now = time.time()
+        entry = {"_id": key, "file_id": file_id, "caption": caption, "created": now, "last_used": now}
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        await self.collection.add_data(entry)
+        await self._evict()
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+        await self.collection.delete_data(id=key)
+
+    async def _evict(self):
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            await self.delete(key)
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            await self.collection.delete_data(id=key)
+
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_DB, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL)
+
+
+async def init_task():
+    await RESULT_CACHE.load()
+
+
+def make_cache_key(replied_msg: Message, command: str, *args) -> str | None:
+    media = get_tg_media_details(replied_msg)
+    file_unique_id = getattr(media, "file_unique_id", None)
+    if not file_unique_id:
+        return None
+    return ":".join([file_unique_id, command, *map(str, args)])
+
+
+async def send_cached_result(bot: BOT, message: Message, cache_key: str | None) -> bool:
+    """Resends a previously uploaded result for the same input. Returns False on a cache miss."""
+    if not cache_key or not (entry := await RESULT_CACHE.get(cache_key)):
+        return False
+    try:
+        await bot.send_cached_media(
+            message.chat.id,
+            entry["file_id"],
+            caption=entry["caption"] or "",
+            reply_parameters=ReplyParameters(message_id=message.replied.id),
+        )
+    except Exception:
+        await RESULT_CACHE.delete(cache_key)
+        return False
+    await message.delete()
+    return True
+
+
+async def cache_result(cache_key: str | None, sent_message: Message | None):
+    if not cache_key or not sent_message:
+        return
+    media = get_tg_media_details(sent_message)
+    if file_id := getattr(media, "file_id", None):
+        caption = sent_message.caption.markdown if sent_message.caption else None
+        await RESULT_CACHE.set(cache_key, file_id, caption)
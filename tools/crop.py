@@ -1,24 +1,22 @@
 import os
 import html
-import asyncio
 import re
 from PIL import Image
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import run_command
+from .lossless import lossless_crop_jpeg
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+from .lanes import run_media
 
-TEMP_DIR = "temp_crop/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-    stdout, stderr = await process.communicate()
-    return (stdout.decode('utf-8', 'replace').strip(), stderr.decode('utf-8', 'replace').strip(), process.returncode)
-
 def sync_crop_image(input_path: str, width: int, height: int) -> str:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_cropped{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_cropped{ext}")
     with Image.open(input_path) as img:
         orig_width, orig_height = img.size
         if width > orig_width or height > orig_height:
@@ -32,16 +30,20 @@ def sync_crop_image(input_path: str, width: int, height: int) -> str:
         cropped_img.save(output_path)
     return output_path
 
-async def sync_crop_video(input_path: str, width: int, height: int) -> str:
+def build_crop_filter(width: int, height: int) -> str:
+    return f"crop={width}:{height}:(in_w-{width})/2:(in_h-{height})/2"
+
+async def sync_crop_video(input_path: str, width: int, height: int, progress: Message | None = None) -> str:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_cropped{ext}")
-    crop_filter = f"crop={width}:{height}:(in_w-{width})/2:(in_h-{height})/2"
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_cropped{ext}")
+    crop_filter = build_crop_filter(width, height)
     command = f'ffmpeg -i "{input_path}" -vf "{crop_filter}" -c:a copy -y "{output_path}"'
-    _, stderr, code = await run_command(command)
+    _, stderr, code = await run_command(command, progress=progress)
     if code != 0: raise RuntimeError(f"FFmpeg crop failed: {stderr}")
     return output_path
 
 @bot.add_cmd(cmd="crop")
+@tracked_job("crop")
 async def crop_handler(bot: BOT, message: Message):
     """
     CMD: CROP
@@ -65,14 +67,18 @@ async def crop_handler(bot: BOT, message: Message):
     if not match:
         return await message.reply("Invalid format. Use `.crop [width]x[height]`.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "crop", f"{int(match.group(1))}x{int(match.group(2))}")
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
+        workspace = await create_workspace("crop", get_media_size(replied_msg) * 2, progress_message)
         media_object = (replied_msg.photo or replied_msg.video or replied_msg.document)
-        original_path = await bot.download_media(media_object)
-        temp_files.append(original_path)
+        original_path = await bot.download_media(media_object, file_name=workspace.dir)
 
         crop_width = int(match.group(1))
         crop_height = int(match.group(2))
@@ -82,21 +88,25 @@ async def crop_handler(bot: BOT, message: Message):
         is_image = replied_msg.photo or (replied_msg.document and replied_msg.document.mime_type.startswith('image/'))
         
         if is_image:
-            modified_path = await asyncio.to_thread(sync_crop_image, original_path, crop_width, crop_height)
+            base, ext = os.path.splitext(os.path.basename(original_path))
+            modified_path = (
+                await lossless_crop_jpeg(original_path, workspace.path_for(f"{base}_cropped{ext}"), crop_width, crop_height)
+                or await run_media(sync_crop_image, original_path, crop_width, crop_height)
+            )
         else:
-            modified_path = await sync_crop_video(original_path, crop_width, crop_height)
+            modified_path = await sync_crop_video(original_path, crop_width, crop_height, progress=progress_message)
 
-        temp_files.append(modified_path)
-        
         await progress_message.edit("<code>Sending media...</code>")
         
         caption = f"Cropped to: `{crop_width}x{crop_height}`"
         reply_params = ReplyParameters(message_id=replied_msg.id)
         
         if is_image:
-            await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         else:
-            await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -105,6 +115,5 @@ async def crop_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not crop media.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
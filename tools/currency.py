@@ -1,76 +1,118 @@
+import re
 import html
-import asyncio
-import requests
+import time
 from pyrogram.types import Message
 
 from app import BOT, bot
+from .http_client import HTTP
+from .response_cache import cached_response
 
-API_URL = "https://api.frankfurter.app/latest"
+API_URL = "https://api.frankfurter.app"
+BASE_CURRENCY = "EUR"
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+async def fetch_rate_table(date: str) -> dict:
+    response = await HTTP.get(f"{API_URL}/{date}", timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    return {"date": data["date"], "rates": {**data["rates"], BASE_CURRENCY: 1.0}}
+
+
+LATEST_TTL = 3600
+FINAL_TTL = 365 * 24 * 3600
+
+
+def get_history_ttl(table: dict, date: str) -> float:
+    """
+    A published past table never changes. For today, a future date or a weekend/holiday,
+    Frankfurter answers with the latest or previous working day's table instead, which can
+    still be superseded, so that is only kept as long as the latest rates.
+    """
+    is_final = table["date"] == date and date < time.strftime("%Y-%m-%d", time.gmtime())
+    return FINAL_TTL if is_final else LATEST_TTL
+
+
+# Frankfurter publishes one EUR-based table per working day; every pair is a cross rate of it.
+@cached_response("cash", ttl=LATEST_TTL, stale_ttl=24 * 3600, persist=True)
+async def get_latest_rates() -> dict:
+    return await fetch_rate_table("latest")
+
+
+@cached_response("cash_history", ttl=get_history_ttl, persist=True)
+async def get_historical_rates(date: str) -> dict:
+    return await fetch_rate_table(date)
+
+
+def convert(table: dict, amount: float, from_currency: str, to_currency: str) -> float:
+    rates = table["rates"]
+    for currency in (from_currency, to_currency):
+        if currency not in rates:
+            raise ValueError(f"Unknown currency code '{currency}'.")
+    return amount * rates[to_currency] / rates[from_currency]
 
 
 @bot.add_cmd(cmd=["cash", "currency"])
 async def currency_converter_handler(bot: BOT, message: Message):
     """
     CMD: CASH / CURRENCY
-    INFO: Converts an amount from one currency to another using real-time rates.
+    INFO: Converts an amount into one or more currencies, optionally at a past date's rates.
     USAGE:
-        .cash [amount] [FROM_CURRENCY] [TO_CURRENCY]
+        .cash [amount] [FROM_CURRENCY] [TO_CURRENCY ...] [YYYY-MM-DD]
     EXAMPLE:
         .cash 100 PLN USD
-        .cash 50 EUR JPY
+        .cash 100 PLN USD EUR GBP JPY
+        .cash 50 EUR JPY 2020-03-01
     """
     
     if not message.input:
         await message.reply(
-            "<b>Usage:</b> <code>.cash [amount] [FROM] [TO]</code>\n"
-            "<b>Example:</b> <code>.cash 100 PLN USD</code>",
+            "<b>Usage:</b> <code>.cash [amount] [FROM] [TO ...] [YYYY-MM-DD]</code>\n"
+            "<b>Example:</b> <code>.cash 100 PLN USD EUR</code>",
             del_in=10
         )
         return
 
     parts = message.input.split()
-    if len(parts) != 3:
-        await message.reply("<b>Invalid format.</b> Please use: `amount FROM TO`.", del_in=8)
+    date = None
+    if parts and DATE_PATTERN.match(parts[-1]):
+        date = parts.pop()
+    if len(parts) < 3:
+        await message.reply("<b>Invalid format.</b> Please use: `amount FROM TO [TO ...]`.", del_in=8)
         return
 
     try:
-        amount_str, from_currency, to_currency = parts
-        amount = float(amount_str)
-        from_currency = from_currency.upper()
-        to_currency = to_currency.upper()
+        amount = float(parts[0])
+        from_currency = parts[1].upper()
+        to_currencies = list(dict.fromkeys(currency.upper() for currency in parts[2:]))
     except ValueError:
         await message.reply("<b>Invalid amount.</b> Please provide a valid number.", del_in=8)
         return
 
     progress_msg = await message.reply(
-        f"<code>Converting {amount:.2f} {from_currency} to {to_currency}...</code>"
+        f"<code>Converting {amount:.2f} {from_currency} to {', '.join(to_currencies)}...</code>"
     )
 
     try:
-        def do_request():
-            params = {
-                "amount": amount,
-                "from": from_currency,
-                "to": to_currency
-            }
-            return requests.get(API_URL, params=params, timeout=10)
-
-        response = await asyncio.to_thread(do_request)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if 'rates' not in data or to_currency not in data['rates']:
-            raise ValueError(f"Could not get conversion rate for '{to_currency}'. It may be an invalid currency code.")
-        
-        converted_amount = data['rates'][to_currency]
-        single_rate = converted_amount / amount if amount != 0 else 0
+        table = await get_historical_rates(date) if date else await get_latest_rates()
+        converted = {to_currency: convert(table, amount, from_currency, to_currency) for to_currency in to_currencies}
 
-        result_text = (
-            f"<b>Conversion Result:</b>\n\n"
-            f"<code>{amount:.2f} {from_currency}</code> = <b><code>{converted_amount:.2f} {to_currency}</code></b>\n\n"
-            f"<i>Exchange rate: 1 {from_currency} ≈ {single_rate:.4f} {to_currency}</i>"
-        )
+        if len(converted) == 1:
+            to_currency, converted_amount = next(iter(converted.items()))
+            single_rate = convert(table, 1, from_currency, to_currency)
+            result_text = (
+                f"<b>Conversion Result:</b>\n\n"
+                f"<code>{amount:.2f} {from_currency}</code> = <b><code>{converted_amount:.2f} {to_currency}</code></b>\n\n"
+                f"<i>Exchange rate: 1 {from_currency} ≈ {single_rate:.4f} {to_currency}</i>"
+            )
+        else:
+            lines = "\n".join(
+                f"<b><code>{converted_amount:,.2f} {to_currency}</code></b>"
+                f" <i>(1 {from_currency} ≈ {convert(table, 1, from_currency, to_currency):.4f})</i>"
+                for to_currency, converted_amount in converted.items()
+            )
+            result_text = f"<b>Conversion Result:</b>\n\n<code>{amount:.2f} {from_currency}</code> =\n{lines}"
+        result_text += f"\n<i>Rates of {table['date']}</i>"
         
         await progress_msg.edit(result_text)
         await message.delete()
@@ -5,19 +5,19 @@ from PIL import Image, ImageEnhance, ImageFilter
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import run_command
+from .probe import MediaInfo, probe_media
+from .tiling import is_large_image, process_tiled
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+from .lanes import run_media
 
-TEMP_DIR = "temp_enhance/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-    stdout, stderr = await process.communicate()
-    return (stdout.decode('utf-8', 'replace').strip(), stderr.decode('utf-8', 'replace').strip(), process.returncode)
-
 def sync_enhance_image(input_path: str) -> tuple[str, int, int]:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_enhanced.png")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_enhanced.png")
     with Image.open(input_path) as img:
         if img.mode not in ("RGB", "RGBA"): img = img.convert("RGBA")
         orig_width, orig_height = img.size
@@ -31,14 +31,26 @@ def sync_enhance_image(input_path: str) -> tuple[str, int, int]:
         final_image.save(output_path, "PNG")
     return output_path, new_width, new_height
 
-async def sync_enhance_video(input_path: str) -> tuple[str, int, int]:
+def load_image(input_path: str) -> Image.Image:
+    img = Image.open(input_path)
+    if img.mode not in ("RGB", "RGBA"): img = img.convert("RGBA")
+    img.load()
+    return img
+
+async def tiled_enhance_image(input_path: str) -> tuple[str, int, int]:
+    """Same result as sync_enhance_image, processed in tiles across worker processes."""
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_enhanced.png")
+    img = await asyncio.to_thread(load_image, input_path)
+    final_image = await process_tiled(img, "enhance", scale=2)
+    await asyncio.to_thread(final_image.save, output_path, "PNG")
+    return output_path, final_image.width, final_image.height
+
+async def sync_enhance_video(input_path: str, media_info: MediaInfo, progress: Message | None = None) -> tuple[str, int, int]:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_enhanced{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_enhanced{ext}")
     
-    probe_command = f'ffprobe -v error -select_streams v:0 -show_entries stream=width,height -of csv=s=x:p=0 "{input_path}"'
-    stdout, _, _ = await run_command(probe_command)
-    orig_width, orig_height = map(int, stdout.split('x'))
-    new_width, new_height = orig_width * 2, orig_height * 2
+    new_width, new_height = media_info.width * 2, media_info.height * 2
 
     filter_chain = (
         f"scale={new_width}:{new_height}:flags=lanczos,"
@@ -46,13 +58,15 @@ async def sync_enhance_video(input_path: str) -> tuple[str, int, int]:
         f"hqdn3d"
     )
 
-    command = f'ffmpeg -i "{input_path}" -vf "{filter_chain}" -c:a copy -y "{output_path}"'
-    _, stderr, code = await run_command(command)
+    audio_args = "-c:a copy" if media_info.has_audio else "-an"
+    command = f'ffmpeg -i "{input_path}" -vf "{filter_chain}" {audio_args} -y "{output_path}"'
+    _, stderr, code = await run_command(command, progress=progress, duration=media_info.duration)
     if code != 0: raise RuntimeError(f"FFmpeg enhance failed: {stderr}")
         
     return output_path, new_width, new_height
 
 @bot.add_cmd(cmd="enhance")
+@tracked_job("enhance")
 async def enhance_handler(bot: BOT, message: Message):
     """
     CMD: ENHANCE
@@ -72,32 +86,42 @@ async def enhance_handler(bot: BOT, message: Message):
     if not is_media:
         return await message.reply("Please reply to an image or video to enhance it.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "enhance")
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
+        workspace = await create_workspace("enhance", get_media_size(replied_msg) * 3, progress_message)
         media_object = (replied_msg.photo or replied_msg.video or replied_msg.document)
-        original_path = await bot.download_media(media_object)
-        temp_files.append(original_path)
+        original_path = await bot.download_media(media_object, file_name=workspace.dir)
         
         is_image = replied_msg.photo or (replied_msg.document and replied_msg.document.mime_type.startswith('image/'))
 
         await progress_message.edit("<code>Enhancing...</code>")
         
         if is_image:
-            modified_path, new_width, new_height = await asyncio.to_thread(sync_enhance_image, original_path)
+            if is_large_image(original_path):
+                modified_path, new_width, new_height = await tiled_enhance_image(original_path)
+            else:
+                modified_path, new_width, new_height = await run_media(sync_enhance_image, original_path)
         else:
-            modified_path, new_width, new_height = await sync_enhance_video(original_path)
-        
-        temp_files.append(modified_path)
+            media_info = await probe_media(original_path, media_object.file_unique_id)
+            if not media_info or not media_info.width:
+                raise ValueError("Could not read the video dimensions.")
+            modified_path, new_width, new_height = await sync_enhance_video(original_path, media_info, progress=progress_message)
         
         await progress_message.edit("<code>Sending as file...</code>")
         
         caption = f"Enhanced to: `{new_width}x{new_height}`"
         reply_params = ReplyParameters(message_id=replied_msg.id)
         
-        await bot.send_document(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        sent_message = await bot.send_document(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -106,6 +130,5 @@ async def enhance_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not enhance media.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
@@ -0,0 +1,368 @@
+import os
+import heapq
+import time
+import signal
+import asyncio
+import itertools
+from io import BytesIO
+from dotenv import load_dotenv
+from pyrogram.types import Message
+
+from .jobs import attach_progress, current_job
+from .lanes import apply_media_priority
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+FFMPEG_WORKERS_PER_CORE = float(os.getenv("FFMPEG_WORKERS_PER_CORE", "0.5"))
+# Extra slots only PRIORITY_HIGH jobs (probes, jpegtran, thumbnails) may use, so a sub-second
+# probe never waits behind a long encode.
+FFMPEG_FAST_WORKERS = int(os.getenv("FFMPEG_FAST_WORKERS", "2"))
+FFMPEG_JOB_TIMEOUT = float(os.getenv("FFMPEG_JOB_TIMEOUT", "900"))
+FFMPEG_STREAM_MAX_MB = float(os.getenv("FFMPEG_STREAM_MAX_MB", "5"))
+STREAM_MAX_BYTES = int(FFMPEG_STREAM_MAX_MB * 1024 * 1024)
+QUEUE_UPDATE_INTERVAL = 3
+# Telegram floods out on frequent edits of the same message.
+PROGRESS_EDIT_INTERVAL = float(os.getenv("FFMPEG_PROGRESS_INTERVAL", "5"))
+PROGRESS_BAR_LENGTH = 10
+
+PIPE_FORMATS = {
+    "audio/ogg": ("ogg", "libopus", ".ogg"),
+    "audio/opus": ("ogg", "libopus", ".ogg"),
+    "audio/mpeg": ("mp3", "libmp3lame", ".mp3"),
+    "audio/mp3": ("mp3", "libmp3lame", ".mp3"),
+}
+
+PIPE_READABLE_VIDEO = ("video/webm", "video/x-matroska")
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+MAIN_POOL = "main"
+FAST_POOL = "fast"
+
+
+def kill_process_group(process: asyncio.subprocess.Process):
+    """Kills the shell and the ffmpeg/ffprobe children it spawned."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def add_progress_flags(command: str) -> str | None:
+    """Makes ffmpeg report progress on stdout; None when stdout already carries the output."""
+    if not command.startswith("ffmpeg ") or "pipe:1" in command:
+        return None
+    return f"ffmpeg -progress pipe:1 -nostats {command[len('ffmpeg '):]}"
+
+
+class FFmpegProgress:
+    """
+    Reads the key=value blocks ffmpeg writes with `-progress pipe:1` and renders percent,
+    speed and ETA against the probed duration into the progress message, at most once
+    every PROGRESS_EDIT_INTERVAL seconds.
+    """
+
+    def __init__(self, progress: Message, status: str | None, duration: float):
+        self.progress = progress
+        self.status = status or ""
+        self.duration = duration
+        self.out_time = 0.0
+        self.fps = 0.0
+        self.speed = 0.0
+        self._last_edit = time.monotonic()
+
+    def feed(self, key: str, value: str):
+        try:
+            if key == "out_time_us":
+                self.out_time = max(int(value) / 1_000_000, 0)
+            elif key == "fps":
+                self.fps = float(value)
+            elif key == "speed":
+                self.speed = float(value.rstrip("x"))
+        except ValueError:
+            # ffmpeg reports N/A until the first frame is out.
+            pass
+
+    def render(self) -> str:
+        fraction = min(self.out_time / self.duration, 1.0)
+        filled = int(fraction * PROGRESS_BAR_LENGTH)
+        bar = "■" * filled + "□" * (PROGRESS_BAR_LENGTH - filled)
+        details = [f"{bar} {fraction * 100:.0f}%"]
+        if self.fps:
+            details.append(f"{self.fps:.0f} fps")
+        if self.speed:
+            details.append(f"{self.speed:.2f}x")
+            details.append(f"ETA {format_duration((self.duration - self.out_time) / self.speed)}")
+        return f"{self.status}\n<code>{' | '.join(details)}</code>"
+
+    async def watch(self, stream: asyncio.StreamReader):
+        async for raw_line in stream:
+            key, _, value = raw_line.decode('utf-8', 'replace').strip().partition("=")
+            if key != "progress":
+                self.feed(key, value)
+                continue
+            now = time.monotonic()
+            if value == "continue" and now - self._last_edit >= PROGRESS_EDIT_INTERVAL:
+                self._last_edit = now
+                await safe_edit(self.progress, self.render())
+
+
+class FFmpegJob:
+    def __init__(self, command: str, priority: int, timeout: float, seq: int):
+        self.command = command
+        self.priority = priority
+        self.timeout = timeout
+        self.seq = seq
+        self.started = asyncio.Event()
+        self.process: asyncio.subprocess.Process | None = None
+        self.pool: str | None = None
+
+    @property
+    def sort_key(self) -> tuple[int, int]:
+        return self.priority, self.seq
+
+
+class FFmpegScheduler:
+    """
+    Runs ffmpeg/ffprobe commands with at most `max_workers` processes alive at once, plus up
+    to `fast_workers` PRIORITY_HIGH jobs on their own slots. Waiting jobs are served by
+    priority, then in submission order.
+    """
+
+    def __init__(self, max_workers: int, default_timeout: float, fast_workers: int = 0):
+        self.max_workers = max_workers
+        self.fast_workers = fast_workers
+        self.default_timeout = default_timeout
+        self._pending: list[tuple[int, int, FFmpegJob]] = []
+        self._running: set[FFmpegJob] = set()
+        self._counter = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def queue_position(self, job: FFmpegJob) -> int:
+        return 1 + sum(1 for priority, seq, _ in self._pending if (priority, seq) < job.sort_key)
+
+    def _free_pool(self, job: FFmpegJob) -> str | None:
+        if job.priority == PRIORITY_HIGH:
+            if sum(1 for running in self._running if running.pool == FAST_POOL) < self.fast_workers:
+                return FAST_POOL
+        if sum(1 for running in self._running if running.pool == MAIN_POOL) < self.max_workers:
+            return MAIN_POOL
+        return None
+
+    def _dispatch(self):
+        # High-priority jobs sort first, so when the head can't start nothing behind it can either.
+        while self._pending and (pool := self._free_pool(self._pending[0][2])):
+            _, _, job = heapq.heappop(self._pending)
+            job.pool = pool
+            self._running.add(job)
+            job.started.set()
+
+    def _release(self, job: FFmpegJob):
+        self._running.discard(job)
+        self._dispatch()
+
+    async def _wait_for_slot(self, job: FFmpegJob, progress: Message | None) -> bool:
+        heapq.heappush(self._pending, (*job.sort_key, job))
+        self._dispatch()
+
+        last_position = 0
+        try:
+            while not job.started.is_set():
+                position = self.queue_position(job)
+                if progress and position != last_position:
+                    await safe_edit(progress, f"<code>Queued for processing (position {position})...</code>")
+                    last_position = position
+                try:
+                    await asyncio.wait_for(job.started.wait(), QUEUE_UPDATE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if job in self._running:
+                self._release(job)
+            else:
+                self._pending = [entry for entry in self._pending if entry[2] is not job]
+                heapq.heapify(self._pending)
+            raise
+
+        return bool(last_position)
+
+    async def run(
+        self,
+        command: str,
+        progress: Message | None = None,
+        priority: int = PRIORITY_NORMAL,
+        timeout: float | None = None,
+        input_data: bytes | None = None,
+        duration: float | None = None,
+    ) -> tuple[bytes, bytes, int]:
+        """
+        Runs the command once a worker slot is free. With a progress message and the input's
+        duration, ffmpeg commands report live progress; their stdout is consumed for it.
+        """
+        job = FFmpegJob(command, priority, timeout or self.default_timeout, next(self._counter))
+        status = getattr(progress.text, "html", progress.text) if progress else None
+
+        owner = current_job()
+        attach_progress(progress)
+
+        tracker = None
+        if progress and duration and input_data is None and (progress_command := add_progress_flags(command)):
+            command = progress_command
+            tracker = FFmpegProgress(progress, status, duration)
+
+        if owner:
+            owner.queued = True
+        try:
+            was_queued = await self._wait_for_slot(job, progress)
+        finally:
+            if owner:
+                owner.queued = False
+        try:
+            if was_queued and status:
+                await safe_edit(progress, status)
+
+            job.process = await asyncio.create_subprocess_shell(
+                command,
+                stdin=asyncio.subprocess.PIPE if input_data is not None else None,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+                # Probes stay at normal priority; encodes yield the CPU to the event loop.
+                preexec_fn=apply_media_priority if priority != PRIORITY_HIGH else None,
+            )
+            if owner:
+                owner.pgids.add(job.process.pid)
+            try:
+                if tracker:
+                    stdout = b""
+                    _, stderr, _ = await asyncio.wait_for(
+                        asyncio.gather(tracker.watch(job.process.stdout), job.process.stderr.read(), job.process.wait()),
+                        job.timeout,
+                    )
+                else:
+                    stdout, stderr = await asyncio.wait_for(job.process.communicate(input_data), job.timeout)
+            except asyncio.TimeoutError:
+                kill_process_group(job.process)
+                await job.process.wait()
+                raise RuntimeError(f"FFmpeg job timed out after {int(job.timeout)}s.")
+            except asyncio.CancelledError:
+                kill_process_group(job.process)
+                raise
+        finally:
+            if owner and job.process:
+                owner.pgids.discard(job.process.pid)
+            self._release(job)
+
+        return stdout, stderr, job.process.returncode
+
+
+async def safe_edit(progress: Message, text: str):
+    try:
+        await progress.edit(text)
+    except Exception:
+        pass
+
+
+scheduler = FFmpegScheduler(
+    max_workers=max(1, int((os.cpu_count() or 1) * FFMPEG_WORKERS_PER_CORE)),
+    default_timeout=FFMPEG_JOB_TIMEOUT,
+    fast_workers=FFMPEG_FAST_WORKERS,
+)
+
+
+async def run_command(
+    command: str,
+    progress: Message | None = None,
+    priority: int = PRIORITY_NORMAL,
+    timeout: float | None = None,
+    duration: float | None = None,
+) -> tuple[str, str, int]:
+    """
+    Submits a shell command to the shared scheduler and waits for its output.
+    Pass the probed `duration` of the output to get live percent/ETA in `progress`.
+    """
+    stdout, stderr, code = await scheduler.run(
+        command, progress=progress, priority=priority, timeout=timeout, duration=duration
+    )
+    return (
+        stdout.decode('utf-8', 'replace').strip(),
+        stderr.decode('utf-8', 'replace').strip(),
+        code
+    )
+
+
+async def run_pipe(
+    command: str,
+    input_data: bytes,
+    output_name: str,
+    progress: Message | None = None,
+    priority: int = PRIORITY_NORMAL,
+    timeout: float | None = None,
+) -> BytesIO:
+    """
+    Feeds input_data to a command reading `pipe:0` and returns what it wrote to `pipe:1`
+    as a named in-memory file, ready to be passed to send_voice/send_audio.
+    """
+    stdout, stderr, code = await scheduler.run(
+        command, progress=progress, priority=priority, timeout=timeout, input_data=input_data
+    )
+    if code != 0 or not stdout:
+        raise RuntimeError(f"FFmpeg failed: {stderr.decode('utf-8', 'replace').strip()}")
+    output_file = BytesIO(stdout)
+    output_file.name = output_name
+    return output_file
+
+
+def is_pipe_readable(data: bytes, mime_type: str | None) -> bool:
+    """
+    Whether ffmpeg can demux this file from pipe:0. Matroska/WebM always can; MP4/MOV only
+    when the moov atom comes before mdat (faststart), since a pipe can't seek back to it.
+    """
+    if mime_type in PIPE_READABLE_VIDEO:
+        return True
+    if mime_type not in ("video/mp4", "video/quicktime"):
+        return False
+    offset = 0
+    while offset + 8 <= len(data):
+        size = int.from_bytes(data[offset:offset + 4], "big")
+        box = data[offset + 4:offset + 8]
+        if box == b"moov":
+            return True
+        if box == b"mdat":
+            return False
+        if size == 1 and offset + 16 <= len(data):
+            size = int.from_bytes(data[offset + 8:offset + 16], "big")
+        if size < 8:
+            return False
+        offset += size
+    return False
+
+
+def get_pipe_format(media) -> tuple[str, str, str] | None:
+    """
+    Returns (muxer, audio codec, extension) if the media is small enough to be processed
+    in memory and its format can be written to a pipe, else None.
+    """
+    if (getattr(media, "file_size", 0) or 0) > STREAM_MAX_BYTES:
+        return None
+    return PIPE_FORMATS.get(getattr(media, "mime_type", None))
@@ -4,17 +4,17 @@ import asyncio
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .workspace import create_workspace
+from .jobs import tracked_job
 
-TEMP_DIR = "temp_filecreator/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-def sync_create_file(filename: str, content: str) -> str:
-    """Synchronously creates a file with the given content in the temp directory."""
+def sync_create_file(output_dir: str, filename: str, content: str) -> str:
+    """Synchronously creates a file with the given content in the job's workspace."""
     if ".." in filename or "/" in filename:
         raise ValueError("Invalid filename. It cannot contain '..' or '/'.")
         
-    output_path = os.path.join(TEMP_DIR, filename)
+    output_path = os.path.join(output_dir, filename)
     
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(content)
@@ -23,6 +23,7 @@ def sync_create_file(filename: str, content: str) -> str:
 
 
 @bot.add_cmd(cmd="filecreate")
+@tracked_job("filecreate")
 async def filecreator_handler(bot: BOT, message: Message):
     """
     CMD: FILECREATE
@@ -56,10 +57,10 @@ async def filecreator_handler(bot: BOT, message: Message):
     progress_message = await message.reply("<code>Creating file...</code>")
     
     output_path = ""
-    temp_files = []
+    workspace = None
     try:
-        output_path = await asyncio.to_thread(sync_create_file, filename, content_to_write)
-        temp_files.append(output_path)
+        workspace = await create_workspace("filecreate", len(content_to_write.encode()), progress_message)
+        output_path = await asyncio.to_thread(sync_create_file, workspace.path, filename, content_to_write)
         
         await progress_message.edit("<code>Sending file...</code>")
 
@@ -77,6 +78,5 @@ async def filecreator_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not create file.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
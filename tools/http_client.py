@@ -0,0 +1,123 @@
+import os
+import json
+import asyncio
+import aiohttp
+from dotenv import load_dotenv
+
+from app import Config
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "8"))
+HTTP_POOL_TOTAL = 100
+KEEPALIVE_TIMEOUT = 60
+RETRY_BACKOFF = 0.5
+RETRY_AFTER_MAX = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+USER_AGENT = "PlainUB-Extras"
+
+
+class HTTPError(Exception):
+    def __init__(self, response: "Response"):
+        self.response = response
+        self.status_code = response.status_code
+        super().__init__(f"{response.status_code} {response.reason} for url: {response.url}")
+
+
+class Response:
+    """Fully read response with the parts of the requests API the plugins use."""
+
+    def __init__(self, status_code: int, reason: str, url: str, headers, content: bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.url = url
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise HTTPError(self)
+
+
+class HTTPClient:
+    """
+    One aiohttp session shared by every plugin: keep-alive connections pooled per host,
+    default timeouts, and retries with backoff for transient failures.
+    GET/HEAD are retried by default; other methods only when `retries` is passed.
+    """
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_TOTAL,
+                limit_per_host=HTTP_POOL_PER_HOST,
+                ttl_dns_cache=300,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._session
+
+    async def request(self, method: str, url: str, timeout: float | None = None, retries: int | None = None, **kwargs) -> Response:
+        method = method.upper()
+        if retries is None:
+            retries = HTTP_RETRIES if method in IDEMPOTENT_METHODS else 0
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        for attempt in range(retries + 1):
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    result = Response(response.status, response.reason, str(response.url), response.headers, await response.read())
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+                continue
+
+            if result.status_code not in RETRY_STATUSES or attempt == retries:
+                return result
+            retry_after = result.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF * 2 ** attempt
+            await asyncio.sleep(min(delay, RETRY_AFTER_MAX))
+
+    async def get(self, url: str, **kwargs) -> Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+HTTP = HTTPClient()
+
+
+async def init_task():
+    Config.EXIT_TASKS.append(HTTP.close)
@@ -0,0 +1,219 @@
+import os
+import html
+import time
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pyrogram import Client
+from pyrogram.enums import ChatType
+from pyrogram.types import Message
+
+from app import BOT, bot
+
+ERROR_VISIBLE_DURATION = 8
+# Private chats and basic groups share one account-wide message id sequence; deletions there
+# arrive without a chat. Supergroups and channels number their messages per chat.
+SHARED_ID_CHAT_TYPES = (ChatType.PRIVATE, ChatType.BOT, ChatType.GROUP)
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def format_elapsed(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def sync_get_group_cpu_seconds(pgids: set[int]) -> float | None:
+    """Sums user+system CPU time of every process in the given process groups (Linux /proc)."""
+    if not pgids or not os.path.isdir("/proc"):
+        return None
+    ticks = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name can contain spaces, so split after its closing paren.
+        fields = stat.rsplit(")", 1)[1].split()
+        if int(fields[2]) in pgids:
+            ticks += int(fields[11]) + int(fields[12])
+    return ticks / CLOCK_TICKS
+
+
+class Job:
+    def __init__(self, job_id: int, name: str, message: Message, task: asyncio.Task):
+        self.id = job_id
+        self.name = name
+        self.chat_id = message.chat.id
+        self.shared_ids = message.chat.type in SHARED_ID_CHAT_TYPES
+        self.message_id = message.id
+        self.task = task
+        self.started_at = time.monotonic()
+        self.progress: Message | None = None
+        # Process group ids of the ffmpeg/ffprobe shells this job is running.
+        self.pgids: set[int] = set()
+        self.queued = False
+        self.cancelled = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def state(self) -> str:
+        return "queued" if self.queued else "running"
+
+
+class JobRegistry:
+    """Tracks every in-flight tools/* command and Gemini upload so it can be listed and cancelled."""
+
+    def __init__(self):
+        self._jobs: dict[int, Job] = {}
+        self._ids = itertools.count(1)
+
+    def register(self, name: str, message: Message) -> Job:
+        job = Job(next(self._ids), name, message, asyncio.current_task())
+        self._jobs[job.id] = job
+        return job
+
+    def unregister(self, job: Job):
+        self._jobs.pop(job.id, None)
+
+    def get(self, job_id: int) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def all(self) -> list[Job]:
+        return list(self._jobs.values())
+
+    def for_messages(self, chat_id: int | None, message_ids: list[int]) -> list[Job]:
+        """Jobs started by these messages. Without a chat_id only chats sharing the account-wide ids match."""
+        ids = set(message_ids)
+        return [
+            job for job in self._jobs.values()
+            if job.message_id in ids and (job.chat_id == chat_id if chat_id is not None else job.shared_ids)
+        ]
+
+    def cancel(self, job: Job) -> bool:
+        if job.cancelled or job.task.done():
+            return False
+        job.cancelled = True
+        # CancelledError reaches the scheduler, which kills the process group, and
+        # the handler's finally, which removes its workspace.
+        job.task.cancel()
+        return True
+
+
+JOBS = JobRegistry()
+CURRENT_JOB: ContextVar[Job | None] = ContextVar("CURRENT_JOB", default=None)
+
+
+def current_job() -> Job | None:
+    return CURRENT_JOB.get()
+
+
+def attach_progress(progress: Message | None):
+    job = current_job()
+    if job and progress:
+        job.progress = progress
+
+
+async def report_cancelled(job: Job):
+    if not job.progress:
+        return
+    try:
+        await job.progress.edit(f"<code>Job #{job.id} cancelled.</code>", del_in=ERROR_VISIBLE_DURATION)
+    except Exception:
+        pass
+
+
+@asynccontextmanager
+async def track_job(name: str, message: Message):
+    """Registers the running task as a job for `.jobs`/`.cancel` for the duration of the block."""
+    job = JOBS.register(name, message)
+    token = CURRENT_JOB.set(job)
+    try:
+        yield job
+    except asyncio.CancelledError:
+        if job.cancelled:
+            await report_cancelled(job)
+        raise
+    finally:
+        CURRENT_JOB.reset(token)
+        JOBS.unregister(job)
+
+
+def tracked_job(name: str):
+    """Handler decorator: runs the command as a job and treats a user cancel as a normal exit."""
+
+    def decorator(function):
+        @wraps(function)
+        async def wrapper(bot: BOT, message: Message):
+            job = None
+            try:
+                async with track_job(name, message) as job:
+                    await function(bot, message)
+            except asyncio.CancelledError:
+                if not (job and job.cancelled):
+                    raise
+                asyncio.current_task().uncancel()
+
+        return wrapper
+
+    return decorator
+
+
+@bot.add_cmd(cmd="jobs")
+async def jobs_handler(bot: BOT, message: Message):
+    """
+    CMD: JOBS
+    INFO: Lists running and queued media jobs with elapsed time and ffmpeg CPU usage.
+    USAGE:
+        .jobs
+    """
+    jobs = JOBS.all()
+    if not jobs:
+        return await message.reply("<code>No jobs running.</code>", del_in=ERROR_VISIBLE_DURATION)
+
+    lines = ["<b>Jobs:</b>"]
+    for job in sorted(jobs, key=lambda job: job.id):
+        cpu_seconds = await asyncio.to_thread(sync_get_group_cpu_seconds, set(job.pgids))
+        cpu_text = f"{cpu_seconds:.1f}s CPU" if cpu_seconds is not None else "no subprocess"
+        lines.append(
+            f"<code>#{job.id}</code> <b>.{html.escape(job.name)}</b> — {job.state}, "
+            f"{format_elapsed(job.elapsed)}, {cpu_text}"
+        )
+    lines.append("\nCancel with <code>.cancel [id]</code>")
+    await message.reply("\n".join(lines))
+
+
+@bot.add_cmd(cmd="cancel")
+async def cancel_handler(bot: BOT, message: Message):
+    """
+    CMD: CANCEL
+    INFO: Stops a running or queued job, killing its ffmpeg processes and removing its temp files.
+    USAGE:
+        .cancel [id]
+    """
+    job_id = (message.input or "").strip().lstrip("#")
+    if not job_id.isdigit():
+        return await message.reply("<b>Usage:</b> <code>.cancel [id]</code> (see <code>.jobs</code>)", del_in=ERROR_VISIBLE_DURATION)
+
+    job = JOBS.get(int(job_id))
+    if not job or not JOBS.cancel(job):
+        return await message.reply(f"No running job with id <code>{job_id}</code>.", del_in=ERROR_VISIBLE_DURATION)
+
+    await message.reply(f"<code>Cancelling job #{job.id} (.{html.escape(job.name)})...</code>", del_in=ERROR_VISIBLE_DURATION)
+
+
+@Client.on_deleted_messages()
+async def cancel_jobs_of_deleted_messages(client: Client, messages: list[Message]):
+    """Deleting the command message cancels the work it started."""
+    for deleted in messages:
+        chat_id = deleted.chat.id if deleted.chat else None
+        for job in JOBS.for_messages(chat_id, [deleted.id]):
+            JOBS.cancel(job)
@@ -0,0 +1,165 @@
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+from dotenv import load_dotenv
+from pyrogram.types import Message
+
+from app import BOT, bot
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+MEDIA_NICE = int(os.getenv("MEDIA_NICE", "10"))
+# Comma-separated CPU ids for media workers; by default every core but the first,
+# which is left to the event loop and the moderation commands it serves.
+MEDIA_CPUS = os.getenv("MEDIA_CPUS", "")
+LANE_SAMPLES = 500
+LOOP_LAG_INTERVAL = 1.0
+
+
+def get_media_cpus() -> set[int] | None:
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    available = os.sched_getaffinity(0)
+    if MEDIA_CPUS:
+        wanted = {int(cpu) for cpu in MEDIA_CPUS.split(",") if cpu.strip().isdigit()}
+        return (wanted & available) or None
+    if len(available) > 1:
+        return available - {min(available)}
+    return None
+
+
+MEDIA_CPU_SET = get_media_cpus()
+MEDIA_WORKERS = len(MEDIA_CPU_SET) if MEDIA_CPU_SET else max(1, os.cpu_count() or 1)
+
+
+def apply_media_priority():
+    """Runs in media worker processes and before exec of ffmpeg: lower priority, pin to media cores."""
+    try:
+        os.nice(MEDIA_NICE)
+    except OSError:
+        pass
+    if MEDIA_CPU_SET:
+        try:
+            os.sched_setaffinity(0, MEDIA_CPU_SET)
+        except OSError:
+            pass
+
+
+class LaneStats:
+    """Rolling latency samples for one lane."""
+
+    def __init__(self, name: str, size: int = LANE_SAMPLES):
+        self.name = name
+        self.samples: deque[float] = deque(maxlen=size)
+        self.total = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.total += 1
+
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+    def summary(self) -> str:
+        if not self.samples:
+            return f"<b>{self.name}:</b> no samples"
+        return (
+            f"<b>{self.name}:</b> n={self.total} "
+            f"p50={self.percentile(0.5) * 1000:.0f}ms "
+            f"p95={self.percentile(0.95) * 1000:.0f}ms "
+            f"max={max(self.samples) * 1000:.0f}ms"
+        )
+
+
+LANES = {
+    "admin": LaneStats("admin (loop wait)"),
+    "media_wait": LaneStats("media (queue wait)"),
+    "media_run": LaneStats("media (run time)"),
+    "loop": LaneStats("event loop lag"),
+}
+
+_executor: ProcessPoolExecutor | None = None
+_lag_task: asyncio.Task | None = None
+
+
+def get_media_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, initializer=apply_media_priority)
+    return _executor
+
+
+def timed_call(function, submitted_at: float, *args):
+    """Runs in the worker; reports how long the call waited in the pool and how long it ran."""
+    started_at = time.time()
+    result = function(*args)
+    return result, started_at - submitted_at, time.time() - started_at
+
+
+async def run_media(function, *args):
+    """
+    Runs CPU-heavy Pillow work in the niced, pinned media process pool instead of a thread,
+    so it neither holds the GIL nor competes with the event loop's core.
+    `function` and its arguments must be picklable (module-level functions, paths, bytes).
+    """
+    loop = asyncio.get_running_loop()
+    result, waited, ran = await loop.run_in_executor(get_media_executor(), timed_call, function, time.time(), *args)
+    LANES["media_wait"].record(waited)
+    LANES["media_run"].record(ran)
+    return result
+
+
+def admin_lane(function):
+    """
+    Marks a moderation handler as latency-critical and records how long it waits for the event
+    loop when it starts: the time every callback already queued ahead of it (media progress,
+    uploads, other handlers) takes to run. Its own network and Telegram waits are not counted.
+    """
+
+    @wraps(function)
+    async def wrapper(bot: BOT, message: Message):
+        started_at = time.perf_counter()
+        await asyncio.sleep(0)
+        LANES["admin"].record(time.perf_counter() - started_at)
+        return await function(bot, message)
+
+    return wrapper
+
+
+async def monitor_loop_lag():
+    """A blocked event loop delays every handler; sample how late a fixed sleep wakes up."""
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LANES["loop"].record(max(time.perf_counter() - started_at - LOOP_LAG_INTERVAL, 0))
+
+
+async def init_task():
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(monitor_loop_lag())
+
+
+@bot.add_cmd(cmd="lanes")
+async def lanes_handler(bot: BOT, message: Message):
+    """
+    CMD: LANES
+    INFO: Shows per-lane latency: event loop wait of moderation commands, media pool wait/run time and event loop lag.
+    USAGE:
+        .lanes
+    """
+    cpus = ",".join(map(str, sorted(MEDIA_CPU_SET))) if MEDIA_CPU_SET else "all"
+    lines = [
+        "<b>Execution lanes</b>",
+        f"<code>media: {MEDIA_WORKERS} workers, nice {MEDIA_NICE}, cpus {cpus}</code>",
+        "",
+        *(lane.summary() for lane in LANES.values()),
+    ]
+    await message.reply("\n".join(lines))
@@ -0,0 +1,78 @@
+import os
+import shutil
+from PIL import Image, JpegImagePlugin
+
+from .ffmpeg import PRIORITY_HIGH, run_command
+from .probe import MediaInfo
+
+JPEGTRAN = shutil.which("jpegtran")
+DISPLAY_MATRIX_EXTS = (".mp4", ".m4v", ".mov")
+
+# JPEG MCU size (width, height) by Pillow's chroma subsampling id: 4:4:4, 4:2:2, 4:2:0.
+MCU_SIZES = {0: (8, 8), 1: (16, 8), 2: (16, 16)}
+
+
+def get_jpeg_layout(input_path: str) -> tuple[int, int, int, int] | None:
+    """Returns (width, height, mcu_width, mcu_height) for baseline-readable JPEGs, else None."""
+    with Image.open(input_path) as img:
+        if img.format != "JPEG":
+            return None
+        if img.mode == "L":
+            return img.width, img.height, 8, 8
+        mcu_size = MCU_SIZES.get(JpegImagePlugin.get_sampling(img))
+        if not mcu_size:
+            return None
+        return img.width, img.height, *mcu_size
+
+
+async def lossless_rotate_jpeg(input_path: str, output_path: str, angle: int) -> str | None:
+    """
+    Rotates a JPEG by rearranging its DCT blocks with jpegtran, without decoding or re-encoding.
+    Returns None when jpegtran is missing or the image can't be transformed perfectly
+    (dimensions not a multiple of the MCU), so the caller can fall back to Pillow.
+    Like the Pillow path it drops EXIF, so a stale Orientation tag can't rotate the result again.
+    """
+    if not JPEGTRAN or not get_jpeg_layout(input_path):
+        return None
+    command = f'jpegtran -rotate {angle} -perfect -copy comments -outfile "{output_path}" "{input_path}"'
+    _, _, code = await run_command(command, priority=PRIORITY_HIGH)
+    return output_path if code == 0 and os.path.exists(output_path) else None
+
+
+async def lossless_crop_jpeg(input_path: str, output_path: str, width: int, height: int) -> str | None:
+    """
+    Crops a JPEG without re-encoding. jpegtran can only start a crop on an MCU boundary, so the
+    centered offset is snapped down to the nearest MCU; the result is exactly width x height
+    but may sit up to one MCU (8-16px) left/up of true center.
+    """
+    if not JPEGTRAN or not (layout := get_jpeg_layout(input_path)):
+        return None
+    orig_width, orig_height, mcu_width, mcu_height = layout
+    if width > orig_width or height > orig_height:
+        return None
+    left = (orig_width - width) // 2 // mcu_width * mcu_width
+    top = (orig_height - height) // 2 // mcu_height * mcu_height
+    command = f'jpegtran -crop {width}x{height}+{left}+{top} -copy comments -outfile "{output_path}" "{input_path}"'
+    _, _, code = await run_command(command, priority=PRIORITY_HIGH)
+    return output_path if code == 0 and os.path.exists(output_path) else None
+
+
+def get_rotated_display_size(media_info: MediaInfo, rotations: int) -> tuple[int, int]:
+    width, height = media_info.video.width, media_info.video.height
+    if (media_info.video.rotation - rotations * 90) % 180:
+        width, height = height, width
+    return width, height
+
+
+async def lossless_rotate_video(input_path: str, output_path: str, media_info: MediaInfo, rotations: int) -> str | None:
+    """
+    Rotates a video clockwise by rewriting the container's display matrix with stream copy.
+    Returns None for containers without a display matrix or when ffmpeg rejects it.
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    if ext not in DISPLAY_MATRIX_EXTS or not media_info.video:
+        return None
+    display_rotation = (media_info.video.rotation - rotations * 90) % 360
+    command = f'ffmpeg -display_rotation {display_rotation} -i "{input_path}" -c copy -y "{output_path}"'
+    _, _, code = await run_command(command, priority=PRIORITY_HIGH)
+    return output_path if code == 0 else None
@@ -0,0 +1,219 @@
+import os
+import re
+import math
+import html
+from pyrogram.types import Message, ReplyParameters
+
+from app import BOT, bot
+from .ffmpeg import run_command
+from .probe import MediaInfo, probe_media
+from .cache import cache_result, make_cache_key, send_cached_result
+from .crop import build_crop_filter
+from .lossless import get_rotated_display_size
+from .rotate import build_rotate_filter
+from .speed import build_atempo_filter, build_setpts_filter
+from .volume import build_volume_filter
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+
+ERROR_VISIBLE_DURATION = 8
+
+
+def parse_pipeline(text: str) -> list[tuple[str, object]]:
+    """Parses `crop 720x720 | rotate 90 | speed 2 | vol 1.5` into (operation, argument) steps."""
+    steps = []
+    for raw_step in text.split("|"):
+        parts = raw_step.split()
+        if len(parts) != 2:
+            raise ValueError(f"Invalid step: '{raw_step.strip()}'.")
+        operation, arg = parts[0].lower(), parts[1].lower()
+
+        if operation == "crop":
+            match = re.fullmatch(r"(\d+)[x:](\d+)", arg)
+            if not match:
+                raise ValueError("crop expects [width]x[height].")
+            steps.append(("crop", (int(match.group(1)), int(match.group(2)))))
+        elif operation == "rotate":
+            value = int(arg)
+            rotations = value // 90 if value in (90, 180, 270) else value
+            if rotations not in (1, 2, 3):
+                raise ValueError("rotate expects 90, 180 or 270.")
+            steps.append(("rotate", rotations))
+        elif operation == "speed":
+            factor = float(arg)
+            if not math.isfinite(factor) or factor <= 0:
+                raise ValueError("speed expects a positive factor.")
+            steps.append(("speed", factor))
+        elif operation in ("vol", "volume"):
+            factor = float(arg)
+            if not math.isfinite(factor) or factor < 0:
+                raise ValueError("vol expects a non-negative factor.")
+            steps.append(("vol", factor))
+        else:
+            raise ValueError(f"Unknown operation: '{operation}'.")
+
+    return steps
+
+
+def format_pipeline(steps: list[tuple[str, object]]) -> str:
+    formatted = []
+    for operation, arg in steps:
+        if operation == "crop":
+            arg = f"{arg[0]}x{arg[1]}"
+        elif operation == "rotate":
+            arg = arg * 90
+        formatted.append(f"{operation} {arg}")
+    return " | ".join(formatted)
+
+
+def compile_filter_graph(steps: list[tuple[str, object]], media_info: MediaInfo) -> tuple[str, str]:
+    """Turns the steps into one -filter_complex graph and the matching -map arguments."""
+    video_filters, audio_filters = [], []
+    width, height = media_info.width, media_info.height
+    if media_info.video:
+        # ffmpeg autorotates by the display matrix, so the filters see a ±90° video's sides swapped.
+        width, height = get_rotated_display_size(media_info, 0)
+
+    for operation, arg in steps:
+        if operation in ("crop", "rotate") and not media_info.image:
+            raise ValueError(f"{operation} needs an image or video.")
+
+        if operation == "crop":
+            crop_width, crop_height = arg
+            if crop_width > width or crop_height > height:
+                raise ValueError(f"Crop dimensions ({crop_width}x{crop_height}) cannot be larger than the frame ({width}x{height}).")
+            video_filters.append(build_crop_filter(crop_width, crop_height))
+            width, height = crop_width, crop_height
+        elif operation == "rotate":
+            video_filters.append(build_rotate_filter(arg))
+            if arg % 2:
+                width, height = height, width
+        elif operation == "speed":
+            if not (media_info.has_video or media_info.has_audio):
+                raise ValueError("speed needs a video or audio stream.")
+            if media_info.has_video:
+                video_filters.append(build_setpts_filter(arg))
+            if media_info.has_audio:
+                audio_filters.append(build_atempo_filter(arg))
+        elif operation == "vol":
+            if not media_info.has_audio:
+                raise ValueError("vol needs a media with an audio track.")
+            audio_filters.append(build_volume_filter(arg))
+
+    graph, maps = [], []
+    if video_filters:
+        graph.append(f"[0:v:0]{','.join(video_filters)}[v]")
+        maps.append('-map "[v]"')
+    elif media_info.image:
+        maps.append("-map 0:v:0 -c:v copy")
+
+    if audio_filters:
+        graph.append(f"[0:a:0]{','.join(audio_filters)}[a]")
+        maps.append('-map "[a]"')
+    elif media_info.has_audio:
+        maps.append("-map 0:a:0 -c:a copy")
+
+    return ";".join(graph), " ".join(maps)
+
+
+async def sync_run_pipeline(input_path: str, steps: list[tuple[str, object]], media_info: MediaInfo, progress: Message | None = None) -> str:
+    """Applies every step in a single ffmpeg decode/encode pass."""
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_media{ext}")
+
+    filter_graph, map_args = compile_filter_graph(steps, media_info)
+    command = f'ffmpeg -i "{input_path}" -filter_complex "{filter_graph}" {map_args} -y "{output_path}"'
+
+    output_duration = media_info.duration
+    for operation, arg in steps:
+        if operation == "speed" and output_duration:
+            output_duration /= arg
+
+    _, stderr, code = await run_command(command, progress=progress, duration=output_duration)
+    if code != 0: raise RuntimeError(f"FFmpeg pipeline failed: {stderr}")
+
+    return output_path
+
+
+@bot.add_cmd(cmd="media")
+@tracked_job("media")
+async def media_pipeline_handler(bot: BOT, message: Message):
+    """
+    CMD: MEDIA
+    INFO: Applies several edits to the replied media in a single encode.
+    USAGE:
+        .media [step] | [step] | ...
+    STEPS:
+        crop [width]x[height], rotate [90|180|270], speed [factor], vol [factor]
+    EXAMPLE:
+        .media crop 720x720 | rotate 90 | speed 2 | vol 1.5
+    """
+    replied_msg = message.replied
+    is_media = replied_msg and (
+        replied_msg.photo or replied_msg.video or replied_msg.animation or replied_msg.audio or replied_msg.voice or
+        (replied_msg.document and replied_msg.document.mime_type.startswith(("image/", "video/", "audio/")))
+    )
+    if not is_media:
+        return await message.reply("Please reply to an image, video, GIF or audio file.", del_in=ERROR_VISIBLE_DURATION)
+
+    if not message.input:
+        return await message.reply("<b>Usage:</b> <code>.media crop 720x720 | rotate 90 | speed 2 | vol 1.5</code>", del_in=ERROR_VISIBLE_DURATION)
+
+    try:
+        steps = parse_pipeline(message.input)
+    except ValueError as e:
+        return await message.reply(f"<b>Invalid pipeline:</b> {html.escape(str(e))}", del_in=ERROR_VISIBLE_DURATION)
+
+    pipeline_str = format_pipeline(steps)
+    cache_key = make_cache_key(replied_msg, "media", pipeline_str.replace(" ", ""))
+    if await send_cached_result(bot, message, cache_key):
+        return
+
+    progress_message = await message.reply("<code>Downloading media...</code>")
+
+    original_path, modified_path = "", ""
+    workspace = None
+    try:
+        workspace = await create_workspace("media", get_media_size(replied_msg) * 2, progress_message)
+        media_object = (
+            replied_msg.photo or replied_msg.video or replied_msg.animation or
+            replied_msg.audio or replied_msg.voice or replied_msg.document
+        )
+        original_path = await bot.download_media(media_object, file_name=workspace.dir)
+
+        media_info = await probe_media(original_path, media_object.file_unique_id)
+        if not media_info:
+            raise ValueError("Could not read the media file.")
+
+        await progress_message.edit(f"<code>Applying: {html.escape(pipeline_str)}...</code>")
+
+        modified_path = await sync_run_pipeline(original_path, steps, media_info, progress=progress_message)
+
+        await progress_message.edit("<code>Sending media...</code>")
+
+        caption = f"Applied: `{pipeline_str}`"
+        reply_params = ReplyParameters(message_id=replied_msg.id)
+        mime_type = getattr(replied_msg.document, "mime_type", "") or ""
+
+        if replied_msg.photo or (mime_type.startswith("image/") and mime_type != "image/gif"):
+            sent_message = await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        elif replied_msg.animation or mime_type == "image/gif":
+            sent_message = await bot.send_animation(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        elif replied_msg.video or mime_type.startswith("video/"):
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        elif replied_msg.voice:
+            sent_message = await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        else:
+            sent_message = await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+
+        await cache_result(cache_key, sent_message)
+
+        await progress_message.delete()
+        await message.delete()
+
+    except Exception as e:
+        error_text = f"<b>Error:</b> Could not process media.\n<code>{html.escape(str(e))}</code>"
+        await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
+    finally:
+        if workspace:
+            workspace.cleanup()
@@ -0,0 +1,135 @@
+import json
+from collections import OrderedDict
+
+from .ffmpeg import PRIORITY_HIGH, run_command, scheduler
+
+PROBE_CACHE_SIZE = 512
+
+
+def parse_rate(rate: str | None) -> float:
+    try:
+        num, den = map(int, (rate or "0/0").split('/'))
+        return round(num / den, 2) if den != 0 else 0
+    except ValueError:
+        return 0
+
+
+def to_number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_rotation(data: dict) -> int:
+    """Display rotation in degrees counter-clockwise, as ffmpeg's -display_rotation expects."""
+    for side_data in data.get("side_data_list") or []:
+        if "rotation" in side_data:
+            return int(float(side_data["rotation"]))
+    # The legacy tag is clockwise.
+    return -int(to_number((data.get("tags") or {}).get("rotate"), int) or 0)
+
+
+class StreamInfo:
+    def __init__(self, data: dict):
+        self.raw = data
+        self.index: int = data.get("index", 0)
+        self.codec_type: str | None = data.get("codec_type")
+        self.codec_name: str | None = data.get("codec_name")
+        self.codec_long_name: str | None = data.get("codec_long_name")
+        self.width: int | None = data.get("width")
+        self.height: int | None = data.get("height")
+        self.fps: float = parse_rate(data.get("avg_frame_rate"))
+        self.bit_rate: int | None = to_number(data.get("bit_rate"), int)
+        self.sample_rate: int | None = to_number(data.get("sample_rate"), int)
+        self.channels: int | None = data.get("channels")
+        self.channel_layout: str | None = data.get("channel_layout")
+        self.duration: float | None = to_number(data.get("duration"))
+        self.tags: dict = data.get("tags") or {}
+        self.rotation: int = get_rotation(data)
+        self.is_attached_pic: bool = bool((data.get("disposition") or {}).get("attached_pic"))
+
+
+class MediaInfo:
+    """Typed view of one `ffprobe -show_format -show_streams` run."""
+
+    def __init__(self, data: dict):
+        self.raw = data
+        self.format: dict = data.get("format") or {}
+        self.format_name: str | None = self.format.get("format_name")
+        self.format_tags: dict = self.format.get("tags") or {}
+        self.duration: float | None = to_number(self.format.get("duration"))
+        self.size: int | None = to_number(self.format.get("size"), int)
+        self.streams = [StreamInfo(stream) for stream in data.get("streams") or []]
+
+        # Cover art in audio files shows up as a one-frame video stream.
+        self.video: StreamInfo | None = next(
+            (s for s in self.streams if s.codec_type == "video" and not s.is_attached_pic), None
+        )
+        self.image: StreamInfo | None = next((s for s in self.streams if s.codec_type == "video"), None)
+        self.audio: StreamInfo | None = next((s for s in self.streams if s.codec_type == "audio"), None)
+
+    @property
+    def has_video(self) -> bool:
+        return self.video is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def width(self) -> int | None:
+        return self.image.width if self.image else None
+
+    @property
+    def height(self) -> int | None:
+        return self.image.height if self.image else None
+
+
+PROBE_CACHE: OrderedDict[str, MediaInfo] = OrderedDict()
+
+
+def remember_probe(file_unique_id: str | None, media_info: MediaInfo):
+    if file_unique_id:
+        PROBE_CACHE[file_unique_id] = media_info
+        if len(PROBE_CACHE) > PROBE_CACHE_SIZE:
+            PROBE_CACHE.popitem(last=False)
+
+
+def parse_probe(stdout: str | bytes) -> MediaInfo | None:
+    try:
+        return MediaInfo(json.loads(stdout))
+    except json.JSONDecodeError:
+        return None
+
+
+async def probe_media(file_path: str, file_unique_id: str | None = None) -> MediaInfo | None:
+    """Runs ffprobe once per file, memoized by the Telegram file_unique_id when given."""
+    if file_unique_id and file_unique_id in PROBE_CACHE:
+        PROBE_CACHE.move_to_end(file_unique_id)
+        return PROBE_CACHE[file_unique_id]
+
+    command = f'ffprobe -v quiet -print_format json -show_format -show_streams "{file_path}"'
+    stdout, _, code = await run_command(command, priority=PRIORITY_HIGH)
+    if code != 0 or not stdout:
+        return None
+    media_info = parse_probe(stdout)
+    if media_info:
+        remember_probe(file_unique_id, media_info)
+    return media_info
+
+
+async def probe_bytes(data: bytes, file_unique_id: str | None = None) -> MediaInfo | None:
+    """probe_media for media held in memory, fed to ffprobe through a pipe."""
+    if file_unique_id and file_unique_id in PROBE_CACHE:
+        PROBE_CACHE.move_to_end(file_unique_id)
+        return PROBE_CACHE[file_unique_id]
+
+    command = "ffprobe -v quiet -print_format json -show_format -show_streams pipe:0"
+    stdout, _, code = await scheduler.run(command, priority=PRIORITY_HIGH, input_data=data)
+    if code != 0 or not stdout:
+        return None
+    media_info = parse_probe(stdout)
+    if media_info:
+        remember_probe(file_unique_id, media_info)
+    return media_info
@@ -1,39 +1,31 @@
 import os
 import html
-import asyncio
 from PIL import Image
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import PRIORITY_HIGH, run_command
+from .probe import probe_media
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+from .lanes import run_media
 
-TEMP_DIR = "temp_resize/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return (
-        stdout.decode('utf-8', 'replace').strip(),
-        stderr.decode('utf-8', 'replace').strip(),
-        process.returncode
-    )
-
 def sync_resize_image(input_path: str, width: int, height: int) -> str:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_resized{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_resized{ext}")
     with Image.open(input_path) as img:
         resized_img = img.resize((width, height), Image.Resampling.LANCZOS)
         if resized_img.mode in ("RGBA", "P"): resized_img = resized_img.convert("RGB")
         resized_img.save(output_path)
     return output_path
 
-async def sync_resize_video_or_gif(input_path: str, width: int, height: int) -> tuple[str, str | None]:
+async def sync_resize_video_or_gif(input_path: str, width: int, height: int, progress: Message | None = None, duration: float | None = None) -> tuple[str, str | None]:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_resized{ext}")
-    thumb_path = os.path.join(TEMP_DIR, f"{base}_thumb.jpg")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_resized{ext}")
+    thumb_path = os.path.join(os.path.dirname(input_path), f"{base}_thumb.jpg")
     
     command_resize = (
         f'ffmpeg -i "{input_path}" '
@@ -42,17 +34,18 @@ async def sync_resize_video_or_gif(input_path: str, width: int, height: int) ->
         f'-c:a aac '
         f'-y "{output_path}"'
     )
-    _, stderr, code = await run_command(command_resize)
+    _, stderr, code = await run_command(command_resize, progress=progress, duration=duration)
     if code != 0: raise RuntimeError(f"FFmpeg resize failed: {stderr}")
     
     command_thumb = f'ffmpeg -i "{output_path}" -ss 00:00:01 -vframes 1 -y "{thumb_path}"'
-    _, stderr, code = await run_command(command_thumb)
+    _, stderr, code = await run_command(command_thumb, priority=PRIORITY_HIGH)
     thumb_path = thumb_path if code == 0 else None
         
     return output_path, thumb_path
 
 
 @bot.add_cmd(cmd="resize")
+@tracked_job("resize")
 async def resize_handler(bot: BOT, message: Message):
     replied_msg = message.replied
     is_media = replied_msg and (replied_msg.photo or replied_msg.video or replied_msg.animation or (replied_msg.document and replied_msg.document.mime_type.startswith(("image/", "video/"))))
@@ -72,13 +65,17 @@ async def resize_handler(bot: BOT, message: Message):
         await message.reply("Invalid resolution format. Please use `[width]x[height]`.", del_in=ERROR_VISIBLE_DURATION)
         return
 
+    cache_key = make_cache_key(replied_msg, "resize", f"{width}x{height}")
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, resized_path, thumb_path = "", "", None
-    temp_files = []
+    workspace = None
     try:
-        original_path = await bot.download_media(replied_msg)
-        temp_files.append(original_path)
+        workspace = await create_workspace("resizer", get_media_size(replied_msg) * 2, progress_message)
+        original_path = await bot.download_media(replied_msg, file_name=workspace.dir)
         
         await progress_message.edit(f"<code>Resizing to {width}x{height}...</code>")
 
@@ -87,10 +84,9 @@ async def resize_handler(bot: BOT, message: Message):
         is_animation = replied_msg.animation
 
         if is_image:
-            resized_path = await asyncio.to_thread(sync_resize_image, original_path, width, height)
-            temp_files.append(resized_path)
+            resized_path = await run_media(sync_resize_image, original_path, width, height)
             await progress_message.edit("<code>Sending media...</code>")
-            await bot.send_photo(
+            sent_message = await bot.send_photo(
                 message.chat.id,
                 resized_path,
                 caption=f"Resized to: `{width}x{height}`",
@@ -98,12 +94,14 @@ async def resize_handler(bot: BOT, message: Message):
             )
         
         elif is_video or is_animation:
-            resized_path, thumb_path = await sync_resize_video_or_gif(original_path, width, height)
-            temp_files.extend([resized_path, thumb_path] if thumb_path else [resized_path])
+            media_object = replied_msg.video or replied_msg.animation or replied_msg.document
+            media_info = await probe_media(original_path, media_object.file_unique_id)
+            duration = media_info.duration if media_info else None
+            resized_path, thumb_path = await sync_resize_video_or_gif(original_path, width, height, progress=progress_message, duration=duration)
 
             await progress_message.edit("<code>Sending media...</code>")
             if is_video:
-                await bot.send_video(
+                sent_message = await bot.send_video(
                     message.chat.id,
                     resized_path, 
                     caption=f"Resized to: `{width}x{height}`",
@@ -113,7 +111,7 @@ async def resize_handler(bot: BOT, message: Message):
                     reply_parameters=ReplyParameters(message_id=replied_msg.id)
                 )
             else:
-                await bot.send_animation(
+                sent_message = await bot.send_animation(
                     message.chat.id,
                     resized_path, 
                     caption=f"Resized to: `{width}x{height}`",
@@ -125,6 +123,8 @@ async def resize_handler(bot: BOT, message: Message):
         else:
             raise ValueError("Unsupported media type.")
         
+        await cache_result(cache_key, sent_message)
+        
         await progress_message.delete()
         await message.delete()
 
@@ -132,5 +132,5 @@ async def resize_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not resize media.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f): os.remove(f)
+        if workspace:
+            workspace.cleanup()
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from collections.abc import Callable
+from functools import wraps
+from dotenv import load_dotenv
+
+from app import CustomDB
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+RESPONSE_CACHE_DB = CustomDB["RESPONSE_CACHE"]
+
+
+class ResponseCache:
+    """
+    In-memory LRU of lookup results with an optional CustomDB tier for entries that should
+    survive restarts. Concurrent misses for the same key share one fetch.
+    """
+
+    def __init__(self, collection, max_entries: int):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._fetches: dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str, persist: bool) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None and persist:
+            try:
+                entry = await self.collection.find_one({"_id": key})
+            except Exception:
+                entry = None
+            if entry:
+                self._remember(key, entry)
+        if not entry:
+            return None
+        if time.time() > entry["expires"]:
+            await self.delete(key, persist)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, value, persist: bool, ttl: float, stale_ttl: float):
+        stored = time.time()
+        entry = {"_id": key, "value": value, "stored": stored, "ttl": ttl, "expires": stored + ttl + stale_ttl}
+        self._remember(key, entry)
+        if persist:
+            try:
+                await self.collection.add_data(entry)
+            except Exception:
+                pass
+
+    async def delete(self, key: str, persist: bool):
+        self._entries.pop(key, None)
+        if persist:
+            try:
+                await self.collection.delete_data(id=key)
+            except Exception:
+                pass
+
+    async def prune(self):
+        """Deletes persisted entries that expired while nothing asked for them."""
+        now = time.time()
+        expired = [entry["_id"] async for entry in self.collection.find() if now > entry["expires"]]
+        for key in expired:
+            await self.delete(key, persist=True)
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def fetch(self, key: str, function, args, kwargs, persist: bool, ttl, stale_ttl: float):
+        """Runs the real lookup once per key, however many callers are waiting on it."""
+        task = self._fetches.get(key)
+        if task is None:
+
+            async def run():
+                try:
+                    value = await function(*args, **kwargs)
+                    if value is not None:
+                        entry_ttl = ttl(value, *args, **kwargs) if callable(ttl) else ttl
+                        await self.set(key, value, persist, entry_ttl, stale_ttl)
+                    return value
+                finally:
+                    self._fetches.pop(key, None)
+
+            task = self._fetches[key] = asyncio.create_task(run())
+        return await asyncio.shield(task)
+
+    def refresh(self, key: str, function, args, kwargs, persist: bool, ttl, stale_ttl: float):
+        if key in self._fetches:
+            return
+        task = asyncio.create_task(self.fetch(key, function, args, kwargs, persist, ttl, stale_ttl))
+        # A failed background refresh just leaves the stale entry in place.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_DB, RESPONSE_CACHE_MAX_ENTRIES)
+
+
+async def init_task():
+    await RESPONSE_CACHE.prune()
+
+
+def make_key(name: str, args: tuple, kwargs: dict, normalize: Callable[[str], str] | None = None) -> str:
+    """Arguments are kept exactly as given unless the lookup says which differences don't matter."""
+    normalize = normalize or (lambda text: text)
+    parts = [normalize(str(arg).strip()) for arg in args]
+    parts += [f"{k}={normalize(str(v).strip())}" for k, v in sorted(kwargs.items())]
+    return ":".join([name, *parts])
+
+
+def cached_response(
+    name: str,
+    ttl: float | Callable[..., float],
+    stale_ttl: float = 0,
+    persist: bool = False,
+    normalize: Callable[[str], str] | None = None,
+):
+    """
+    Caches the result of an async lookup function for `ttl` seconds.
+    For `stale_ttl` seconds after that the old result is still returned immediately while a
+    background refresh runs (stale-while-revalidate); after that the entry is deleted, also from
+    the DB. None results are never cached.
+    `ttl` may also be a function of (result, *args, **kwargs), for lookups whose results
+    don't all stay valid for the same time; it is evaluated once when the result is stored.
+    `normalize` folds arguments into the key (e.g. str.lower for case-insensitive searches).
+    """
+
+    def decorator(function):
+        @wraps(function)
+        async def wrapper(*args, **kwargs):
+            key = make_key(name, args, kwargs, normalize)
+            entry = await RESPONSE_CACHE.get(key, persist)
+            # Entries past their stale window are deleted by get() and come back as None.
+            if entry:
+                if time.time() - entry["stored"] >= entry["ttl"]:
+                    RESPONSE_CACHE.refresh(key, function, args, kwargs, persist, ttl, stale_ttl)
+                return entry["value"]
+            return await RESPONSE_CACHE.fetch(key, function, args, kwargs, persist, ttl, stale_ttl)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,106 @@
+import asyncio
+from collections.abc import Callable
+from pyrogram import Client, filters
+from pyrogram.types import Message
+
+# Runs before the command handlers and never stops propagation.
+RESPONSE_HANDLER_GROUP = -1
+
+
+class ResponseWaiter:
+    """One expected reply from a bot chat. Register it before sending the request so a fast reply is never missed."""
+
+    def __init__(
+        self,
+        correlator: "ResponseCorrelator",
+        chat_id: int,
+        predicate: Callable[[Message], bool] | None,
+        hint: str | None = None,
+    ):
+        self.correlator = correlator
+        self.chat_id = chat_id
+        self.predicate = predicate
+        # Text the reply is expected to contain (a codename, a user id); used to pick between waiters.
+        self.hint = hint.lower() if hint else None
+        # Ids of our own messages this reply may quote; a quoting reply is routed here first.
+        self.reply_to: set[int] = set()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def matches(self, message: Message) -> bool:
+        return not self.future.done() and (self.predicate is None or self.predicate(message))
+
+    async def get(self, timeout: float) -> Message | None:
+        """Returns the matching message, or None on timeout. The waiter is removed either way."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        self.correlator.discard(self)
+        if not self.future.done():
+            self.future.cancel()
+
+
+class ResponseCorrelator:
+    """
+    Resolves waiters from incoming private messages instead of polling chat history.
+    Several waiters on the same bot are served oldest first, except that a reply quoting
+    one waiter's request, or containing its hint, goes to that waiter.
+    """
+
+    def __init__(self):
+        self._waiters: dict[int, list[ResponseWaiter]] = {}
+        self._peer_ids: dict[str, int] = {}
+
+    def expect(
+        self, chat_id: int, predicate: Callable[[Message], bool] | None = None, hint: str | None = None
+    ) -> ResponseWaiter:
+        waiter = ResponseWaiter(self, chat_id, predicate, hint)
+        self._waiters.setdefault(chat_id, []).append(waiter)
+        return waiter
+
+    def discard(self, waiter: ResponseWaiter):
+        waiters = self._waiters.get(waiter.chat_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[waiter.chat_id]
+
+    def is_waiting(self, chat_id: int) -> bool:
+        return chat_id in self._waiters
+
+    def dispatch(self, message: Message) -> bool:
+        waiters = [waiter for waiter in self._waiters.get(message.chat.id, []) if waiter.matches(message)]
+        if not waiters:
+            return False
+        quoted = message.reply_to_message_id
+        text = (message.text or message.caption or "").lower()
+        waiter = (
+            next((waiter for waiter in waiters if quoted in waiter.reply_to), None)
+            or next((waiter for waiter in waiters if waiter.hint and waiter.hint in text), None)
+            or waiters[0]
+        )
+        waiter.future.set_result(message)
+        self.discard(waiter)
+        return True
+
+    async def resolve_chat_id(self, client: Client, username: str) -> int:
+        """Waiters are keyed by numeric chat id; bot usernames are looked up once."""
+        if username not in self._peer_ids:
+            self._peer_ids[username] = (await client.get_users(username)).id
+        return self._peer_ids[username]
+
+
+RESPONSES = ResponseCorrelator()
+
+
+def has_waiter(_, __, message: Message) -> bool:
+    return bool(message.chat) and RESPONSES.is_waiting(message.chat.id)
+
+
+@Client.on_message(filters.private & filters.incoming & filters.create(has_waiter), group=RESPONSE_HANDLER_GROUP)
+async def dispatch_bot_response(client: Client, message: Message):
+    RESPONSES.dispatch(message)
@@ -1,48 +1,173 @@
 import os
+import csv
 import html
+import time
+import shutil
 import asyncio
+from io import BytesIO
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import get_pipe_format, run_command, run_pipe, safe_edit
+from .probe import MediaInfo, probe_media
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
 
-TEMP_DIR = "temp_reverse/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
+REVERSE_SEGMENT_SECONDS = 5
+# A stream-copied split can only cut at keyframes; a segment past this many times
+# REVERSE_SEGMENT_SECONDS means the keyframes are too sparse and the video is re-split.
+SEGMENT_OVERSHOOT = 2
+SEGMENT_PROGRESS_INTERVAL = 3
+SEGMENTABLE_EXTS = (".mp4", ".mkv", ".mov", ".webm")
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
+async def stream_reverse_audio(input_data: bytes, pipe_format: tuple[str, str, str], progress: Message | None = None) -> BytesIO:
+    """Reverses small audio entirely in memory, without temp files."""
+    muxer, codec, ext = pipe_format
+    command = f'ffmpeg -i pipe:0 -af "areverse" -c:a {codec} -f {muxer} pipe:1'
+    return await run_pipe(command, input_data, f"reversed{ext}", progress=progress)
+
+def get_split_command(input_path: str, work_dir: str, ext: str, reencode: bool) -> str:
+    """
+    Splits the video stream only; audio is cut from the input per segment later. The segment
+    list records every part's start and end time in the input.
+    """
+    codec_args = "-c:v copy"
+    if reencode:
+        video_codec = (
+            "-c:v libvpx-vp9 -deadline realtime -cpu-used 8 -crf 32 -b:v 0"
+            if ext.lower() == ".webm" else "-c:v libx264 -preset veryfast -crf 18"
+        )
+        # Forces a keyframe every REVERSE_SEGMENT_SECONDS so the segment muxer can cut there;
+        # the delta lets it cut on a forced keyframe whose timestamp lands just short of the mark.
+        codec_args = (
+            f'{video_codec} -force_key_frames "expr:gte(t,n_forced*{REVERSE_SEGMENT_SECONDS})" '
+            f'-segment_time_delta 0.05'
+        )
     return (
-        stdout.decode('utf-8', 'replace').strip(),
-        stderr.decode('utf-8', 'replace').strip(),
-        process.returncode
+        f'ffmpeg -i "{input_path}" -map 0:v:0 -an {codec_args} '
+        f'-f segment -segment_time {REVERSE_SEGMENT_SECONDS} -reset_timestamps 1 '
+        f'-segment_list "{os.path.join(work_dir, "segments.csv")}" -segment_list_type csv '
+        f'"{os.path.join(work_dir, f"part_%04d{ext}")}"'
     )
 
-async def sync_reverse_media(input_path: str, is_visual: bool) -> str:
+def read_segment_list(work_dir: str) -> list[tuple[str, float, float]]:
+    """(file name, start, end) of every part, in input time."""
+    with open(os.path.join(work_dir, "segments.csv"), newline="") as f:
+        return [(name, float(start), float(end)) for name, start, end in csv.reader(f)]
+
+def clear_segments(work_dir: str):
+    for name in os.listdir(work_dir):
+        os.remove(os.path.join(work_dir, name))
+
+async def sync_reverse_segmented(input_path: str, media_info: MediaInfo, progress: Message | None = None) -> str:
+    """
+    Reverses a long video chunk by chunk: split at keyframes, reverse every chunk on the
+    shared ffmpeg workers, then concat the chunks back in reverse order. Only one chunk's
+    frames are buffered per worker, so memory doesn't grow with the video's length.
+    When the keyframes are too sparse for short chunks, the split is redone with a re-encode.
+    """
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_reversed{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_reversed{ext}")
+    work_dir = os.path.join(os.path.dirname(input_path), f"{base}_segments")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        split_command = get_split_command(input_path, work_dir, ext, reencode=False)
+        _, stderr, code = await run_command(split_command, progress=progress)
+        if code != 0: raise RuntimeError(f"FFmpeg split failed: {stderr}")
+
+        segments = read_segment_list(work_dir)
+        if any(end - start > REVERSE_SEGMENT_SECONDS * SEGMENT_OVERSHOOT for _, start, end in segments):
+            # Sparse keyframes (screen recordings, long-GOP phone video): one huge segment would
+            # make `reverse` buffer it all, so re-encode with keyframes forced at every cut.
+            clear_segments(work_dir)
+            if progress:
+                await safe_edit(progress, "<code>Reversing... re-splitting at forced keyframes</code>")
+            split_command = get_split_command(input_path, work_dir, ext, reencode=True)
+            _, stderr, code = await run_command(split_command, progress=progress, duration=media_info.duration)
+            if code != 0: raise RuntimeError(f"FFmpeg split failed: {stderr}")
+            segments = read_segment_list(work_dir)
+
+        done, last_update = 0, time.monotonic()
+
+        async def reverse_segment(name: str, start: float, end: float) -> tuple[str, str | None]:
+            """
+            Audio is cut from the input at the part's exact start and end and kept as FLAC. A stream
+            copy would cut it on codec frame boundaries and a lossy re-encode would pad every
+            chunk, both of which shift the audio against the video at each segment boundary.
+            """
+            nonlocal done, last_update
+            video_path = os.path.join(work_dir, f"rev_{name}")
+            audio_path = os.path.join(work_dir, f"rev_{os.path.splitext(name)[0]}.flac")
+            command = f'ffmpeg -i "{os.path.join(work_dir, name)}" -vf "reverse" -an -y "{video_path}"'
+            _, stderr, code = await run_command(command)
+            if code != 0: raise RuntimeError(f"FFmpeg reverse failed: {stderr}")
+            if media_info.has_audio:
+                command = (
+                    f'ffmpeg -ss {start:.6f} -t {end - start:.6f} -i "{input_path}" -map 0:a:0 -vn '
+                    f'-af "areverse" -c:a flac -y "{audio_path}"'
+                )
+                _, stderr, code = await run_command(command)
+                if code != 0: raise RuntimeError(f"FFmpeg reverse failed: {stderr}")
+            done += 1
+            if progress and time.monotonic() - last_update >= SEGMENT_PROGRESS_INTERVAL:
+                last_update = time.monotonic()
+                await safe_edit(progress, f"<code>Reversing... {done}/{len(segments)} segments</code>")
+            return video_path, audio_path if media_info.has_audio else None
+
+        async with asyncio.TaskGroup() as task_group:
+            tasks = [task_group.create_task(reverse_segment(*segment)) for segment in segments]
+        reversed_parts = [task.result() for task in reversed(tasks)]
+
+        def write_concat_list(list_name: str, paths: list[str]) -> str:
+            list_path = os.path.join(work_dir, list_name)
+            with open(list_path, "w") as f:
+                for path in paths:
+                    escaped_path = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{escaped_path}'\n")
+            return list_path
+
+        video_list = write_concat_list("video.txt", [video for video, _ in reversed_parts])
+        concat_command = f'ffmpeg -f concat -safe 0 -i "{video_list}"'
+        if media_info.has_audio:
+            audio_list = write_concat_list("audio.txt", [audio for _, audio in reversed_parts])
+            audio_codec = "libopus" if ext.lower() == ".webm" else "aac"
+            concat_command += f' -f concat -safe 0 -i "{audio_list}" -map 0:v -map 1:a -c:a {audio_codec}'
+        concat_command += f' -c:v copy -y "{output_path}"'
+        _, stderr, code = await run_command(concat_command, progress=progress)
+        if code != 0: raise RuntimeError(f"FFmpeg concat failed: {stderr}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return output_path
+
+async def sync_reverse_media(input_path: str, media_info: MediaInfo, progress: Message | None = None) -> str:
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_reversed{ext}")
     
+    is_long_video = media_info.has_video and (media_info.duration or 0) > REVERSE_SEGMENT_SECONDS * 2
+    if is_long_video and ext.lower() in SEGMENTABLE_EXTS:
+        return await sync_reverse_segmented(input_path, media_info, progress=progress)
+
     command = ""
-    if is_visual:
+    if media_info.has_video and media_info.has_audio:
         command = f'ffmpeg -i "{input_path}" -vf "reverse" -af "areverse" -y "{output_path}"'
-    else:
+    elif media_info.has_video:
+        command = f'ffmpeg -i "{input_path}" -vf "reverse" -an -y "{output_path}"'
+    elif media_info.has_audio:
         command = f'ffmpeg -i "{input_path}" -af "areverse" -y "{output_path}"'
+    else:
+        raise ValueError("No audio or video stream found in this file.")
 
-    _, stderr, code = await run_command(command)
-    
-    if code != 0:
-        if is_visual and ("Cannot find a matching stream" in stderr or "anull" in stderr):
-            command = f'ffmpeg -i "{input_path}" -vf "reverse" -an -y "{output_path}"'
-            _, stderr_fallback, code_fallback = await run_command(command)
-            if code_fallback != 0: raise RuntimeError(f"FFmpeg reverse failed (no audio): {stderr_fallback}")
-        else:
-            raise RuntimeError(f"FFmpeg reverse failed: {stderr}")
+    _, stderr, code = await run_command(command, progress=progress)
+    if code != 0: raise RuntimeError(f"FFmpeg reverse failed: {stderr}")
         
     return output_path
 
 @bot.add_cmd(cmd="reverse")
+@tracked_job("reverse")
 async def reverse_handler(bot: BOT, message: Message):
     """
     CMD: REVERSE
@@ -58,25 +183,35 @@ async def reverse_handler(bot: BOT, message: Message):
     if not is_media:
         return await message.reply("Please reply to a video, GIF, or audio file.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "reverse")
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
         media_object = (replied_msg.video or replied_msg.animation or replied_msg.audio or replied_msg.voice or replied_msg.document)
-        original_path = await bot.download_media(media_object)
-        temp_files.append(original_path)
-        
         is_visual = bool(
             replied_msg.video or replied_msg.animation or
             (replied_msg.document and replied_msg.document.mime_type.startswith('video/')) or
             (replied_msg.document and replied_msg.document.mime_type == 'image/gif')
         )
-        
-        await progress_message.edit("<code>Reversing...</code>")
-        
-        modified_path = await sync_reverse_media(original_path, is_visual)
-        temp_files.append(modified_path)
+        pipe_format = None if is_visual else get_pipe_format(media_object)
+
+        if pipe_format:
+            in_memory_file = await bot.download_media(media_object, in_memory=True)
+            await progress_message.edit("<code>Reversing...</code>")
+            modified_path = await stream_reverse_audio(in_memory_file.getvalue(), pipe_format, progress=progress_message)
+        else:
+            workspace = await create_workspace("reverse", get_media_size(replied_msg) * 4, progress_message)
+            original_path = await bot.download_media(media_object, file_name=workspace.dir)
+            await progress_message.edit("<code>Reversing...</code>")
+            media_info = await probe_media(original_path, media_object.file_unique_id)
+            if not media_info:
+                raise ValueError("Could not read the media file.")
+            modified_path = await sync_reverse_media(original_path, media_info, progress=progress_message)
         
         await progress_message.edit("<code>Sending media...</code>")
 
@@ -87,13 +222,15 @@ async def reverse_handler(bot: BOT, message: Message):
         is_video = bool(replied_msg.video or (replied_msg.document and replied_msg.document.mime_type.startswith('video/')))
 
         if is_animation:
-            await bot.send_animation(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_animation(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         elif is_video:
-            await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         elif replied_msg.voice:
-             await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+             sent_message = await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         else:
-            await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -102,6 +239,5 @@ async def reverse_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not reverse media.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
@@ -1,30 +1,23 @@
 import os
 import html
-import asyncio
 from PIL import Image
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import run_command
+from .probe import probe_media
+from .lossless import get_rotated_display_size, lossless_rotate_jpeg, lossless_rotate_video
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+from .lanes import run_media
 
-TEMP_DIR = "temp_rotate/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return (
-        stdout.decode('utf-8', 'replace').strip(),
-        stderr.decode('utf-8', 'replace').strip(),
-        process.returncode
-    )
-
 def sync_rotate_image(input_path: str, angle: int) -> str:
     """Synchronously rotates an image by a given angle."""
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_rotated{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_rotated{ext}")
     with Image.open(input_path) as img:
         rotated_img = img.rotate(-angle, expand=True)
         if rotated_img.mode in ("RGBA", "P"):
@@ -32,12 +25,15 @@ def sync_rotate_image(input_path: str, angle: int) -> str:
         rotated_img.save(output_path)
     return output_path
 
-async def sync_rotate_video_or_gif(input_path: str, rotations: int) -> str:
+def build_rotate_filter(rotations: int) -> str:
+    return ",".join(["transpose=1"] * rotations)
+
+async def sync_rotate_video_or_gif(input_path: str, rotations: int, progress: Message | None = None) -> str:
     """Synchronously rotates a video or GIF by applying the transpose filter N times."""
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_rotated{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_rotated{ext}")
     
-    transpose_filter = ",".join(["transpose=1"] * rotations)
+    transpose_filter = build_rotate_filter(rotations)
     
     command = (
         f'ffmpeg -i "{input_path}" '
@@ -46,7 +42,7 @@ async def sync_rotate_video_or_gif(input_path: str, rotations: int) -> str:
         f'-y "{output_path}"'
     )
 
-    _, stderr, code = await run_command(command)
+    _, stderr, code = await run_command(command, progress=progress)
     if code != 0:
         raise RuntimeError(f"FFmpeg rotate failed: {stderr}")
         
@@ -54,6 +50,7 @@ async def sync_rotate_video_or_gif(input_path: str, rotations: int) -> str:
 
 
 @bot.add_cmd(cmd="rotate")
+@tracked_job("rotate")
 async def rotate_handler(bot: BOT, message: Message):
     """
     CMD: ROTATE
@@ -78,37 +75,56 @@ async def rotate_handler(bot: BOT, message: Message):
     except ValueError:
         return await message.reply("Invalid input. Please provide a number between 1 and 3.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "rotate", rotations)
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
-        original_path = await bot.download_media(replied_msg)
-        temp_files.append(original_path)
+        workspace = await create_workspace("rotate", get_media_size(replied_msg) * 2, progress_message)
+        original_path = await bot.download_media(replied_msg, file_name=workspace.dir)
         
         angle = rotations * 90
         await progress_message.edit(f"<code>Rotating by {angle} degrees...</code>")
         
         is_image = replied_msg.photo or (replied_msg.document and replied_msg.document.mime_type.startswith('image/'))
         
+        base, ext = os.path.splitext(os.path.basename(original_path))
+        lossless_path = workspace.path_for(f"{base}_rotated{ext}")
+        video_size = {}
+
         if is_image:
-            modified_path = await asyncio.to_thread(sync_rotate_image, original_path, angle)
+            modified_path = (
+                await lossless_rotate_jpeg(original_path, lossless_path, angle)
+                or await run_media(sync_rotate_image, original_path, angle)
+            )
         else:
-            modified_path = await sync_rotate_video_or_gif(original_path, rotations)
+            modified_path = None
+            # Telegram players ignore the display matrix on GIF animations.
+            if not replied_msg.animation:
+                media_object = replied_msg.video or replied_msg.document
+                media_info = await probe_media(original_path, media_object.file_unique_id)
+                if media_info and (modified_path := await lossless_rotate_video(original_path, lossless_path, media_info, rotations)):
+                    video_size = dict(zip(("width", "height"), get_rotated_display_size(media_info, rotations)))
+            if not modified_path:
+                modified_path = await sync_rotate_video_or_gif(original_path, rotations, progress=progress_message)
             
-        temp_files.append(modified_path)
-        
         await progress_message.edit("<code>Sending media...</code>")
 
         caption = f"Rotated by: `{angle}°`"
         reply_params = ReplyParameters(message_id=replied_msg.id)
 
         if is_image:
-            await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         elif replied_msg.animation:
-            await bot.send_animation(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_animation(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         else:
-            await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params, **video_size)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -117,6 +133,5 @@ async def rotate_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not rotate media.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
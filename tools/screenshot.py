@@ -1,13 +1,14 @@
 import os
 import html
-import asyncio
-import requests
 import time
 import base64
 from pyrogram.types import Message, ReplyParameters
 from dotenv import load_dotenv
 
 from app import BOT, bot
+from .workspace import create_workspace
+from .jobs import tracked_job
+from .http_client import HTTP, HTTPError
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODULES_DIR = os.path.dirname(SCRIPT_DIR)
@@ -16,11 +17,9 @@ load_dotenv(dotenv_path=ENV_PATH)
 
 PAGESPEED_API_KEY = os.getenv("PAGESPEED_API_KEY")
 
-TEMP_DIR = "temp_screenshots/"
-os.makedirs(TEMP_DIR, exist_ok=True)
-
 
 @bot.add_cmd(cmd=["screenshot", "ss"])
+@tracked_job("screenshot")
 async def screenshot_handler(bot: BOT, message: Message):
     if not PAGESPEED_API_KEY:
         await message.reply(
@@ -39,15 +38,11 @@ async def screenshot_handler(bot: BOT, message: Message):
 
     progress_msg = await message.reply(f"<code>Taking screenshot</code>...")
     
-    output_path = os.path.join(TEMP_DIR, f"screenshot_{int(time.time())}.jpeg")
-
+    workspace = None
     try:
-        api_endpoint = f"https://www.googleapis.com/pagespeedonline/v5/runPagespeed?screenshot=true&strategy=desktop&url={url}&key={PAGESPEED_API_KEY}"
-
-        def do_request():
-            return requests.get(api_endpoint, timeout=60)
-
-        response = await asyncio.to_thread(do_request)
+        api_endpoint = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+        params = {"screenshot": "true", "strategy": "desktop", "url": url, "key": PAGESPEED_API_KEY}
+        response = await HTTP.get(api_endpoint, params=params, timeout=60)
         response.raise_for_status()
 
         result = response.json()
@@ -59,6 +54,8 @@ async def screenshot_handler(bot: BOT, message: Message):
 
         image_data = base64.b64decode(screenshot_data.replace("data:image/jpeg;base64,", ""))
 
+        workspace = await create_workspace("screenshot", len(image_data), progress_msg)
+        output_path = workspace.path_for(f"screenshot_{int(time.time())}.jpeg")
         with open(output_path, "wb") as f:
             f.write(image_data)
         
@@ -74,12 +71,12 @@ async def screenshot_handler(bot: BOT, message: Message):
         else:
             raise FileNotFoundError("Screenshot file was not created.")
 
-    except requests.exceptions.HTTPError as e:
+    except HTTPError as e:
         error_message = f"<b>API Error ({e.response.status_code}):</b>\n<code>{html.escape(e.response.text)}</code>"
         await progress_msg.edit(error_message, del_in=15)
         
     except Exception as e:
         await progress_msg.edit(f"<b>Error:</b> <code>{html.escape(str(e))}</code>", del_in=10)
     finally:
-        if os.path.exists(output_path):
-            os.remove(output_path)
+        if workspace:
+            workspace.cleanup()
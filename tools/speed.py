@@ -1,30 +1,22 @@
 import os
 import html
-import asyncio
+import math
+from io import BytesIO
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import get_pipe_format, run_command, run_pipe
+from .probe import MediaInfo, probe_media
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
 
-TEMP_DIR = "temp_speed/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return (
-        stdout.decode('utf-8', 'replace').strip(),
-        stderr.decode('utf-8', 'replace').strip(),
-        process.returncode
-    )
-
-async def sync_change_speed(input_path: str, speed_factor: float, is_video: bool) -> str:
-    """Synchronously changes the speed of a media file using FFmpeg, handling a wide range of values."""
-    base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_speed_{speed_factor}x{ext}")
-    
+def build_atempo_filter(speed_factor: float) -> str:
+    """Chains atempo filters so factors outside atempo's 0.5-100 range still work."""
+    if not math.isfinite(speed_factor) or speed_factor <= 0:
+        raise ValueError("Speed factor must be a positive number.")
     atempo_filters = []
     temp_factor = speed_factor
     while temp_factor > 100.0:
@@ -34,12 +26,27 @@ async def sync_change_speed(input_path: str, speed_factor: float, is_video: bool
         atempo_filters.append("atempo=0.5")
         temp_factor /= 0.5
     atempo_filters.append(f"atempo={temp_factor}")
+    return ",".join(atempo_filters)
+
+def build_setpts_filter(speed_factor: float) -> str:
+    return f"setpts={1/speed_factor}*PTS"
+
+async def stream_change_speed(input_data: bytes, speed_factor: float, pipe_format: tuple[str, str, str], progress: Message | None = None) -> BytesIO:
+    """Changes the speed of small audio entirely in memory, without temp files."""
+    muxer, codec, ext = pipe_format
+    command = f'ffmpeg -i pipe:0 -filter:a "{build_atempo_filter(speed_factor)}" -c:a {codec} -f {muxer} pipe:1'
+    return await run_pipe(command, input_data, f"speed_{speed_factor}x{ext}", progress=progress)
+
+async def sync_change_speed(input_path: str, speed_factor: float, media_info: MediaInfo, progress: Message | None = None) -> str:
+    """Synchronously changes the speed of a media file using FFmpeg, handling a wide range of values."""
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_speed_{speed_factor}x{ext}")
     
-    audio_filter_str = ",".join(atempo_filters)
+    audio_filter_str = build_atempo_filter(speed_factor)
 
     command = ""
-    if is_video:
-        video_filter = f"[0:v]setpts={1/speed_factor}*PTS[v]"
+    if media_info.has_video and media_info.has_audio:
+        video_filter = f"[0:v]{build_setpts_filter(speed_factor)}[v]"
         audio_filter = f"[0:a]{audio_filter_str}[a]"
         command = (
             f'ffmpeg -i "{input_path}" '
@@ -47,31 +54,30 @@ async def sync_change_speed(input_path: str, speed_factor: float, is_video: bool
             f'-map "[v]" -map "[a]" '
             f'-y "{output_path}"'
         )
-    else:
+    elif media_info.has_video:
+        command = (
+            f'ffmpeg -i "{input_path}" '
+            f'-filter:v "{build_setpts_filter(speed_factor)}" -an '
+            f'-y "{output_path}"'
+        )
+    elif media_info.has_audio:
         command = (
             f'ffmpeg -i "{input_path}" '
             f'-filter:a "{audio_filter_str}" '
             f'-y "{output_path}"'
         )
+    else:
+        raise ValueError("No audio or video stream found in this file.")
 
-    _, stderr, code = await run_command(command)
-    
-    if code != 0:
-        if is_video and "Cannot find a matching stream" in stderr:
-            command = (
-                f'ffmpeg -i "{input_path}" '
-                f'-filter:v "setpts={1/speed_factor}*PTS" -an '
-                f'-y "{output_path}"'
-            )
-            _, stderr_fallback, code_fallback = await run_command(command)
-            if code_fallback != 0: raise RuntimeError(f"FFmpeg failed (no audio): {stderr_fallback}")
-        else:
-            raise RuntimeError(f"FFmpeg failed: {stderr}")
+    output_duration = media_info.duration / speed_factor if media_info.duration else None
+    _, stderr, code = await run_command(command, progress=progress, duration=output_duration)
+    if code != 0: raise RuntimeError(f"FFmpeg failed: {stderr}")
         
     return output_path
 
 
 @bot.add_cmd(cmd="speed")
+@tracked_job("speed")
 async def speed_handler(bot: BOT, message: Message):
     """
     CMD: SPEED
@@ -89,26 +95,36 @@ async def speed_handler(bot: BOT, message: Message):
 
     try:
         speed_factor = float(message.input.strip())
-        if speed_factor <= 0:
+        if not math.isfinite(speed_factor) or speed_factor <= 0:
             raise ValueError("Speed factor must be a positive number.")
     except ValueError:
         return await message.reply("Invalid speed factor. Please use a number like `5` or `0.5`.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "speed", speed_factor)
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
         media_object = (replied_msg.video or replied_msg.audio or replied_msg.voice or replied_msg.document)
-        original_path = await bot.download_media(media_object)
-        temp_files.append(original_path)
-        
         is_video = bool(replied_msg.video or (replied_msg.document and replied_msg.document.mime_type.startswith('video/')))
-        
-        await progress_message.edit(f"<code>Changing speed to {speed_factor}x...</code>")
-        
-        modified_path = await sync_change_speed(original_path, speed_factor, is_video)
-        temp_files.append(modified_path)
+        pipe_format = None if is_video else get_pipe_format(media_object)
+
+        if pipe_format:
+            in_memory_file = await bot.download_media(media_object, in_memory=True)
+            await progress_message.edit(f"<code>Changing speed to {speed_factor}x...</code>")
+            modified_path = await stream_change_speed(in_memory_file.getvalue(), speed_factor, pipe_format, progress=progress_message)
+        else:
+            workspace = await create_workspace("speed", get_media_size(replied_msg) * 2, progress_message)
+            original_path = await bot.download_media(media_object, file_name=workspace.dir)
+            await progress_message.edit(f"<code>Changing speed to {speed_factor}x...</code>")
+            media_info = await probe_media(original_path, media_object.file_unique_id)
+            if not media_info:
+                raise ValueError("Could not read the media file.")
+            modified_path = await sync_change_speed(original_path, speed_factor, media_info, progress=progress_message)
         
         await progress_message.edit("<code>Sending media...</code>")
 
@@ -116,11 +132,13 @@ async def speed_handler(bot: BOT, message: Message):
         reply_params = ReplyParameters(message_id=replied_msg.id)
 
         if is_video:
-            await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         elif replied_msg.voice:
-             await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+             sent_message = await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         else:
-            await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -129,5 +147,5 @@ async def speed_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not change speed.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f): os.remove(f)
+        if workspace:
+            workspace.cleanup()
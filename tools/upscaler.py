@@ -5,19 +5,19 @@ from PIL import Image
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import run_command
+from .probe import MediaInfo, probe_media
+from .tiling import is_large_image, process_tiled
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+from .lanes import run_media
 
-TEMP_DIR = "temp_upscale/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-    stdout, stderr = await process.communicate()
-    return (stdout.decode('utf-8', 'replace').strip(), stderr.decode('utf-8', 'replace').strip(), process.returncode)
-
 def sync_upscale_image(input_path: str, scale_factor: int = 2) -> tuple[str, int, int]:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_upscaled{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_upscaled{ext}")
     with Image.open(input_path) as img:
         orig_width, orig_height = img.size
         new_width = orig_width * scale_factor
@@ -27,24 +27,42 @@ def sync_upscale_image(input_path: str, scale_factor: int = 2) -> tuple[str, int
         upscaled_img.save(output_path)
     return output_path, new_width, new_height
 
-async def sync_upscale_video(input_path: str, scale_factor: int = 2) -> tuple[str, int, int]:
+def load_image(input_path: str) -> Image.Image:
+    img = Image.open(input_path)
+    if img.mode not in ("RGB", "RGBA", "L"): img = img.convert("RGBA")
+    img.load()
+    return img
+
+def save_image(img: Image.Image, output_path: str):
+    if img.mode == "RGBA": img = img.convert("RGB")
+    img.save(output_path)
+
+async def tiled_upscale_image(input_path: str, scale_factor: int = 2) -> tuple[str, int, int]:
+    """Same result as sync_upscale_image, processed in tiles across worker processes."""
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_upscaled{ext}")
+    img = await asyncio.to_thread(load_image, input_path)
+    upscaled_img = await process_tiled(img, "upscale", scale=scale_factor)
+    await asyncio.to_thread(save_image, upscaled_img, output_path)
+    return output_path, upscaled_img.width, upscaled_img.height
+
+async def sync_upscale_video(input_path: str, media_info: MediaInfo, scale_factor: int = 2, progress: Message | None = None) -> tuple[str, int, int]:
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_upscaled{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_upscaled{ext}")
     
-    probe_command = f'ffprobe -v error -select_streams v:0 -show_entries stream=width,height -of csv=s=x:p=0 "{input_path}"'
-    stdout, _, _ = await run_command(probe_command)
-    orig_width, orig_height = map(int, stdout.split('x'))
-    new_width = orig_width * scale_factor
-    new_height = orig_height * scale_factor
+    new_width = media_info.width * scale_factor
+    new_height = media_info.height * scale_factor
     
     scale_filter = f"scale=iw*{scale_factor}:ih*{scale_factor}:flags=lanczos"
-    command = f'ffmpeg -i "{input_path}" -vf "{scale_filter}" -c:a copy -y "{output_path}"'
-    _, stderr, code = await run_command(command)
+    audio_args = "-c:a copy" if media_info.has_audio else "-an"
+    command = f'ffmpeg -i "{input_path}" -vf "{scale_filter}" {audio_args} -y "{output_path}"'
+    _, stderr, code = await run_command(command, progress=progress, duration=media_info.duration)
     if code != 0: raise RuntimeError(f"FFmpeg upscale failed: {stderr}")
         
     return output_path, new_width, new_height
 
 @bot.add_cmd(cmd="upscale")
+@tracked_job("upscale")
 async def upscale_handler(bot: BOT, message: Message):
     """
     CMD: UPSCALE
@@ -64,25 +82,33 @@ async def upscale_handler(bot: BOT, message: Message):
     if not is_media:
         return await message.reply("Please reply to an image or video to upscale it.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "upscale")
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
+        workspace = await create_workspace("upscaler", get_media_size(replied_msg) * 3, progress_message)
         media_object = (replied_msg.photo or replied_msg.video or replied_msg.document)
-        original_path = await bot.download_media(media_object)
-        temp_files.append(original_path)
+        original_path = await bot.download_media(media_object, file_name=workspace.dir)
         
         await progress_message.edit("<code>Upscaling...</code>")
         
         is_image = replied_msg.photo or (replied_msg.document and replied_msg.document.mime_type.startswith('image/'))
         
         if is_image:
-            modified_path, new_width, new_height = await asyncio.to_thread(sync_upscale_image, original_path)
+            if is_large_image(original_path):
+                modified_path, new_width, new_height = await tiled_upscale_image(original_path)
+            else:
+                modified_path, new_width, new_height = await run_media(sync_upscale_image, original_path)
         else:
-            modified_path, new_width, new_height = await sync_upscale_video(original_path)
-        
-        temp_files.append(modified_path)
+            media_info = await probe_media(original_path, media_object.file_unique_id)
+            if not media_info or not media_info.width:
+                raise ValueError("Could not read the video dimensions.")
+            modified_path, new_width, new_height = await sync_upscale_video(original_path, media_info, progress=progress_message)
         
         await progress_message.edit("<code>Sending media...</code>")
         
@@ -90,9 +116,11 @@ async def upscale_handler(bot: BOT, message: Message):
         reply_params = ReplyParameters(message_id=replied_msg.id)
         
         if is_image:
-            await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_photo(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         else:
-            await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -101,6 +129,5 @@ async def upscale_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not upscale media.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
@@ -2,13 +2,18 @@ import os
 import html
 import asyncio
 import hashlib
-import requests
 import re
+import time
 import base64
+from collections import deque
 from pyrogram.types import Message, LinkPreviewOptions, ReplyParameters
 from dotenv import load_dotenv
+from ub_core.utils import get_tg_media_details
 
-from app import BOT, bot
+from app import BOT, CustomDB, bot
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
+from .http_client import HTTP, Response
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODULES_DIR = os.path.dirname(SCRIPT_DIR)
@@ -16,20 +21,335 @@ ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
 load_dotenv(dotenv_path=ENV_PATH)
 
 VIRUSTOTAL_API_KEY = os.getenv("VIRUSTOTAL_API_KEY")
+VT_VERDICT_TTL = float(os.getenv("VT_VERDICT_TTL_HOURS", "24")) * 3600
+# Public API quota: 4 lookups a minute and 500 a day.
+VT_RATE_PER_MINUTE = int(os.getenv("VT_RATE_PER_MINUTE", "4"))
+VT_DAILY_QUOTA = int(os.getenv("VT_DAILY_QUOTA", "500"))
 
-TEMP_DIR = "temp_virustotal/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 VT_API_URL = "https://www.virustotal.com/api/v3"
+# Larger files need a one-off upload URL from /files/upload_url, which takes up to 650 MB.
+VT_DIRECT_UPLOAD_LIMIT = 32 * 1024 * 1024
+VT_MAX_UPLOAD_SIZE = 650 * 1024 * 1024
+VERDICT_FIELDS = ("last_analysis_stats", "last_analysis_results", "type_description")
+# Seconds between analysis polls; a fresh analysis usually needs a minute or two.
+VT_POLL_DELAYS = (20, 40, 60, 120, 240)
+VT_RATE_LIMIT_PAUSE = 60
+VT_MAX_RATE_LIMIT_RETRIES = 3
+QUEUE_EDIT_INTERVAL = 5
 
+VT_VERDICTS_DB = CustomDB["VT_VERDICTS"]
+VT_QUOTA_DB = CustomDB["VT_QUOTA"]
 
-def calculate_sha256(file_path: str) -> str:
+
+class VerdictCache:
+    """
+    File verdicts by SHA-256, plus a file_unique_id -> SHA-256 index so a forwarded copy of a
+    file we've already checked is answered without downloading it.
+    """
+
+    def __init__(self, collection, ttl: float):
+        self.collection = collection
+        self.ttl = ttl
+        self._verdicts: dict[str, dict] = {}
+        self._hashes: dict[str, str] = {}
+
+    async def load(self):
+        async for entry in self.collection.find():
+            self._verdicts[entry["_id"]] = entry
+            for file_unique_id in entry.get("file_unique_ids", []):
+                self._hashes[file_unique_id] = entry["_id"]
+        await self.prune()
+
+    async def prune(self):
+        """Forgets expired verdicts, so the cache only holds what can still be answered from it."""
+        now = time.time()
+        expired = [entry for entry in self._verdicts.values() if now - entry["checked"] >= self.ttl]
+        for entry in expired:
+            del self._verdicts[entry["_id"]]
+            for file_unique_id in entry["file_unique_ids"]:
+                if self._hashes.get(file_unique_id) == entry["_id"]:
+                    del self._hashes[file_unique_id]
+            await self.collection.delete_data(id=entry["_id"])
+
+    def hash_for(self, file_unique_id: str | None) -> str | None:
+        return self._hashes.get(file_unique_id) if file_unique_id else None
+
+    def get(self, file_hash: str) -> dict | None:
+        entry = self._verdicts.get(file_hash)
+        if entry and time.time() - entry["checked"] < self.ttl:
+            return entry["attributes"]
+        return None
+
+    async def set(self, file_hash: str, attributes: dict, file_unique_id: str | None):
+        entry = self._verdicts.get(file_hash) or {"_id": file_hash, "file_unique_ids": []}
+        entry["attributes"] = {field: attributes.get(field) for field in VERDICT_FIELDS if field in attributes}
+        entry["checked"] = time.time()
+        await self.remember_file(entry, file_unique_id)
+        await self.prune()
+
+    async def remember_file(self, entry: dict, file_unique_id: str | None):
+        if file_unique_id and file_unique_id not in entry["file_unique_ids"]:
+            entry["file_unique_ids"].append(file_unique_id)
+            self._hashes[file_unique_id] = entry["_id"]
+        self._verdicts[entry["_id"]] = entry
+        await self.collection.add_data(entry)
+
+    async def link(self, file_hash: str, file_unique_id: str | None):
+        """Indexes another Telegram copy of a file whose verdict is already cached."""
+        if entry := self._verdicts.get(file_hash):
+            await self.remember_file(entry, file_unique_id)
+
+
+VT_VERDICTS = VerdictCache(VT_VERDICTS_DB, VT_VERDICT_TTL)
+
+
+async def init_task():
+    await VT_VERDICTS.load()
+    await VT.load()
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class VTRequest:
+    def __init__(self, key: str, method: str, url: str, kwargs: dict, upload: str | None = None):
+        self.key = key
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        # Copies of the file to send as multipart "file", one per caller sharing this request.
+        # Reopened on every attempt, so any caller's copy will do if the others were cleaned up.
+        self.uploads: list[str] = [upload] if upload else []
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.waiters = 0
+        self.started = False
+        self.rate_limited = 0
+
+
+class VTScheduler:
+    """
+    Sends every VirusTotal call through one FIFO queue that keeps at most `per_minute` sends in
+    any 60-second window, instead of firing immediately and collecting 429s. Identical lookups
+    already queued or in flight (same hash, URL, domain or analysis) share one request.
+    The daily count is stored per UTC date, so a restart doesn't reset it.
+    """
+
+    def __init__(self, collection, per_minute: int, daily: int):
+        self.collection = collection
+        self.per_minute = max(per_minute, 1)
+        self.daily = daily
+        # Send times of the last `per_minute` requests.
+        self.sent: deque[float] = deque(maxlen=self.per_minute)
+        self.paused_until = 0.0
+        self.day = self._today()
+        self.used_today = 0
+        self.save_failed = False
+        self.queue: deque[VTRequest] = deque()
+        self._in_flight: dict[str, VTRequest] = {}
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+    @staticmethod
+    def _today() -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime())
+
+    async def load(self):
+        entry = await self.collection.find_one({"_id": "daily"})
+        if entry and entry["date"] == self.day:
+            self.used_today = max(self.used_today, entry["used"])
+
+    def _next_send(self, sent: list[float], now: float) -> float:
+        start = max(now, self.paused_until)
+        if len(sent) < self.per_minute:
+            return start
+        return max(start, sent[-self.per_minute] + 60)
+
+    def _wait_time(self) -> float:
+        now = time.monotonic()
+        return self._next_send(list(self.sent), now) - now
+
+    def _quota_left(self) -> bool:
+        today = self._today()
+        if today != self.day:
+            self.day, self.used_today = today, 0
+        return self.used_today < self.daily
+
+    def position(self, request: VTRequest) -> int:
+        try:
+            return self.queue.index(request)
+        except ValueError:
+            return 0
+
+    def eta(self, request: VTRequest) -> float:
+        now = time.monotonic()
+        sent = list(self.sent)
+        for _ in range(self.position(request) + 1):
+            sent.append(self._next_send(sent, now))
+        return sent[-1] - now
+
+    async def request(
+        self, key: str, method: str, url: str, progress: Message | None = None, upload: str | None = None, **kwargs
+    ) -> Response:
+        request = self._in_flight.get(key)
+        if request is None:
+            request = self._in_flight[key] = VTRequest(key, method, url, kwargs, upload)
+            self.queue.append(request)
+            if self._worker is None or self._worker.done():
+                self._worker = asyncio.create_task(self.run())
+            self._wakeup.set()
+        elif upload and upload not in request.uploads:
+            request.uploads.append(upload)
+        request.waiters += 1
+        reporter = asyncio.create_task(self._report_queue(request, progress)) if progress else None
+        try:
+            return await asyncio.shield(request.future)
+        finally:
+            request.waiters -= 1
+            if reporter:
+                reporter.cancel()
+            # Nobody wants the answer any more (job cancelled): don't spend quota on it.
+            if not request.waiters and not request.started and request in self.queue:
+                self.queue.remove(request)
+                self._finish(request)
+                request.future.cancel()
+
+    def _finish(self, request: VTRequest):
+        if self._in_flight.get(request.key) is request:
+            del self._in_flight[request.key]
+
+    async def _report_queue(self, request: VTRequest, progress: Message):
+        last_text = ""
+        while not request.started:
+            eta = self.eta(request)
+            if eta >= 1:
+                text = f"<code>VirusTotal queue: #{self.position(request) + 1}, ETA ~{int(eta) + 1}s</code>"
+                if text != last_text:
+                    try:
+                        await progress.edit(text)
+                    except Exception:
+                        pass
+                    last_text = text
+            await asyncio.sleep(QUEUE_EDIT_INTERVAL)
+
+    async def run(self):
+        while True:
+            if not self.queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not self._quota_left():
+                while self.queue:
+                    request = self.queue.popleft()
+                    self._finish(request)
+                    request.future.set_exception(QuotaExceeded("Daily VirusTotal quota used up, it resets at 00:00 UTC."))
+                continue
+            wait = self._wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            request = self.queue.popleft()
+            request.started = True
+            self.sent.append(time.monotonic())
+            self.used_today += 1
+            asyncio.create_task(self._execute(request))
+            try:
+                await self.collection.add_data({"_id": "daily", "date": self.day, "used": self.used_today})
+                self.save_failed = False
+            except Exception as e:
+                # Logged once per outage; the next successful write stores the full count again.
+                if not self.save_failed:
+                    self.save_failed = True
+                    try:
+                        await bot.log_text(
+                            text=f"#VIRUSTOTAL\nCould not save the daily quota count, a restart will reset it: {e}",
+                            type="error",
+                        )
+                    except Exception:
+                        pass
+
+    async def _send(self, request: VTRequest) -> Response:
+        if not request.uploads:
+            return await HTTP.request(request.method, request.url, retries=0, **request.kwargs)
+        # A fresh handle per attempt: a 429 retry must not resend from EOF, and the
+        # handle must not depend on the caller that queued the upload still being around.
+        path = next((path for path in request.uploads if os.path.exists(path)), request.uploads[0])
+        with open(path, "rb") as file:
+            return await HTTP.request(request.method, request.url, retries=0, data={"file": file}, **request.kwargs)
+
+    async def _execute(self, request: VTRequest):
+        try:
+            response = await self._send(request)
+        except Exception as e:
+            self._finish(request)
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+        if response.status_code == 429 and request.rate_limited < VT_MAX_RATE_LIMIT_RETRIES:
+            # The key's quota is shared with something else; back off and retry at the front.
+            request.rate_limited += 1
+            request.started = False
+            self.paused_until = time.monotonic() + VT_RATE_LIMIT_PAUSE
+            self.queue.appendleft(request)
+            self._wakeup.set()
+            return
+        self._finish(request)
+        if not request.future.done():
+            request.future.set_result(response)
+
+
+VT = VTScheduler(VT_QUOTA_DB, VT_RATE_PER_MINUTE, VT_DAILY_QUOTA)
+
+
+async def poll_analysis(headers: dict, analysis_id: str, progress: Message) -> dict | None:
+    """Waits for a submitted analysis with growing gaps, so an unfinished scan costs few lookups."""
+    for delay in VT_POLL_DELAYS:
+        await progress.edit(f"<code>Analysing on VirusTotal, next check in {delay}s...</code>")
+        await asyncio.sleep(delay)
+        response = await VT.request(
+            f"analysis:{analysis_id}", "GET", f"{VT_API_URL}/analyses/{analysis_id}", progress=progress, headers=headers
+        )
+        if not response.ok:
+            continue
+        attributes = response.json()["data"]["attributes"]
+        if attributes.get("status") == "completed":
+            return {"last_analysis_stats": attributes.get("stats", {}), "last_analysis_results": attributes.get("results", {})}
+    return None
+
+
+def sync_write_and_hash(file, sha256_hash, chunk: bytes):
+    file.write(chunk)
+    sha256_hash.update(chunk)
+
+
+async def download_and_hash(message: Message, path: str) -> str:
+    """Streams the media to disk, hashing each chunk as it arrives instead of re-reading the file."""
     sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
+    with open(path, "wb") as file:
+        async for chunk in bot.stream_media(message):
+            await asyncio.to_thread(sync_write_and_hash, file, sha256_hash, chunk)
     return sha256_hash.hexdigest()
 
+
+async def upload_file(headers: dict, path: str, file_hash: str, progress: Message) -> str | None:
+    """Uploads the file and returns the analysis id."""
+    file_size = os.path.getsize(path)
+    if file_size > VT_MAX_UPLOAD_SIZE:
+        raise ValueError("File is not in VirusTotal's database and is too large to upload (>650 MB).")
+    upload_url = f"{VT_API_URL}/files"
+    if file_size > VT_DIRECT_UPLOAD_LIMIT:
+        response = await VT.request(
+            f"upload_url:{file_hash}", "GET", f"{VT_API_URL}/files/upload_url", progress=progress, headers=headers
+        )
+        if not response.ok:
+            return None
+        upload_url = response.json()["data"]
+    response = await VT.request(
+        f"upload:{file_hash}", "POST", upload_url, progress=progress, upload=path, headers=headers, timeout=300
+    )
+    return response.json()["data"]["id"] if response.ok else None
+
 def is_url(text: str) -> bool: return text.lower().startswith(("http://", "https://"))
 def is_ip(text: str) -> bool: return bool(re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", text))
 def is_domain(text: str) -> bool: return "." in text and "/" not in text and not is_ip(text)
@@ -60,6 +380,7 @@ def format_vt_report(data: dict, scan_type: str, resource_id: str, original_inpu
     return "\n".join(report_lines)
 
 @bot.add_cmd(cmd=["virustotal", "vt"])
+@tracked_job("virustotal")
 async def virustotal_handler(bot: BOT, message: Message):
     if not VIRUSTOTAL_API_KEY or VIRUSTOTAL_API_KEY == "TUTAJ_WKLEJ_SWOJ_KLUCZ_API":
         return await message.reply("<b>VirusTotal API Key not configured.</b>", del_in=ERROR_VISIBLE_DURATION)
@@ -73,27 +394,65 @@ async def virustotal_handler(bot: BOT, message: Message):
     else: await message.reply("Reply to a file or provide a URL/domain/IP.", del_in=ERROR_VISIBLE_DURATION)
 
 async def scan_file(api_key: str, message: Message):
-    progress = await message.reply("<code>Downloading...</code>")
-    original_path = ""
-    temp_files = []
+    progress = await message.reply("<code>Checking...</code>")
+    workspace = None
     try:
-        original_path = await bot.download_media(message.replied, file_name=os.path.join(TEMP_DIR, ""))
-        temp_files.append(original_path)
-        await progress.edit("<code>Calculating hash...</code>")
-        file_hash = await asyncio.to_thread(calculate_sha256, original_path)
-        await progress.edit("<code>Querying VirusTotal...</code>")
-        headers = {"x-apikey": api_key}; url = f"{VT_API_URL}/files/{file_hash}"
-        response = await asyncio.to_thread(requests.get, url, headers=headers)
-        if response.status_code == 200: final_report = format_vt_report(response.json()["data"]["attributes"], "file", file_hash)
-        elif response.status_code == 404: final_report = "<b>Report:</b>\n<b>  - Status:</b> ⚪ Not in database."
-        else: final_report = f"<b>Report:</b>\n<b>  - Error:</b> API code {response.status_code}."
+        media = get_tg_media_details(message.replied)
+        file_unique_id = getattr(media, "file_unique_id", None)
+        file_path = None
+
+        async def download() -> tuple[str, str]:
+            nonlocal workspace
+            workspace = await create_workspace("virustotal", get_media_size(message.replied), progress)
+            file_name = getattr(media, "file_name", None) or f"file_{message.replied.id}"
+            path = workspace.path_for(os.path.basename(file_name))
+            await progress.edit("<code>Downloading and hashing...</code>")
+            return path, await download_and_hash(message.replied, path)
+
+        # A copy we've hashed before is looked up by hash; it is only downloaded again if it must be uploaded.
+        file_hash = VT_VERDICTS.hash_for(file_unique_id)
+        attributes = VT_VERDICTS.get(file_hash) if file_hash else None
+        if file_hash is None:
+            file_path, file_hash = await download()
+            attributes = VT_VERDICTS.get(file_hash)
+            if attributes is not None:
+                await VT_VERDICTS.link(file_hash, file_unique_id)
+
+        if attributes is not None:
+            final_report = format_vt_report(attributes, "file", file_hash)
+        else:
+            await progress.edit("<code>Querying VirusTotal...</code>")
+            headers = {"x-apikey": api_key}; url = f"{VT_API_URL}/files/{file_hash}"
+            response = await VT.request(f"file:{file_hash}", "GET", url, progress=progress, headers=headers)
+            if response.status_code == 200:
+                attributes = response.json()["data"]["attributes"]
+                await VT_VERDICTS.set(file_hash, attributes, file_unique_id)
+                final_report = format_vt_report(attributes, "file", file_hash)
+            elif response.status_code == 404:
+                # Only files VirusTotal has never seen are uploaded.
+                if file_path is None:
+                    file_path, file_hash = await download()
+                await progress.edit("<code>Unknown file, uploading...</code>")
+                analysis_id = await upload_file(headers, file_path, file_hash, progress)
+                attributes = await poll_analysis(headers, analysis_id, progress) if analysis_id else None
+                if attributes:
+                    await VT_VERDICTS.set(file_hash, attributes, file_unique_id)
+                    final_report = format_vt_report(attributes, "file", file_hash)
+                elif analysis_id:
+                    final_report = (
+                        "<b>Report:</b>\n<b>  - Status:</b> ⚪ Not in database. Uploaded for analysis."
+                        f"\n<a href='https://www.virustotal.com/gui/file/{file_hash}'>Check the report in a few minutes.</a>"
+                    )
+                else:
+                    final_report = "<b>Report:</b>\n<b>  - Status:</b> ⚪ Not in database, and the upload failed. The file was not checked."
+            else: final_report = f"<b>Report:</b>\n<b>  - Error:</b> API code {response.status_code}."
         await bot.send_message(message.chat.id, final_report, reply_parameters=ReplyParameters(message_id=message.replied.id), link_preview_options=LinkPreviewOptions(is_disabled=True))
         await progress.delete(); await message.delete()
     except Exception as e:
         await progress.edit(f"<b>Error:</b> <code>{html.escape(str(e))}</code>", del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f): os.remove(f)
+        if workspace:
+            workspace.cleanup()
 
 async def scan_url(api_key: str, message: Message):
     progress = await message.reply("<code>Querying URL...</code>")
@@ -101,13 +460,18 @@ async def scan_url(api_key: str, message: Message):
         target_url = message.input
         url_id = base64.urlsafe_b64encode(target_url.encode()).decode().strip("=")
         headers = {"x-apikey": api_key}; url = f"{VT_API_URL}/urls/{url_id}"
-        response = await asyncio.to_thread(requests.get, url, headers=headers)
+        response = await VT.request(f"url:{url_id}", "GET", url, progress=progress, headers=headers)
         if response.status_code == 200: final_report = format_vt_report(response.json()["data"]["attributes"], "url", url_id, target_url)
         elif response.status_code == 404:
-            final_report = f"<b>Report for URL:</b>\n<code>{html.escape(target_url)}</code>\n<b>  - Status:</b> ⚪ Not in database. Submitting..."
+            await progress.edit("<code>Not in database, submitting...</code>")
             post_url = f"{VT_API_URL}/urls"; post_data = {"url": target_url}
-            await asyncio.to_thread(requests.post, post_url, data=post_data, headers=headers)
-            final_report += "\n<i>  Check the report in a minute.</i>"
+            submitted = await VT.request(f"submit:{url_id}", "POST", post_url, progress=progress, data=post_data, headers=headers)
+            attributes = await poll_analysis(headers, submitted.json()["data"]["id"], progress) if submitted.ok else None
+            if attributes:
+                final_report = format_vt_report(attributes, "url", url_id, target_url)
+            else:
+                final_report = f"<b>Report for URL:</b>\n<code>{html.escape(target_url)}</code>\n<b>  - Status:</b> ⚪ Not in database. Submitted."
+                final_report += "\n<i>  Check the report in a few minutes.</i>"
         else: final_report = f"<b>Report:</b>\n<b>  - Error:</b> API code {response.status_code}."
         await progress.edit(final_report, link_preview_options=LinkPreviewOptions(is_disabled=True))
         await message.delete() # Delete the original command
@@ -120,7 +484,7 @@ async def scan_domain_or_ip(api_key: str, message: Message, scan_type: str):
         resource = message.input
         endpoint = "ip_addresses" if scan_type == "ip" else "domains"
         headers = {"x-apikey": api_key}; url = f"{VT_API_URL}/{endpoint}/{resource}"
-        response = await asyncio.to_thread(requests.get, url, headers=headers)
+        response = await VT.request(f"{scan_type}:{resource.lower()}", "GET", url, progress=progress, headers=headers)
         if response.status_code == 200: final_report = format_vt_report(response.json()["data"]["attributes"], scan_type, resource, resource)
         elif response.status_code == 404: final_report = f"<b>Report:</b>\n<b>  - Status:</b> ⚪ {scan_type.capitalize()} not found."
         else: final_report = f"<b>Report:</b>\n<b>  - Error:</b> API code {response.status_code}."
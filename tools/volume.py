@@ -1,54 +1,50 @@
 import os
 import html
-import asyncio
+from io import BytesIO
 from pyrogram.types import Message, ReplyParameters
 
 from app import BOT, bot
+from .ffmpeg import get_pipe_format, run_command, run_pipe
+from .probe import MediaInfo, probe_media
+from .cache import cache_result, make_cache_key, send_cached_result
+from .workspace import create_workspace, get_media_size
+from .jobs import tracked_job
 
-TEMP_DIR = "temp_volume/"
-os.makedirs(TEMP_DIR, exist_ok=True)
 ERROR_VISIBLE_DURATION = 8
 
-async def run_command(command: str) -> tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return (
-        stdout.decode('utf-8', 'replace').strip(),
-        stderr.decode('utf-8', 'replace').strip(),
-        process.returncode
-    )
+def build_volume_filter(volume_factor: float) -> str:
+    return f"volume={volume_factor}"
 
-async def sync_change_volume(input_path: str, volume_factor: float) -> str:
+async def stream_change_volume(input_data: bytes, volume_factor: float, pipe_format: tuple[str, str, str], progress: Message | None = None) -> BytesIO:
+    """Changes the volume of small audio entirely in memory, without temp files."""
+    muxer, codec, ext = pipe_format
+    command = f'ffmpeg -i pipe:0 -filter:a "{build_volume_filter(volume_factor)}" -c:a {codec} -f {muxer} pipe:1'
+    return await run_pipe(command, input_data, f"volume_{int(volume_factor*100)}{ext}", progress=progress)
+
+async def sync_change_volume(input_path: str, volume_factor: float, media_info: MediaInfo, progress: Message | None = None) -> str:
     """Synchronously changes the volume of a media file using FFmpeg."""
+    if not media_info.has_audio:
+        raise ValueError("This media has no audio track.")
+
     base, ext = os.path.splitext(os.path.basename(input_path))
-    output_path = os.path.join(TEMP_DIR, f"{base}_volume_{int(volume_factor*100)}{ext}")
+    output_path = os.path.join(os.path.dirname(input_path), f"{base}_volume_{int(volume_factor*100)}{ext}")
     
+    video_args = "-c:v copy " if media_info.has_video else ""
     command = (
         f'ffmpeg -i "{input_path}" '
-        f'-filter:a "volume={volume_factor}" '
-        f'-c:v copy '
+        f'-filter:a "{build_volume_filter(volume_factor)}" '
+        f'{video_args}'
         f'-y "{output_path}"'
     )
 
-    _, stderr, code = await run_command(command)
-    if code != 0:
-        if "does not contain any stream" in stderr or "Invalid argument" in stderr:
-            command = (
-                f'ffmpeg -i "{input_path}" '
-                f'-filter:a "volume={volume_factor}" '
-                f'-y "{output_path}"'
-            )
-            _, stderr_fallback, code_fallback = await run_command(command)
-            if code_fallback != 0: raise RuntimeError(f"FFmpeg volume change failed: {stderr_fallback}")
-        else:
-            raise RuntimeError(f"FFmpeg volume change failed: {stderr}")
+    _, stderr, code = await run_command(command, progress=progress, duration=media_info.duration)
+    if code != 0: raise RuntimeError(f"FFmpeg volume change failed: {stderr}")
         
     return output_path
 
 
 @bot.add_cmd(cmd=["volume", "vol"])
+@tracked_job("volume")
 async def volume_handler(bot: BOT, message: Message):
     """
     CMD: VOLUME / VOL
@@ -76,33 +72,45 @@ async def volume_handler(bot: BOT, message: Message):
     except ValueError:
         return await message.reply("Invalid input. Please use a number like `200` or `50`.", del_in=ERROR_VISIBLE_DURATION)
 
+    cache_key = make_cache_key(replied_msg, "volume", volume_level)
+    if await send_cached_result(bot, message, cache_key):
+        return
+
     progress_message = await message.reply("<code>Downloading media...</code>")
     
     original_path, modified_path = "", ""
-    temp_files = []
+    workspace = None
     try:
         media_object = (replied_msg.video or replied_msg.audio or replied_msg.voice or replied_msg.document)
-        original_path = await bot.download_media(media_object)
-        temp_files.append(original_path)
-        
-        await progress_message.edit(f"<code>Changing volume to level {int(volume_level)}...</code>")
-        
-        modified_path = await sync_change_volume(original_path, volume_factor)
-        temp_files.append(modified_path)
+        is_video = replied_msg.video or (replied_msg.document and replied_msg.document.mime_type.startswith('video/'))
+        pipe_format = None if is_video else get_pipe_format(media_object)
+
+        if pipe_format:
+            in_memory_file = await bot.download_media(media_object, in_memory=True)
+            await progress_message.edit(f"<code>Changing volume to level {int(volume_level)}...</code>")
+            modified_path = await stream_change_volume(in_memory_file.getvalue(), volume_factor, pipe_format, progress=progress_message)
+        else:
+            workspace = await create_workspace("volume", get_media_size(replied_msg) * 2, progress_message)
+            original_path = await bot.download_media(media_object, file_name=workspace.dir)
+            await progress_message.edit(f"<code>Changing volume to level {int(volume_level)}...</code>")
+            media_info = await probe_media(original_path, media_object.file_unique_id)
+            if not media_info:
+                raise ValueError("Could not read the media file.")
+            modified_path = await sync_change_volume(original_path, volume_factor, media_info, progress=progress_message)
         
         await progress_message.edit("<code>Sending media...</code>")
 
         caption = f"Volume set to: `{int(volume_level)}`"
         reply_params = ReplyParameters(message_id=replied_msg.id)
 
-        is_video = replied_msg.video or (replied_msg.document and replied_msg.document.mime_type.startswith('video/'))
-
         if is_video:
-            await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_video(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         elif replied_msg.voice:
-             await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+             sent_message = await bot.send_voice(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
         else:
-            await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+            sent_message = await bot.send_audio(message.chat.id, modified_path, caption=caption, reply_parameters=reply_params)
+        
+        await cache_result(cache_key, sent_message)
         
         await progress_message.delete()
         await message.delete()
@@ -111,6 +119,5 @@ async def volume_handler(bot: BOT, message: Message):
         error_text = f"<b>Error:</b> Could not change volume.\n<code>{html.escape(str(e))}</code>"
         await progress_message.edit(error_text, del_in=ERROR_VISIBLE_DURATION)
     finally:
-        for f in temp_files:
-            if f and os.path.exists(f):
-                os.remove(f)
+        if workspace:
+            workspace.cleanup()
@@ -0,0 +1,214 @@
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+from collections import deque
+from dotenv import load_dotenv
+from pyrogram.types import Message
+from ub_core.utils import get_tg_media_details
+
+from .ffmpeg import safe_edit
+from .jobs import attach_progress, current_job
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(SCRIPT_DIR)
+ENV_PATH = os.path.join(MODULES_DIR, "extra_config.env")
+load_dotenv(dotenv_path=ENV_PATH)
+
+WORKSPACE_ROOT = os.path.abspath(os.getenv("WORKSPACE_ROOT", "temp_workspace"))
+WORKSPACE_QUOTA = int(float(os.getenv("WORKSPACE_QUOTA_MB", "2048")) * 1024 * 1024)
+# RAM-backed scratch space (e.g. /dev/shm) for jobs small enough to fit; empty disables it.
+WORKSPACE_TMPFS_DIR = os.getenv("WORKSPACE_TMPFS_DIR", "")
+WORKSPACE_TMPFS_QUOTA = int(float(os.getenv("WORKSPACE_TMPFS_QUOTA_MB", "256")) * 1024 * 1024)
+WORKSPACE_QUEUE_TIMEOUT = float(os.getenv("WORKSPACE_QUEUE_TIMEOUT", "300"))
+WORKSPACE_MAX_AGE = float(os.getenv("WORKSPACE_MAX_AGE_MIN", "60")) * 60
+JANITOR_INTERVAL = 300
+QUEUE_UPDATE_INTERVAL = 3
+DIR_PREFIX = "job_"
+
+
+class WorkspaceFull(Exception):
+    pass
+
+
+class Workspace:
+    """A per-job scratch directory holding a byte reservation against the quota."""
+
+    def __init__(self, manager: "WorkspaceManager", path: str, reserved: int, on_tmpfs: bool):
+        self.manager = manager
+        self.path = path
+        self.reserved = reserved
+        self.on_tmpfs = on_tmpfs
+
+    @property
+    def dir(self) -> str:
+        """Directory with a trailing separator, as download_media expects for a folder."""
+        return os.path.join(self.path, "")
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.manager.release(self)
+
+
+class WorkspaceManager:
+    def __init__(self, root: str, quota: int, tmpfs_dir: str = "", tmpfs_quota: int = 0):
+        self.root = root
+        self.quota = quota
+        self.tmpfs_root = os.path.join(tmpfs_dir, "plainub_workspace") if tmpfs_dir else ""
+        self.tmpfs_quota = tmpfs_quota if tmpfs_dir else 0
+        self.reserved = 0
+        self.tmpfs_reserved = 0
+        self._active: set[str] = set()
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def roots(self) -> list[str]:
+        return [root for root in (self.root, self.tmpfs_root) if root]
+
+    def _fits(self, size: int) -> bool:
+        return self.reserved + size <= self.quota
+
+    def _wake_waiters(self):
+        # FIFO: a large job at the head isn't starved by smaller ones behind it.
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(size):
+                break
+            self._waiters.popleft()
+            self.reserved += size
+            future.set_result(None)
+
+    async def _reserve(self, size: int, progress: Message | None):
+        if size > self.quota:
+            raise WorkspaceFull(
+                f"Job needs ~{size // 1048576} MB of scratch space, over the {self.quota // 1048576} MB quota."
+            )
+        if not size or (not self._waiters and self._fits(size)):
+            self.reserved += size
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((size, future))
+        original_text = progress.text.html if progress else None
+        deadline = time.monotonic() + WORKSPACE_QUEUE_TIMEOUT
+        owner = current_job()
+        if owner:
+            owner.queued = True
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WorkspaceFull("Timed out waiting for scratch space, try again later.")
+                if progress:
+                    await safe_edit(progress, "<code>Waiting for free disk space...</code>")
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), min(QUEUE_UPDATE_INTERVAL, remaining))
+                    break
+                except asyncio.TimeoutError:
+                    continue
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.reserved -= size
+            future.cancel()
+            self._wake_waiters()
+            raise
+        finally:
+            if owner:
+                owner.queued = False
+        if progress and original_text:
+            await safe_edit(progress, original_text)
+
+    async def acquire(self, name: str, reserve: int = 0, progress: Message | None = None) -> Workspace:
+        """
+        Reserves `reserve` bytes and creates a fresh directory for one job. Small jobs land on
+        tmpfs when it's configured and has room; everything else waits for the disk quota.
+        """
+        attach_progress(progress)
+        if self.tmpfs_root and reserve and self.tmpfs_reserved + reserve <= self.tmpfs_quota:
+            self.tmpfs_reserved += reserve
+            root, on_tmpfs = self.tmpfs_root, True
+        else:
+            await self._reserve(reserve, progress)
+            root, on_tmpfs = self.root, False
+
+        try:
+            os.makedirs(root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix=f"{DIR_PREFIX}{name}_", dir=root)
+        except Exception:
+            self._unreserve(reserve, on_tmpfs)
+            raise
+
+        self._active.add(path)
+        return Workspace(self, path, reserve, on_tmpfs)
+
+    def _unreserve(self, size: int, on_tmpfs: bool):
+        if on_tmpfs:
+            self.tmpfs_reserved -= size
+        else:
+            self.reserved -= size
+            self._wake_waiters()
+
+    def release(self, workspace: Workspace):
+        if workspace.path not in self._active:
+            return
+        self._active.discard(workspace.path)
+        self._unreserve(workspace.reserved, workspace.on_tmpfs)
+
+    def sweep(self, max_age: float = 0) -> int:
+        """Removes job dirs no live job owns that are older than `max_age` seconds."""
+        removed = 0
+        now = time.time()
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if entry.path in self._active:
+                    continue
+                try:
+                    age = now - entry.stat(follow_symlinks=False).st_mtime
+                except FileNotFoundError:
+                    continue
+                if age < max_age:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+        return removed
+
+    async def run_janitor(self):
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            try:
+                await asyncio.to_thread(self.sweep, WORKSPACE_MAX_AGE)
+            except Exception:
+                pass
+
+
+def get_media_size(message: Message | None) -> int:
+    media = get_tg_media_details(message) if message else None
+    return getattr(media, "file_size", 0) or 0
+
+
+WORKSPACES = WorkspaceManager(WORKSPACE_ROOT, WORKSPACE_QUOTA, WORKSPACE_TMPFS_DIR, WORKSPACE_TMPFS_QUOTA)
+_janitor_task: asyncio.Task | None = None
+
+
+async def create_workspace(name: str, reserve: int = 0, progress: Message | None = None) -> Workspace:
+    return await WORKSPACES.acquire(name, reserve, progress)
+
+
+async def init_task():
+    global _janitor_task
+    # Nothing owns a job dir at startup, so anything left over is from a crash.
+    await asyncio.to_thread(WORKSPACES.sweep)
+    if _janitor_task is None:
+        _janitor_task = asyncio.create_task(WORKSPACES.run_janitor())